@@ -4,28 +4,37 @@
 #  - 支持从本地模型文件夹加载 .pt（通过 download_root 参数）
 #  - 输出 SRT / TXT，文件名格式：name[.suffix].srt 或 .txt
 # 注意：需要系统安装 ffmpeg/ffprobe（脚本使用 ffprobe 获取时长）
+# 转写引擎在同目录的 whisper_engine.py 中（backend="openai"），本脚本只负责界面；命令行见 whisper_cli.py
 
+import time
+STARTUP_BEGIN = time.perf_counter()  # 脚本开始执行的时刻（用于报告启动耗时）
 import os
+import queue
 import threading
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, ttk
-import time
 from datetime import datetime
-import whisper            # pip install -U openai-whisper
-import torch
-import subprocess
-import json
+import whisper_engine as engine      # torch / whisper 很重，窗口显示后才在后台预加载
+import whisper_server                # 本地模型服务客户端
+import whisper_metrics as metrics    # 运行指标（各阶段耗时、资源占用）
+import whisper_jobs                  # 文件列表（顺序去重集合 + 每个文件的状态）
+import whisper_scan                  # 后台扫描文件夹（带导入筛选）
 
 # ---------------------- 全局变量 ----------------------
-selected_files = []      # 列表：累积的音视频文件路径（用户选择）
-current_file_index = 0   # 当前已处理的文件索引（用于进度/状态显示）
-total_files = 0          # 总任务数量（len(selected_files)）
+job_queue = whisper_jobs.JobQueue()  # 累积的音视频文件（按顺序去重，附带处理状态）
+FILE_PAGE_SIZE = 500     # 文件列表每页显示的行数
+file_page = 0            # 当前显示的页（0 基）
+scanner = None           # 正在后台扫描的文件夹（FolderScanner），没有时为 None
+scan_added = []          # 本次扫描新加入队列的文件
 processing = False       # 标识：程序是否正在处理任务
-supported_extensions = ( # 支持的音视频文件扩展名
-    ".m4a", ".mp3", ".mp4", ".wav", ".avi", ".vob",
-    ".mov", ".mkv", ".aac", ".flac", ".ogg", ".webm",
-    ".flv", ".rmvb", ".wmv"
-)
+SCHEDULE_BY_LABEL = {label: key for key, label in whisper_jobs.SCHEDULE_LABELS.items()}  # 处理顺序下拉框：名称 -> 策略
+remote_status_lines = [] # 模型服务推送的进度面板内容
+
+# ---------------------- 日志 / 界面操作队列 ----------------------
+LOG_FLUSH_MS = 100         # 主线程刷新日志窗口的间隔（毫秒）
+LOG_MAX_LINES = 5000       # 日志窗口最多保留的行数
+log_queue = queue.SimpleQueue()
+ui_call_queue = queue.SimpleQueue()  # (函数, 参数)，由主线程执行
 
 # ---------------------- Tkinter 初始化 ----------------------
 root = tk.Tk()
@@ -43,45 +52,111 @@ export_format_var = tk.StringVar(root, value="SRT")
 output_folder_var = tk.StringVar(root, value="")
 model_folder_var = tk.StringVar(root, value="")
 output_mode_var = tk.IntVar(root, value=1)
+workers_var = tk.IntVar(root, value=1)       # 并行任务数（每个工作线程各自加载一份模型）
+cpu_threads_var = tk.IntVar(root, value=0)   # 每任务 CPU 线程数（0 = 按核心数自动均分）
+use_server_var = tk.BooleanVar(root, value=False)  # 交给 whisper_server.py 模型服务处理
+schedule_var = tk.StringVar(root, value=whisper_jobs.SCHEDULE_LABELS["fifo"])  # 处理顺序（调度策略）
+priority_var = tk.IntVar(root, value=0)      # 「设优先级」使用的值（越大越先处理）
+# 导入筛选（「导入筛选…」对话框）
+scan_include_var = tk.StringVar(root, value="")    # 只导入匹配的文件（通配符，; 分隔）
+scan_exclude_var = tk.StringVar(root, value="")    # 排除的文件 / 子目录（通配符，; 分隔）
+scan_min_size_var = tk.IntVar(root, value=0)       # 大小下限（MB）
+scan_max_size_var = tk.IntVar(root, value=0)       # 大小上限（MB）
+scan_min_duration_var = tk.IntVar(root, value=0)   # 时长下限（秒）
+scan_max_duration_var = tk.IntVar(root, value=0)   # 时长上限（秒）
+scan_skip_existing_var = tk.BooleanVar(root, value=False)  # 跳过已有字幕的文件
 
 # ---------------------- 工具函数 ----------------------
-def format_timestamp(seconds):
-    """将秒数转换为 SRT 时间戳 HH:MM:SS,mmm"""
-    hrs = int(seconds // 3600)
-    mins = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds - int(seconds)) * 1000)
-    return f"{hrs:02}:{mins:02}:{secs:02},{millis:03}"
-
-def format_hms(seconds):
-    """把秒格式化成人类可读格式（用于日志 ETA）"""
-    seconds = int(seconds)
-    h = seconds // 3600
-    m = (seconds % 3600) // 60
-    s = seconds % 60
-    if h > 0:
-        return f"{h}小时{m}分{s}秒"
-    elif m > 0:
-        return f"{m}分{s}秒"
-    else:
-        return f"{s}秒"
-
 def log(msg):
-    """在日志窗口中追加一行，带时间戳"""
+    """追加一行带时间戳的日志（任何线程都可调用，只放入队列，由主线程批量写入日志窗口）"""
     timestamp = datetime.now().strftime("[%H:%M:%S] ")
-    logging_text.config(state=tk.NORMAL)
-    logging_text.insert(tk.END, timestamp + msg + "\n")
-    logging_text.see(tk.END)
-    logging_text.update_idletasks()
-    logging_text.config(state=tk.DISABLED)
+    log_queue.put(timestamp + msg)
+
+def run_on_ui(func, *args):
+    """把界面操作交给 Tk 主线程执行（供工作线程调用）"""
+    ui_call_queue.put((func, args))
+
+def flush_ui_queues():
+    """主线程定时执行：先处理 run_on_ui 提交的操作，再一次性写入积攒的日志，并限制日志行数"""
+    while True:
+        try:
+            func, args = ui_call_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            func(*args)
+        except Exception as e:
+            print("界面操作失败：", e)
+
+    lines = []
+    while True:
+        try:
+            lines.append(log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if lines:
+        logging_text.config(state=tk.NORMAL)
+        logging_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(logging_text.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_MAX_LINES:
+            logging_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+        logging_text.see(tk.END)
+        logging_text.config(state=tk.DISABLED)
+    root.after(LOG_FLUSH_MS, flush_ui_queues)
 
 # ---------------------- 文件操作 ----------------------
-def update_files_text():
-    files_text.config(state=tk.NORMAL)
-    files_text.delete("1.0", tk.END)
-    for f in selected_files:
-        files_text.insert(tk.END, f + "\n")
-    files_text.config(state=tk.DISABLED)
+def update_files_view():
+    """把 job_queue 的当前页显示到 Treeview；行 iid 固定为页内行号，刷新只改已有行（开销只与一页的行数有关）"""
+    global file_page
+    total = len(job_queue)
+    pages = max(1, (total + FILE_PAGE_SIZE - 1) // FILE_PAGE_SIZE)
+    file_page = min(max(file_page, 0), pages - 1)
+    start = file_page * FILE_PAGE_SIZE
+    rows = job_queue.slice(start, start + FILE_PAGE_SIZE)
+    children = files_tree.get_children()
+    for k, (path, status) in enumerate(rows):
+        values = (start + k + 1, path, job_queue.priority(path) or "", whisper_jobs.STATUS_LABELS[status])
+        if k < len(children):
+            files_tree.item(str(k), values=values)
+        else:
+            files_tree.insert("", tk.END, iid=str(k), values=values)
+    if len(children) > len(rows):
+        files_tree.delete(*children[len(rows):])
+    page_var.set(f"第 {file_page + 1}/{pages} 页，共 {total} 个文件")
+
+def change_page(delta):
+    global file_page
+    file_page += delta
+    files_tree.selection_remove(files_tree.selection())
+    update_files_view()
+
+def select_rows(start, end):
+    """选中队列中第 start 到 end 个文件，必要时翻到它们所在的页"""
+    global file_page
+    file_page = start // FILE_PAGE_SIZE
+    update_files_view()
+    page_start = file_page * FILE_PAGE_SIZE
+    rows = [str(k - page_start) for k in range(start, end + 1) if k - page_start < FILE_PAGE_SIZE]
+    files_tree.selection_set(rows)
+    if rows:
+        files_tree.see(rows[0])
+
+def on_job_status(file, status):
+    """（主线程）引擎汇报的文件状态；文件在当前页时只刷新这一行"""
+    index = job_queue.set_status(file, status)
+    if index is None:
+        return
+    row = index - file_page * FILE_PAGE_SIZE
+    if 0 <= row < FILE_PAGE_SIZE and files_tree.exists(str(row)):
+        files_tree.set(str(row), "status", whisper_jobs.STATUS_LABELS[status])
+
+def add_to_running_batch(paths):
+    """（主线程）识别进行中新导入的文件：加入当前批次（engine.add_jobs），不能加入时提示下次再处理"""
+    if not processing or not paths:
+        return
+    if not engine.add_jobs(paths):
+        log(f"新加入的 {len(paths)} 个文件无法加入正在进行的批次（使用模型服务或批次正在收尾），"
+            f"请在本批次结束后再次点击“开始识别”。")
 
 def select_files():
     filenames = filedialog.askopenfilenames(
@@ -90,39 +165,104 @@ def select_files():
                    ("All Files", "*.*")]
     )
     if filenames:
-        for f in filenames:
-            if f not in selected_files:
-                selected_files.append(f)
-        update_files_text()
-        log(f"已选择 {len(filenames)} 个文件，当前总计 {len(selected_files)} 个文件。")
+        added = job_queue.add(filenames)
+        update_files_view()
+        log(f"已选择 {len(filenames)} 个文件，当前总计 {len(job_queue)} 个文件。")
+        engine.prefetch_media_info(added)
+        add_to_running_batch(added)
 
 def select_folder():
+    """后台扫描文件夹（whisper_scan.FolderScanner），符合筛选的文件分批加入队列，可随时停止"""
+    global scanner
+    if scanner is not None:
+        log("正在扫描文件夹，请等待扫描结束或点击「停止扫描」。")
+        return
     folder = filedialog.askdirectory(title="选择音视频文件夹")
     if folder:
-        for root_dir, dirs, files in os.walk(folder):
-            for file in files:
-                if file.lower().endswith(supported_extensions):
-                    full_path = os.path.join(root_dir, file)
-                    if full_path not in selected_files:
-                        selected_files.append(full_path)
-        update_files_text()
-        log(f"从文件夹 {folder} 导入完成，共导入 {len(selected_files)} 个文件。")
+        scan_added.clear()
+        scanner = whisper_scan.FolderScanner(
+            [folder],
+            on_batch=lambda paths: run_on_ui(add_scanned_files, paths),
+            on_done=lambda s: run_on_ui(finish_scan, s, folder),
+            scan_filter=build_scan_filter()
+        )
+        stop_scan_button.config(state=tk.NORMAL)
+        log(f"开始扫描文件夹 {folder}（在后台进行，找到的文件会陆续加入列表）…")
+        scanner.start()
+
+def split_patterns(text):
+    return [p.strip() for p in text.replace("；", ";").split(";") if p.strip()]
+
+def build_scan_filter():
+    skip_existing = None
+    if scan_skip_existing_var.get():
+        skip_existing = {
+            "output_mode": output_mode_var.get(),
+            "output_folder": output_folder_var.get().strip(),
+            "suffix": suffix_var.get().strip(),
+            "export_format": export_format_var.get(),
+        }
+    return whisper_scan.ScanFilter(
+        include=split_patterns(scan_include_var.get()),
+        exclude=split_patterns(scan_exclude_var.get()),
+        min_size=read_int_var(scan_min_size_var, default=0, minimum=0) << 20,
+        max_size=read_int_var(scan_max_size_var, default=0, minimum=0) << 20,
+        min_duration=read_int_var(scan_min_duration_var, default=0, minimum=0),
+        max_duration=read_int_var(scan_max_duration_var, default=0, minimum=0),
+        skip_existing=skip_existing
+    )
+
+def add_scanned_files(paths):
+    added = job_queue.add(paths)
+    scan_added.extend(added)
+    update_files_view()
+    add_to_running_batch(added)
+
+def finish_scan(finished_scanner, folder):
+    global scanner
+    scanner = None
+    stop_scan_button.config(state=tk.DISABLED)
+    log(f"{folder}：{finished_scanner.summary()}。新增 {len(scan_added)} 个文件，当前总计 {len(job_queue)} 个文件。")
+    engine.prefetch_media_info(list(scan_added))
+    scan_added.clear()
+
+def stop_scan():
+    if scanner is not None:
+        scanner.cancel()
+        log("正在停止扫描…")
+
+def open_scan_filter_dialog():
+    dialog = tk.Toplevel(root)
+    dialog.title("导入筛选")
+    dialog.transient(root)
+    fields = [
+        ("只导入匹配的文件（通配符，多个用 ; 分隔）：", scan_include_var, 40),
+        ("排除的文件 / 子目录（通配符，多个用 ; 分隔）：", scan_exclude_var, 40),
+        ("文件大小下限（MB，0 = 不限）：", scan_min_size_var, 8),
+        ("文件大小上限（MB，0 = 不限）：", scan_max_size_var, 8),
+        ("音频时长下限（秒，0 = 不限）：", scan_min_duration_var, 8),
+        ("音频时长上限（秒，0 = 不限）：", scan_max_duration_var, 8),
+    ]
+    for row, (text, var, width) in enumerate(fields):
+        ttk.Label(dialog, text=text).grid(row=row, column=0, sticky="w", padx=5, pady=3)
+        ttk.Entry(dialog, textvariable=var, width=width).grid(row=row, column=1, sticky="w", padx=5, pady=3)
+    ttk.Checkbutton(dialog, text="跳过已经有字幕文件的（按当前的保存位置、后缀与导出格式判断）",
+                    variable=scan_skip_existing_var).grid(row=len(fields), column=0, columnspan=2, sticky="w", padx=5, pady=3)
+    ttk.Button(dialog, text="确定", command=dialog.destroy).grid(row=len(fields) + 1, column=0, columnspan=2, pady=8)
 
 def clear_files():
-    selected_files.clear()
-    update_files_text()
+    job_queue.clear()
+    update_files_view()
     log("已清空选择的文件。")
 
 # ---------------------- 文件列表控件辅助 ----------------------
 def get_selected_line_indices():
-    try:
-        sel_first = files_text.index("sel.first")
-        sel_last = files_text.index("sel.last")
-        start_line = int(sel_first.split('.')[0]) - 1
-        end_line = int(sel_last.split('.')[0]) - 1
-        return start_line, end_line
-    except tk.TclError:
+    """选中行在整个队列中的区间 (start, end)，0 基、含两端；没有选中时为 (None, None)"""
+    rows = [int(iid) for iid in files_tree.selection()]
+    if not rows:
         return None, None
+    page_start = file_page * FILE_PAGE_SIZE
+    return page_start + min(rows), page_start + max(rows)
 
 def move_up():
     start_line, end_line = get_selected_line_indices()
@@ -132,36 +272,40 @@ def move_up():
     if start_line <= 0:
         log("已到顶部，无法上移。")
         return
-    block = selected_files[start_line:end_line+1]
-    del selected_files[start_line:end_line+1]
-    new_index = start_line - 1
-    for i, item in enumerate(block):
-        selected_files.insert(new_index + i, item)
-    update_files_text()
+    new_start = job_queue.move_range(start_line, end_line, -1)
+    select_rows(new_start, new_start + end_line - start_line)
 
 def move_down():
     start_line, end_line = get_selected_line_indices()
     if start_line is None:
         log("请先选择要下移的文件。")
         return
-    if end_line >= len(selected_files) - 1:
+    if end_line >= len(job_queue) - 1:
         log("已到底部，无法下移。")
         return
-    block = selected_files[start_line:end_line+1]
-    del selected_files[start_line:end_line+1]
-    new_index = start_line + 1
-    for i, item in enumerate(block):
-        selected_files.insert(new_index + i, item)
-    update_files_text()
+    new_start = job_queue.move_range(start_line, end_line, 1)
+    select_rows(new_start, new_start + end_line - start_line)
 
 def delete_selected():
     start_line, end_line = get_selected_line_indices()
     if start_line is None:
         log("请先选择要删除的文件。")
         return
-    del selected_files[start_line:end_line+1]
-    update_files_text()
-    log("已删除选中的文件。")
+    count = job_queue.remove_range(start_line, end_line)
+    files_tree.selection_remove(files_tree.selection())
+    update_files_view()
+    log(f"已删除选中的 {count} 个文件。")
+
+def set_selected_priority():
+    """把选中文件的优先级设为 priority_var（处理顺序选“按优先级”时生效）"""
+    start_line, end_line = get_selected_line_indices()
+    if start_line is None:
+        log("请先选择要设置优先级的文件。")
+        return
+    value = read_int_var(priority_var, default=0, minimum=-99)
+    job_queue.set_priority(start_line, end_line, value)
+    update_files_view()
+    log(f"已把选中的 {end_line - start_line + 1} 个文件的优先级设为 {value}。")
 
 # ---------------------- 输出/模型选择 ----------------------
 def select_output_folder():
@@ -213,8 +357,6 @@ def update_output_folder_state():
 # ---------------------- 控件启用/禁用 ----------------------
 def disable_all_controls():
     start_button.config(state=tk.DISABLED)
-    select_files_button.config(state=tk.DISABLED)
-    select_folder_button.config(state=tk.DISABLED)
     clear_files_button.config(state=tk.DISABLED)
     output_folder_entry.config(state=tk.DISABLED)
     select_output_folder_button.config(state=tk.DISABLED)
@@ -223,31 +365,37 @@ def disable_all_controls():
     model_menu.config(state=tk.DISABLED)
     suffix_entry.config(state=tk.DISABLED)
     model_folder_entry.config(state=tk.DISABLED)
-    files_text.config(state=tk.DISABLED)
     up_btn.config(state=tk.DISABLED)
     down_btn.config(state=tk.DISABLED)
     del_btn.config(state=tk.DISABLED)
+    priority_btn.config(state=tk.DISABLED)
+    schedule_menu.config(state=tk.DISABLED)
     export_format_menu.config(state=tk.DISABLED)
     radio1.config(state=tk.DISABLED)
     radio2.config(state=tk.DISABLED)
+    workers_spin.config(state=tk.DISABLED)
+    cpu_threads_spin.config(state=tk.DISABLED)
+    server_check.config(state=tk.DISABLED)
 
 def enable_all_controls():
     start_button.config(state=tk.NORMAL)
-    select_files_button.config(state=tk.NORMAL)
-    select_folder_button.config(state=tk.NORMAL)
     clear_files_button.config(state=tk.NORMAL)
     select_model_folder_button.config(state=tk.NORMAL)
     lang_menu.config(state=tk.NORMAL)
     model_menu.config(state=tk.NORMAL)
     suffix_entry.config(state=tk.NORMAL)
     model_folder_entry.config(state=tk.NORMAL)
-    files_text.config(state=tk.NORMAL)
     up_btn.config(state=tk.NORMAL)
     down_btn.config(state=tk.NORMAL)
     del_btn.config(state=tk.NORMAL)
+    priority_btn.config(state=tk.NORMAL)
+    schedule_menu.config(state="readonly")
     export_format_menu.config(state="readonly")
     radio1.config(state=tk.NORMAL)
     radio2.config(state=tk.NORMAL)
+    workers_spin.config(state=tk.NORMAL)
+    cpu_threads_spin.config(state=tk.NORMAL)
+    server_check.config(state=tk.NORMAL)
     update_output_folder_state()
 
 # ---------------------- 时长 / 大小 等辅助 ----------------------
@@ -264,198 +412,88 @@ def format_hms_short(seconds):
     else:
         return f"{s}秒"
 
-def get_audio_duration(file_path):
-    """
-    使用 ffprobe 获取文件时长（秒）。需要系统安装 ffmpeg/ffprobe。
-    如果出错返回 0。
-    """
+# ---------------------- 主处理逻辑（OpenAI whisper 版） ----------------------
+def read_int_var(var, default, minimum):
+    """读取整数型 Tk 变量；内容非法时返回 default，并保证不小于 minimum"""
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "json",
-            file_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        data = json.loads(result.stdout)
-        return float(data["format"]["duration"])
-    except Exception:
-        return 0
-
-# ---------------------- 周期状态刷新线程 ----------------------
-def update_status(stop_event, log_func, total_files, processed_files_func):
-    """
-    后台线程：每60秒刷新一次任务状态（写入日志）。
-    stop_event 用于通知线程退出（当处理结束）。
-    """
-    while not stop_event.is_set():
-        try:
-            processed = processed_files_func()
-            pending = total_files - processed
-            log_func(f"状态：正在处理任务数量：1，已处理任务数量：{processed}，待处理任务数量：{pending}")
-        except Exception as e:
-            log_func(f"状态刷新出错：{e}")
-        # 分段sleep以便快速响应 stop_event
-        for _ in range(60):
-            if stop_event.is_set():
-                break
-            time.sleep(1)
+        return max(minimum, int(var.get()))
+    except (tk.TclError, ValueError):
+        return default
+
+def set_remote_status(lines):
+    """模型服务推送的进度面板内容"""
+    global remote_status_lines
+    remote_status_lines = lines
 
-# ---------------------- 主处理逻辑（OpenAI whisper 版） ----------------------
 def process_files_func():
     """
-    主要流程：
-      - 禁用界面控件
-      - 启动状态刷新线程
-      - 加载 openai-whisper 模型（支持本地 .pt，通过 download_root）
-      - 对每个文件调用 model.transcribe(...)（不做分片）
-      - 写入 SRT 或 TXT
-      - 统计耗时 / 估算 ETA
-      - 恢复控件
+    读取界面选项后交给 engine.process_files（backend="openai"）：
+    N 个工作线程各自取一份 openai-whisper 模型（上次加载的会被复用），从共享队列取文件调用 model.transcribe(...)（不做分片）并写入 SRT 或 TXT。
+    勾选“使用模型服务”时提交给 whisper_server.py。
     """
-    global current_file_index, total_files, processing
-    disable_all_controls()
-    current_file_index = 0
-    total_files = len(selected_files)
+    global processing, remote_status_lines
+    run_on_ui(disable_all_controls)
     processing = True
-
-    stop_event = threading.Event()
-    status_thread = threading.Thread(
-        target=update_status,
-        args=(stop_event, log, total_files, lambda: current_file_index),
-        daemon=True
-    )
-    status_thread.start()
-
-    processed_durations = []
-    processing_times = []
-    start_overall = time.time()
-
     try:
-        lang_option = lang_var.get().strip()
-        selected_model_name = model_var.get().strip()
-        # ========== 加载模型（支持本地 .pt 通过 download_root） ==========
-        try:
-            log(f"加载模型 {selected_model_name} …")
-            if model_folder_var.get().strip():
-                # 如果你选择了一个本地模型文件夹，并且下拉框值对应该文件夹中 .pt 的基名（如 large-v3）
-                # whisper.load_model 会在 download_root 目录下查找 <name>.pt
-                model = whisper.load_model(selected_model_name, device="cuda" if torch.cuda.is_available() else "cpu", download_root=model_folder_var.get().strip())
-            else:
-                model = whisper.load_model(selected_model_name, device="cuda" if torch.cuda.is_available() else "cpu")
-            log("模型加载成功。")
-        except Exception as e:
-            log(f"加载模型失败：{e}")
-            return
-
-        # ========== 遍历文件进行转写（不分片） ==========
-        for i, file in enumerate(selected_files):
-            current_file_index = i
-            task_name = os.path.basename(file)
-            log(f"开始处理任务 {i+1}/{total_files}：{task_name}")
-            file_start = time.time()
-
-            # 输出路径逻辑
-            if output_mode_var.get() == 2:
-                output_folder = output_folder_var.get().strip()
-                if not output_folder:
-                    log("请选择输出文件夹！")
-                    continue
-            else:
-                output_folder = os.path.dirname(file)
-
-            name, _ = os.path.splitext(os.path.basename(file))
-            suffix = suffix_var.get().strip()
-            ext = "txt" if export_format_var.get() == "TXT" else "srt"
-            output_filename = f"{name}.{suffix}.{ext}" if suffix else f"{name}.{ext}"
-            output_path = os.path.join(output_folder, output_filename)
-            log(f"字幕文件将保存至：{output_path}")
-
-            # 获取音频时长（用于 ETA）
-            try:
-                duration_sec = get_audio_duration(file)
-            except Exception:
-                duration_sec = 0
-
-            # ========== 转写调用：严格按照你指定的参数 ==========
+        options = {
+            "backend": "openai",
+            "model_name": model_var.get().strip(),
+            "model_folder": model_folder_var.get().strip(),
+            "lang_option": lang_var.get().strip(),
+            "workers": read_int_var(workers_var, default=1, minimum=1),
+            "cpu_threads": read_int_var(cpu_threads_var, default=0, minimum=0),
+            "output_mode": output_mode_var.get(),
+            "output_folder": output_folder_var.get().strip(),
+            "suffix": suffix_var.get().strip(),
+            "export_format": export_format_var.get(),
+            "schedule": SCHEDULE_BY_LABEL.get(schedule_var.get(), "fifo"),
+            "priorities": job_queue.priorities(),
+        }
+        if use_server_var.get():
             try:
-                result = model.transcribe(
-                    file,
-                    language=None if lang_option.lower() == "auto" else lang_option,
-                    condition_on_previous_text=False,   # ✅ 防止重复
-                    word_timestamps=True                # ✅ 保留时间轴
-                )
+                whisper_server.submit(job_queue.paths(), options, log_func=log, progress_func=set_remote_status)
+                return
+            except (ConnectionRefusedError, FileNotFoundError):
+                log("模型服务未运行（请先执行 python whisper_server.py），改为本地处理。")
             except Exception as e:
-                log(f"处理文件 {file} 失败：{e}")
-                continue
-
-            # ========== 写字幕文件 ==========
-            try:
-                if export_format_var.get() == "TXT":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        f.write(result.get("text", ""))
-                else:
-                    segments = result.get("segments", [])
-                    if not segments:
-                        log("无可用字幕段。")
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        for j, seg in enumerate(segments, start=1):
-                            start_sec = seg.get("start", 0.0)
-                            end_sec = seg.get("end", 0.0)
-                            text_seg = seg.get("text", "").strip()
-                            f.write(f"{j}\n")
-                            f.write(f"{format_timestamp(start_sec)} --> {format_timestamp(end_sec)}\n")
-                            f.write(f"{text_seg}\n\n")
-                log(f"✅ 完成处理文件：{task_name}")
-            except Exception as e:
-                log(f"写入字幕文件失败：{e}")
-                continue
-
-            # ========== 统计耗时与 ETA ==========
-            file_elapsed = time.time() - file_start
-            processing_times.append(file_elapsed)
-            processed_durations.append(duration_sec)
-            log(f"⏱ 当前文件用时：{format_hms(file_elapsed)}，音频时长：{format_hms(duration_sec)}")
-
-            if len(processing_times) >= 2 and sum(processed_durations) > 0:
-                avg_speed = sum(processing_times) / sum(processed_durations)  # 秒模型耗时 / 秒音频
-                remaining_files = selected_files[i+1:]
-                remaining_dur = 0
-                for f in remaining_files:
-                    try:
-                        remaining_dur += get_audio_duration(f)
-                    except Exception:
-                        pass
-                if remaining_dur > 0:
-                    eta = remaining_dur * avg_speed
-                    log(f"⏳ 预计剩余时间：约 {format_hms(eta)}（基于历史平均速率）")
-
-            log("-" * 50)
-            time.sleep(0.2)
-
+                log(f"模型服务处理失败：{e}")
+                return
+        engine.process_files(job_queue.paths(), options)
     finally:
-        # 停止状态线程
-        stop_event.set()
-        status_thread.join()
-
         processing = False
-        total_time = time.time() - start_overall
-        log(f"🎉 所有文件处理完毕，总耗时：{format_hms(total_time)}。")
-        enable_all_controls()
+        remote_status_lines = []
+        run_on_ui(enable_all_controls)
 
 # ---------------------- 启动识别 ----------------------
 def start_recognition():
-    if not selected_files:
+    if not job_queue:
         log("请先选择音视频文件或文件夹！")
         return
     if output_mode_var.get() == 2 and not output_folder_var.get().strip():
         log("请选择输出文件夹！")
         return
+    if scanner is not None:
+        log("文件夹还在扫描中：本次只处理已经加入列表的文件。")
+    job_queue.reset_status()
+    update_files_view()
     threading.Thread(target=process_files_func, daemon=True).start()
 
+def refresh_worker_panel():
+    """Tk 主线程中每秒刷新并行进度面板与运行指标面板；工作线程只改 worker_status 字典（使用模型服务时显示服务推送的内容）"""
+    lines = remote_status_lines or engine.status_lines()
+    if lines:
+        worker_status_var.set("\n".join(lines))
+    else:
+        worker_status_var.set("（空闲）")
+    metrics_var.set("\n".join(metrics.registry.panel_lines()) or "（暂无数据，开始识别后显示各阶段用时）")
+    root.after(1000, refresh_worker_panel)
+
 def check_cuda_pytorch():
+    """后台线程：预加载 torch / openai-whisper 并报告导入耗时，然后显示 CUDA 与 PyTorch 版本"""
+    timings = engine.prewarm_backend("openai")
+    log(f"后台预加载完成：{engine.format_import_timings(timings)}")
     try:
+        import torch
         log(f"CUDA是否可用：{torch.cuda.is_available()}")
         log(f"PyTorch版本：{torch.__version__}")
         print("CUDA available:", torch.cuda.is_available())
@@ -463,6 +501,24 @@ def check_cuda_pytorch():
     except Exception as e:
         log(f"检查CUDA和PyTorch失败：{e}")
 
+def offer_resume():
+    """启动时把上次意外中断的批次中未完成的文件放回队列"""
+    manifest = engine.load_batch_manifest()
+    if manifest is None:
+        return
+    files, options = manifest
+    if options.get("backend") != "openai":
+        return
+    job_queue.add(files)
+    update_files_view()
+    log(f"检测到上次未完成的批次：剩余 {len(files)} 个文件已放回队列，点击“开始识别”继续"
+        f"（模型 {options.get('model_name')}，语言 {options.get('lang_option')}）。")
+
+def on_first_paint():
+    """窗口第一次绘制后：报告启动耗时，再在后台线程中预加载与检测"""
+    log(f"窗口就绪，启动用时 {time.perf_counter() - STARTUP_BEGIN:.2f} 秒。")
+    threading.Thread(target=check_cuda_pytorch, daemon=True).start()
+
 # ---------------------- GUI 布局（与 F 版本一致） ----------------------
 main_frame = ttk.Frame(root)
 main_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
@@ -473,14 +529,32 @@ select_files_button = ttk.Button(main_frame, text="选择文件", command=select
 select_files_button.grid(row=0, column=1, sticky="w", padx=5, pady=5)
 select_folder_button = ttk.Button(main_frame, text="选择文件夹", command=select_folder)
 select_folder_button.grid(row=0, column=2, sticky="w", padx=5, pady=5)
-clear_files_button = ttk.Button(main_frame, text="清空", command=clear_files)
-clear_files_button.grid(row=0, column=3, sticky="w", padx=5, pady=5)
-
-# 行1：文件列表显示
-files_text = tk.Text(main_frame, width=80, height=10, wrap='word')
-files_text.grid(row=1, column=0, columnspan=4, sticky="we", padx=5, pady=(0,5))
-files_text.bind("<Key>", lambda e: "break")
-update_files_text()
+file_ops_frame = ttk.Frame(main_frame)
+file_ops_frame.grid(row=0, column=3, sticky="w", padx=5, pady=5)
+clear_files_button = ttk.Button(file_ops_frame, text="清空", command=clear_files)
+clear_files_button.pack(side=tk.LEFT)
+stop_scan_button = ttk.Button(file_ops_frame, text="停止扫描", command=stop_scan, state=tk.DISABLED)
+stop_scan_button.pack(side=tk.LEFT, padx=(10, 0))
+scan_filter_button = ttk.Button(file_ops_frame, text="导入筛选…", command=open_scan_filter_dialog)
+scan_filter_button.pack(side=tk.LEFT, padx=(10, 0))
+
+# 行1：文件列表（Treeview 按页显示：序号 / 文件 / 状态）
+files_frame = ttk.Frame(main_frame)
+files_frame.grid(row=1, column=0, columnspan=4, sticky="we", padx=5, pady=(0,5))
+files_tree = ttk.Treeview(files_frame, columns=("index", "path", "priority", "status"), show="headings", height=10)
+files_tree.heading("index", text="#")
+files_tree.heading("path", text="文件")
+files_tree.heading("priority", text="优先级")
+files_tree.heading("status", text="状态")
+files_tree.column("index", width=60, anchor="e", stretch=False)
+files_tree.column("path", width=580)
+files_tree.column("priority", width=60, anchor="center", stretch=False)
+files_tree.column("status", width=80, anchor="center", stretch=False)
+files_scroll = ttk.Scrollbar(files_frame, orient=tk.VERTICAL, command=files_tree.yview)
+files_tree.configure(yscrollcommand=files_scroll.set)
+files_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+files_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+page_var = tk.StringVar(root, value="")
 
 # 行2：上移/下移/删除
 btn_frame = ttk.Frame(main_frame)
@@ -491,6 +565,14 @@ down_btn = ttk.Button(btn_frame, text="下移", command=move_down)
 down_btn.pack(side=tk.LEFT, padx=5)
 del_btn = ttk.Button(btn_frame, text="删除", command=delete_selected)
 del_btn.pack(side=tk.LEFT, padx=5)
+ttk.Label(btn_frame, text="优先级：").pack(side=tk.LEFT, padx=(20, 0))
+ttk.Spinbox(btn_frame, from_=-99, to=99, textvariable=priority_var, width=4).pack(side=tk.LEFT)
+priority_btn = ttk.Button(btn_frame, text="设为选中", command=set_selected_priority)
+priority_btn.pack(side=tk.LEFT, padx=5)
+ttk.Button(btn_frame, text="上一页", command=lambda: change_page(-1)).pack(side=tk.LEFT, padx=(20, 5))
+ttk.Label(btn_frame, textvariable=page_var).pack(side=tk.LEFT, padx=5)
+ttk.Button(btn_frame, text="下一页", command=lambda: change_page(1)).pack(side=tk.LEFT, padx=5)
+update_files_view()
 
 # 行3：语言与模型
 ttk.Label(main_frame, text="语言选项：").grid(row=3, column=0, sticky="w", padx=5, pady=5)
@@ -524,6 +606,14 @@ export_format_menu.set("SRT")
 ttk.Label(main_frame, text="输出文件名后缀：").grid(row=6, column=0, sticky="w", padx=5, pady=5)
 suffix_entry = ttk.Entry(main_frame, textvariable=suffix_var, width=20)
 suffix_entry.grid(row=6, column=1, sticky="w", padx=5, pady=5)
+ttk.Label(main_frame, text="并行任务数：").grid(row=6, column=2, sticky="w", padx=5, pady=5)
+parallel_frame = ttk.Frame(main_frame)
+parallel_frame.grid(row=6, column=3, sticky="w", padx=5, pady=5)
+workers_spin = ttk.Spinbox(parallel_frame, from_=1, to=64, textvariable=workers_var, width=5)
+workers_spin.pack(side=tk.LEFT)
+ttk.Label(parallel_frame, text="每任务CPU线程（0=自动）：").pack(side=tk.LEFT, padx=(10, 0))
+cpu_threads_spin = ttk.Spinbox(parallel_frame, from_=0, to=256, textvariable=cpu_threads_var, width=5)
+cpu_threads_spin.pack(side=tk.LEFT)
 
 # 行7/8：保存方式 & 输出文件夹
 ttk.Label(main_frame, text="保存位置：").grid(row=7, column=0, sticky="w", padx=5, pady=5)
@@ -538,21 +628,52 @@ select_output_folder_button = ttk.Button(main_frame, text="选择文件夹", com
 select_output_folder_button.grid(row=8, column=3, sticky="w", padx=5, pady=5)
 
 # 行9：开始识别
-start_button = ttk.Button(main_frame, text="开始识别", command=start_recognition, width=15)
-start_button.grid(row=9, column=0, columnspan=4, pady=10)
-
-# 行10：日志区域
+start_frame = ttk.Frame(main_frame)
+start_frame.grid(row=9, column=0, columnspan=4, pady=10)
+start_button = ttk.Button(start_frame, text="开始识别", command=start_recognition, width=15)
+start_button.pack(side=tk.LEFT)
+server_check = ttk.Checkbutton(start_frame, text="使用模型服务（whisper_server.py，模型常驻内存）", variable=use_server_var)
+server_check.pack(side=tk.LEFT, padx=(15, 0))
+ttk.Label(start_frame, text="处理顺序：").pack(side=tk.LEFT, padx=(15, 0))
+schedule_menu = ttk.Combobox(start_frame, textvariable=schedule_var, state="readonly", width=10,
+                             values=[whisper_jobs.SCHEDULE_LABELS[k] for k in whisper_jobs.SCHEDULE_POLICIES])
+schedule_menu.pack(side=tk.LEFT)
+
+# 行10：并行进度面板 + 运行指标面板
+panel_frame = ttk.Frame(main_frame)
+panel_frame.grid(row=10, column=0, columnspan=4, sticky="we", padx=5, pady=(0, 5))
+worker_status_var = tk.StringVar(root, value="（空闲）")
+worker_status_label = ttk.Label(panel_frame, textvariable=worker_status_var, justify=tk.LEFT)
+worker_status_label.pack(side=tk.LEFT, anchor="n")
+metrics_frame = ttk.LabelFrame(panel_frame, text="运行指标")
+metrics_frame.pack(side=tk.RIGHT, anchor="n", padx=(10, 0))
+metrics_var = tk.StringVar(root, value="")
+ttk.Label(metrics_frame, textvariable=metrics_var, justify=tk.LEFT).pack(anchor="w", padx=5, pady=2)
+
+# 行11：日志区域
 logging_text = scrolledtext.ScrolledText(main_frame, width=80, height=8, state=tk.DISABLED)
-logging_text.grid(row=10, column=0, columnspan=4, sticky="nsew", padx=5, pady=5)
+logging_text.grid(row=11, column=0, columnspan=4, sticky="nsew", padx=5, pady=5)
 log_menu = tk.Menu(root, tearoff=0)
 log_menu.add_command(label="全选", command=lambda: logging_text.tag_add("sel", "1.0", "end"))
 logging_text.bind("<Button-3>", lambda e: (log_menu.tk_popup(e.x_root, e.y_root), log_menu.grab_release()))
 
-main_frame.rowconfigure(10, weight=1)
+main_frame.rowconfigure(11, weight=1)
 main_frame.columnconfigure(3, weight=1)
 
 # 启动时检查 CUDA / PyTorch 信息
-check_cuda_pytorch()
+engine.set_log_handler(log)  # 引擎日志同样写入日志窗口
+engine.set_job_status_handler(lambda file, status: run_on_ui(on_job_status, file, status))  # 文件状态 -> 文件列表
+
+# 载入上次保存的媒体信息索引（时长/音轨），已导入过的文件无需再次 ffprobe
+engine.media_index.update(engine.load_media_index())
+offer_resume()  # 上次中断的批次：未完成的文件放回队列
+
+# 启动日志队列与并行进度面板的定时刷新
+flush_ui_queues()
+refresh_worker_panel()
+
+# 窗口画出来之后再检查 CUDA / PyTorch（后台线程）
+root.after_idle(on_first_paint)
 
 # 启动 GUI 主循环
 root.mainloop()
@@ -1,30 +1,40 @@
 # WhisperGUI 带超详细注释的完整脚本（注意：这是整个可运行文件）
 # 目的：对选中的音视频文件使用 faster-whisper 转写并输出 SRT/TXT 字幕文件
-# 说明：如果要运行，请确保已安装：faster-whisper、torch、ffmpeg（系统命令可用）、psutil（可选）等。
+# 说明：如果要运行，请确保已安装：faster-whisper、ffmpeg（系统命令可用）等（本版本不需要 torch）。
+#       转写引擎（解码、分片、模型、写字幕、多线程调度）在同目录的 whisper_engine.py 中，
+#       本脚本只负责界面；没有显示器的机器可以直接使用 whisper_cli.py。
 
+import time
+STARTUP_BEGIN = time.perf_counter()       # 脚本开始执行的时刻，用于报告窗口显示前花了多久
 import os
+import queue
 import threading
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, ttk
-import time
 from datetime import datetime
-from faster_whisper import WhisperModel   # faster-whisper 的模型接口
-import torch                              # 用于判断是否有 CUDA / GPU
-import subprocess                         # 用于调用 ffmpeg / ffprobe
-import json                               # 解析 ffprobe 的 JSON 输出
-import psutil                             # （可选）用于查看系统/进程内存/CPU 信息
+import whisper_engine as engine           # 无界面的转写引擎（与命令行共用）
+import whisper_server                     # 本地模型服务的客户端（勾选“使用模型服务”时）
+import whisper_metrics as metrics         # 各阶段耗时、队列深度、资源占用（运行指标面板）
+import whisper_jobs                       # 文件列表：保持顺序的去重集合 + 每个文件的状态
+import whisper_scan                       # 后台并发扫描文件夹（带导入筛选）
+# 注意：这里不导入 torch / faster_whisper —— 它们要好几秒，窗口显示之后才在后台线程中预加载（见 check_environment）
 
 # ---------------------- 全局变量 ----------------------
-# 下面这些变量用于保存 GUI 状态、选中文件列表、处理进度等。
-selected_files = []      # 列表：累积的音视频文件路径（用户选择）
-current_file_index = 0   # 当前已处理的文件索引（用于进度/状态显示）
-total_files = 0          # 总任务数量（len(selected_files)）
+# 下面这些变量用于保存 GUI 状态、选中文件列表等；处理进度/并行状态由 engine 维护。
+job_queue = whisper_jobs.JobQueue()  # 累积的音视频文件（用户选择），按顺序去重，附带每个文件的处理状态
+FILE_PAGE_SIZE = 500     # 文件列表每页显示多少行：几万个文件时也只往 Treeview 里放一页
+file_page = 0            # 文件列表当前显示的页（0 基）
+scanner = None           # 正在后台扫描的文件夹（whisper_scan.FolderScanner），没有在扫描时为 None
+scan_added = []          # 本次扫描新加入队列的文件（扫描结束后统一预探测媒体信息）
 processing = False       # 标识：程序是否正在处理任务
-supported_extensions = ( # 支持的音视频文件扩展名（便于从文件夹批量加入）
-    ".m4a", ".mp3", ".mp4", ".wav", ".avi", ".vob",
-    ".mov", ".mkv", ".aac", ".flac", ".ogg", ".webm",
-    ".flv", ".rmvb", ".wmv"
-)
+SCHEDULE_BY_LABEL = {label: key for key, label in whisper_jobs.SCHEDULE_LABELS.items()}  # 处理顺序下拉框：显示名称 -> 调度策略
+remote_status_lines = [] # 交给模型服务处理时，服务推送过来的进度面板内容
+
+# 日志 / 界面操作队列：任何线程都只往队列里放，Tk 主线程定时批量取出处理
+LOG_FLUSH_MS = 100         # 主线程刷新日志窗口的间隔（毫秒）
+LOG_MAX_LINES = 5000       # 日志窗口最多保留的行数，超出后删除最早的行
+log_queue = queue.SimpleQueue()      # 待写入日志窗口的文字
+ui_call_queue = queue.SimpleQueue()  # 待在主线程执行的 (函数, 参数)
 
 # ---------------------- Tkinter 初始化 ----------------------
 # 创建主窗口，并设置标题与默认大小
@@ -46,50 +56,147 @@ export_format_var = tk.StringVar(root, value="SRT")  # 导出格式：SRT 或 TX
 output_folder_var = tk.StringVar(root, value="")     # 统一输出文件夹（当用户选择统一存放时使用）
 model_folder_var = tk.StringVar(root, value="")      # 本地模型根目录（如果使用本地模型）
 output_mode_var = tk.IntVar(root, value=1)     # 保存方式：1 = 跟随源文件路径，2 = 统一存放到指定文件夹
+workers_var = tk.IntVar(root, value=1)         # 并行任务数：同时处理的文件数（每个工作线程各自加载一份模型）
+cpu_threads_var = tk.IntVar(root, value=0)     # 每个任务的 CPU 线程数（CTranslate2 cpu_threads，0 = 按核心数自动均分）
+chunk_workers_var = tk.IntVar(root, value=1)   # 片段并行数：同一文件内同时转写的片段数（模型 num_workers）
+vad_chunking_var = tk.BooleanVar(root, value=True)  # VAD 智能分段：在静音处切分并跳过无语音区域
+overlap_var = tk.IntVar(root, value=engine.CHUNK_OVERLAP_SECONDS)  # 固定分段时相邻片段的重叠秒数（0 = 硬切）
+batched_var = tk.BooleanVar(root, value=False)      # 批量推理模式（BatchedInferencePipeline）
+batch_size_var = tk.IntVar(root, value=8)           # 批量推理：每批窗口数
+adaptive_var = tk.BooleanVar(root, value=False)     # 自适应：运行中按内存余量与实测速度调整片段长度 / 批大小
+use_server_var = tk.BooleanVar(root, value=False)   # 交给 whisper_server.py 模型服务处理（模型常驻，不必每次加载）
+schedule_var = tk.StringVar(root, value=whisper_jobs.SCHEDULE_LABELS["fifo"])  # 处理顺序（调度策略，显示中文名称）
+priority_var = tk.IntVar(root, value=0)             # 「设优先级」给选中文件设置的值（越大越先处理，0 为默认）
+# 导入文件夹时的筛选条件（「导入筛选…」对话框中设置）
+scan_include_var = tk.StringVar(root, value="")      # 只导入匹配的文件（通配符，多个用 ; 分隔，如 *.mp4;lecture_*）
+scan_exclude_var = tk.StringVar(root, value="")      # 不导入匹配的文件 / 不扫描匹配的子目录（如 #recycle;*/backup）
+scan_min_size_var = tk.IntVar(root, value=0)         # 文件大小下限（MB，0 = 不限）
+scan_max_size_var = tk.IntVar(root, value=0)         # 文件大小上限（MB，0 = 不限）
+scan_min_duration_var = tk.IntVar(root, value=0)     # 音频时长下限（秒，0 = 不限；需要 ffprobe，扫描会慢一些）
+scan_max_duration_var = tk.IntVar(root, value=0)     # 音频时长上限（秒，0 = 不限）
+scan_skip_existing_var = tk.BooleanVar(root, value=False)  # 跳过按当前输出设置已经有字幕文件的
 
 # ---------------------- 工具函数（format、日志、UI更新） ----------------------
 
-def format_timestamp(seconds):
+def log(msg):
     """
-    将秒数转换为 SRT 时间戳格式：HH:MM:SS,mmm
-    注意输入 seconds 可以是 float（带小数），函数会把毫秒部分保留三位。
+    追加一行日志，前缀带本地时间（时:分:秒）。
+    可以在任何线程中调用：这里只把文字放进 log_queue，真正写入日志窗口的是 Tk 主线程中的 flush_ui_queues，
+    工作线程因此不会直接操作控件，也不会被界面重绘拖慢。
     """
-    hrs = int(seconds // 3600)
-    mins = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds - int(seconds)) * 1000)
-    return f"{hrs:02}:{mins:02}:{secs:02},{millis:03}"
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    log_queue.put(timestamp + msg)
 
 
-def log(msg):
+def run_on_ui(func, *args):
+    """把一次界面操作（如启用/禁用控件）交给 Tk 主线程执行，供工作线程调用。"""
+    ui_call_queue.put((func, args))
+
+
+def flush_ui_queues():
     """
-    在日志窗口（ScrolledText）中追加一行日志，前缀带本地时间（时:分:秒）
-    通过 state 切换实现只读效果，并调用 update_idletasks 确保 UI 及时刷新。
+    Tk 主线程中每 LOG_FLUSH_MS 毫秒执行一次：
+      - 先执行其他线程通过 run_on_ui 提交的界面操作
+      - 再把 log_queue 中积攒的日志一次性插入日志窗口（一次 insert + 一次滚动，而不是每行重绘）
+      - 日志超过 LOG_MAX_LINES 行时删掉最早的部分，长时间运行也不会无限增长
     """
-    timestamp = datetime.now().strftime("[%H:%M:%S] ")
-    logging_text.config(state=tk.NORMAL)
-    logging_text.insert(tk.END, timestamp + msg + "\n")
-    logging_text.see(tk.END)            # 自动滚动到末尾
-    logging_text.update_idletasks()     # 立即刷新 UI
-    logging_text.config(state=tk.DISABLED)
+    while True:
+        try:
+            func, args = ui_call_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            func(*args)
+        except Exception as e:
+            print("界面操作失败：", e)
+
+    lines = []
+    while True:
+        try:
+            lines.append(log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if lines:
+        logging_text.config(state=tk.NORMAL)
+        logging_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(logging_text.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_MAX_LINES:
+            logging_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+        logging_text.see(tk.END)            # 自动滚动到末尾
+        logging_text.config(state=tk.DISABLED)
+    root.after(LOG_FLUSH_MS, flush_ui_queues)
+
+
+def update_files_view():
+    """
+    把 job_queue 当前页（FILE_PAGE_SIZE 行）显示到文件列表 Treeview 中。
+    行的 iid 固定为页内行号 "0"、"1"…：翻页 / 移动时只改已有行的内容，多出或缺少的行才删除或插入，
+    所以无论队列里有多少文件，刷新一次的开销都只与一页的行数有关。
+    """
+    global file_page
+    total = len(job_queue)
+    pages = max(1, (total + FILE_PAGE_SIZE - 1) // FILE_PAGE_SIZE)
+    file_page = min(max(file_page, 0), pages - 1)
+    start = file_page * FILE_PAGE_SIZE
+    rows = job_queue.slice(start, start + FILE_PAGE_SIZE)
+    children = files_tree.get_children()
+    for k, (path, status) in enumerate(rows):
+        values = (start + k + 1, path, job_queue.priority(path) or "", whisper_jobs.STATUS_LABELS[status])
+        if k < len(children):
+            files_tree.item(str(k), values=values)
+        else:
+            files_tree.insert("", tk.END, iid=str(k), values=values)
+    if len(children) > len(rows):
+        files_tree.delete(*children[len(rows):])
+    page_var.set(f"第 {file_page + 1}/{pages} 页，共 {total} 个文件")
+
+
+def change_page(delta):
+    """上一页 / 下一页。"""
+    global file_page
+    file_page += delta
+    files_tree.selection_remove(files_tree.selection())
+    update_files_view()
+
+
+def select_rows(start, end):
+    """选中第 start 到 end 个文件（序号为整个队列中的位置），必要时翻到它们所在的页。"""
+    global file_page
+    file_page = start // FILE_PAGE_SIZE
+    update_files_view()
+    page_start = file_page * FILE_PAGE_SIZE
+    rows = [str(k - page_start) for k in range(start, end + 1) if k - page_start < FILE_PAGE_SIZE]
+    files_tree.selection_set(rows)
+    if rows:
+        files_tree.see(rows[0])
+
+
+def on_job_status(file, status):
+    """（主线程）引擎汇报文件状态：改队列中的状态；文件在当前页时只刷新这一行。"""
+    index = job_queue.set_status(file, status)
+    if index is None:
+        return
+    row = index - file_page * FILE_PAGE_SIZE
+    if 0 <= row < FILE_PAGE_SIZE and files_tree.exists(str(row)):
+        files_tree.set(str(row), "status", whisper_jobs.STATUS_LABELS[status])
 
+# ---------------------- 文件选择/管理函数 ----------------------
 
-def update_files_text():
+def add_to_running_batch(paths):
     """
-    将 selected_files 列表内容刷新显示到文件列表的 Text 控件中。
-    此函数会把 Text 设为可编辑、更新文本、再设回只读，以避免用户误输入。
+    （主线程）识别进行中新导入的文件：交给 engine.add_jobs 加入当前批次，按当前的处理顺序插队，
+    空闲的工作线程会接着处理。使用模型服务、批量推理模式或批次正在收尾时不能加入，提示用户下次再处理。
     """
-    files_text.config(state=tk.NORMAL)
-    files_text.delete("1.0", tk.END)
-    for f in selected_files:
-        files_text.insert(tk.END, f + "\n")
-    files_text.config(state=tk.DISABLED)
+    if not processing or not paths:
+        return
+    if not engine.add_jobs(paths):
+        log(f"新加入的 {len(paths)} 个文件无法加入正在进行的批次（使用模型服务、批量推理模式或批次正在收尾），"
+            f"请在本批次结束后再次点击“开始识别”。")
 
-# ---------------------- 文件选择/管理函数 ----------------------
 
 def select_files():
     """
-    弹出文件选择对话框（支持多选），将用户选择的文件路径加入 selected_files（去重）。
+    弹出文件选择对话框（支持多选），将用户选择的文件路径加入 job_queue（去重）。
     文件类型筛选器与 supported_extensions 保持一致。
     """
     filenames = filedialog.askopenfilenames(
@@ -98,55 +205,133 @@ def select_files():
                    ("All Files", "*.*")]
     )
     if filenames:
-        for f in filenames:
-            if f not in selected_files:
-                selected_files.append(f)
-        update_files_text()
-        log(f"已选择 {len(filenames)} 个文件，当前总计 {len(selected_files)} 个文件。")
+        added = job_queue.add(filenames)
+        update_files_view()
+        log(f"已选择 {len(filenames)} 个文件，当前总计 {len(job_queue)} 个文件。")
+        engine.prefetch_media_info(added)
+        add_to_running_batch(added)
 
 
 def select_folder():
     """
-    弹出文件夹选择对话框，递归扫描文件夹内所有文件，凡是后缀属于 supported_extensions 的就加入 selected_files。
-    用于批量导入。
+    弹出文件夹选择对话框，在后台递归扫描文件夹（whisper_scan.FolderScanner，多个线程并发 scandir），
+    后缀属于 supported_extensions 且符合导入筛选的文件分批加入 job_queue，扫描期间界面照常响应，
+    可以点「停止扫描」取消。用于批量导入。
     """
+    global scanner
+    if scanner is not None:
+        log("正在扫描文件夹，请等待扫描结束或点击「停止扫描」。")
+        return
     folder = filedialog.askdirectory(title="选择音视频文件夹")
     if folder:
-        for root_dir, dirs, files in os.walk(folder):
-            for file in files:
-                if file.lower().endswith(supported_extensions):
-                    full_path = os.path.join(root_dir, file)
-                    if full_path not in selected_files:
-                        selected_files.append(full_path)
-        update_files_text()
-        log(f"从文件夹 {folder} 导入完成，共导入 {len(selected_files)} 个文件。")
+        scan_added.clear()
+        scanner = whisper_scan.FolderScanner(
+            [folder],
+            on_batch=lambda paths: run_on_ui(add_scanned_files, paths),
+            on_done=lambda s: run_on_ui(finish_scan, s, folder),
+            scan_filter=build_scan_filter()
+        )
+        stop_scan_button.config(state=tk.NORMAL)
+        log(f"开始扫描文件夹 {folder}（在后台进行，找到的文件会陆续加入列表）…")
+        scanner.start()
+
+
+def split_patterns(text):
+    """把「a;b；c」这样的通配符列表拆开（中英文分号都可以），忽略空项。"""
+    return [p.strip() for p in text.replace("；", ";").split(";") if p.strip()]
+
+
+def build_scan_filter():
+    """（主线程）按导入筛选设置与当前的输出设置生成 whisper_scan.ScanFilter。"""
+    skip_existing = None
+    if scan_skip_existing_var.get():
+        skip_existing = {
+            "output_mode": output_mode_var.get(),
+            "output_folder": output_folder_var.get().strip(),
+            "suffix": suffix_var.get().strip(),
+            "export_format": export_format_var.get(),
+        }
+    return whisper_scan.ScanFilter(
+        include=split_patterns(scan_include_var.get()),
+        exclude=split_patterns(scan_exclude_var.get()),
+        min_size=read_int_var(scan_min_size_var, default=0, minimum=0) << 20,
+        max_size=read_int_var(scan_max_size_var, default=0, minimum=0) << 20,
+        min_duration=read_int_var(scan_min_duration_var, default=0, minimum=0),
+        max_duration=read_int_var(scan_max_duration_var, default=0, minimum=0),
+        skip_existing=skip_existing
+    )
+
+
+def add_scanned_files(paths):
+    """（主线程）扫描线程交来的一批文件：加入队列并刷新当前页。"""
+    added = job_queue.add(paths)
+    scan_added.extend(added)
+    update_files_view()
+    add_to_running_batch(added)
+
+
+def finish_scan(finished_scanner, folder):
+    """（主线程）扫描结束或被取消：写一行汇总，再在后台预探测新文件的媒体信息。"""
+    global scanner
+    scanner = None
+    stop_scan_button.config(state=tk.DISABLED)
+    log(f"{folder}：{finished_scanner.summary()}。新增 {len(scan_added)} 个文件，当前总计 {len(job_queue)} 个文件。")
+    engine.prefetch_media_info(list(scan_added))
+    scan_added.clear()
+
+
+def stop_scan():
+    """「停止扫描」：已经找到的文件保留在列表中。"""
+    if scanner is not None:
+        scanner.cancel()
+        log("正在停止扫描…")
+
+
+def open_scan_filter_dialog():
+    """「导入筛选…」：设置下次导入文件夹时使用的筛选条件（对已在列表中的文件不起作用）。"""
+    dialog = tk.Toplevel(root)
+    dialog.title("导入筛选")
+    dialog.transient(root)
+    fields = [
+        ("只导入匹配的文件（通配符，多个用 ; 分隔）：", scan_include_var, 40),
+        ("排除的文件 / 子目录（通配符，多个用 ; 分隔）：", scan_exclude_var, 40),
+        ("文件大小下限（MB，0 = 不限）：", scan_min_size_var, 8),
+        ("文件大小上限（MB，0 = 不限）：", scan_max_size_var, 8),
+        ("音频时长下限（秒，0 = 不限）：", scan_min_duration_var, 8),
+        ("音频时长上限（秒，0 = 不限）：", scan_max_duration_var, 8),
+    ]
+    for row, (text, var, width) in enumerate(fields):
+        ttk.Label(dialog, text=text).grid(row=row, column=0, sticky="w", padx=5, pady=3)
+        ttk.Entry(dialog, textvariable=var, width=width).grid(row=row, column=1, sticky="w", padx=5, pady=3)
+    ttk.Checkbutton(dialog, text="跳过已经有字幕文件的（按当前的保存位置、后缀与导出格式判断）",
+                    variable=scan_skip_existing_var).grid(row=len(fields), column=0, columnspan=2, sticky="w", padx=5, pady=3)
+    ttk.Label(dialog, text="设置了时长范围时，扫描中需要逐个 ffprobe，会比较慢（结果会缓存）。").grid(
+        row=len(fields) + 1, column=0, columnspan=2, sticky="w", padx=5, pady=3)
+    ttk.Button(dialog, text="确定", command=dialog.destroy).grid(row=len(fields) + 2, column=0, columnspan=2, pady=8)
 
 
 def clear_files():
     """清空选中文件列表并刷新 UI。"""
-    selected_files.clear()
-    update_files_text()
+    job_queue.clear()
+    update_files_view()
     log("已清空选择的文件。")
 
 # ---------------------- 文件列表控件辅助（上移/下移/删除） ----------------------
 
 def get_selected_line_indices():
     """
-    辅助：从 Text 控件中获取当前选中的文本行（返回 start_line, end_line，0 基）
-    如果没有选区则返回 (None, None)
+    辅助：从文件列表中获取选中的行在整个队列中的区间（返回 start_line, end_line，0 基，含两端；
+    选中的行不连续时取第一行到最后一行）。如果没有选中任何行则返回 (None, None)
     """
-    try:
-        sel_first = files_text.index("sel.first")
-        sel_last = files_text.index("sel.last")
-        start_line = int(sel_first.split('.')[0]) - 1
-        end_line = int(sel_last.split('.')[0]) - 1
-        return start_line, end_line
-    except tk.TclError:
+    rows = [int(iid) for iid in files_tree.selection()]
+    if not rows:
         return None, None
+    page_start = file_page * FILE_PAGE_SIZE
+    return page_start + min(rows), page_start + max(rows)
 
 
 def move_up():
-    """把选中的行（在 selected_files 中对应的项）上移一行（如果可能）。"""
+    """把选中的行（在 job_queue 中对应的项）上移一行（如果可能）。"""
     start_line, end_line = get_selected_line_indices()
     if start_line is None:
         log("请先选择要上移的文件。")
@@ -154,12 +339,8 @@ def move_up():
     if start_line <= 0:
         log("已到顶部，无法上移。")
         return
-    block = selected_files[start_line:end_line + 1]
-    del selected_files[start_line:end_line + 1]
-    new_index = start_line - 1
-    for i, item in enumerate(block):
-        selected_files.insert(new_index + i, item)
-    update_files_text()
+    new_start = job_queue.move_range(start_line, end_line, -1)
+    select_rows(new_start, new_start + end_line - start_line)
 
 
 def move_down():
@@ -168,26 +349,38 @@ def move_down():
     if start_line is None:
         log("请先选择要下移的文件。")
         return
-    if end_line >= len(selected_files) - 1:
+    if end_line >= len(job_queue) - 1:
         log("已到底部，无法下移。")
         return
-    block = selected_files[start_line:end_line + 1]
-    del selected_files[start_line:end_line + 1]
-    new_index = start_line + 1
-    for i, item in enumerate(block):
-        selected_files.insert(new_index + i, item)
-    update_files_text()
+    new_start = job_queue.move_range(start_line, end_line, 1)
+    select_rows(new_start, new_start + end_line - start_line)
 
 
 def delete_selected():
-    """删除 selected_files 中被选中的索引区间。"""
+    """删除 job_queue 中被选中的索引区间。"""
     start_line, end_line = get_selected_line_indices()
     if start_line is None:
         log("请先选择要删除的文件。")
         return
-    del selected_files[start_line:end_line + 1]
-    update_files_text()
-    log("已删除选中的文件。")
+    count = job_queue.remove_range(start_line, end_line)
+    files_tree.selection_remove(files_tree.selection())
+    update_files_view()
+    log(f"已删除选中的 {count} 个文件。")
+
+
+def set_selected_priority():
+    """
+    把选中文件的优先级设为 priority_var 的值（越大越先处理）。
+    只在处理顺序选“按优先级”时起作用；对正在进行的批次中已排队的文件不起作用。
+    """
+    start_line, end_line = get_selected_line_indices()
+    if start_line is None:
+        log("请先选择要设置优先级的文件。")
+        return
+    value = read_int_var(priority_var, default=0, minimum=-99)
+    job_queue.set_priority(start_line, end_line, value)
+    update_files_view()
+    log(f"已把选中的 {end_line - start_line + 1} 个文件的优先级设为 {value}。")
 
 # ---------------------- 输出路径/模型选择 ----------------------
 
@@ -253,8 +446,6 @@ def disable_all_controls():
     这里列举并禁用主要的按钮和输入框。
     """
     start_button.config(state=tk.DISABLED)
-    select_files_button.config(state=tk.DISABLED)
-    select_folder_button.config(state=tk.DISABLED)
     clear_files_button.config(state=tk.DISABLED)
     output_folder_entry.config(state=tk.DISABLED)
     select_output_folder_button.config(state=tk.DISABLED)
@@ -263,13 +454,23 @@ def disable_all_controls():
     model_menu.config(state=tk.DISABLED)
     suffix_entry.config(state=tk.DISABLED)
     model_folder_entry.config(state=tk.DISABLED)
-    files_text.config(state=tk.DISABLED)
     up_btn.config(state=tk.DISABLED)
     down_btn.config(state=tk.DISABLED)
     del_btn.config(state=tk.DISABLED)
+    priority_btn.config(state=tk.DISABLED)
+    schedule_menu.config(state=tk.DISABLED)
     export_format_menu.config(state=tk.DISABLED)
     radio1.config(state=tk.DISABLED)
     radio2.config(state=tk.DISABLED)
+    workers_spin.config(state=tk.DISABLED)
+    cpu_threads_spin.config(state=tk.DISABLED)
+    chunk_workers_spin.config(state=tk.DISABLED)
+    vad_check.config(state=tk.DISABLED)
+    overlap_spin.config(state=tk.DISABLED)
+    batched_check.config(state=tk.DISABLED)
+    batch_size_spin.config(state=tk.DISABLED)
+    adaptive_check.config(state=tk.DISABLED)
+    server_check.config(state=tk.DISABLED)
 
 
 def enable_all_controls():
@@ -277,324 +478,99 @@ def enable_all_controls():
     任务结束后恢复控件可用性；根据保存方式恢复输出路径状态。
     """
     start_button.config(state=tk.NORMAL)
-    select_files_button.config(state=tk.NORMAL)
-    select_folder_button.config(state=tk.NORMAL)
     clear_files_button.config(state=tk.NORMAL)
     select_model_folder_button.config(state=tk.NORMAL)
     lang_menu.config(state=tk.NORMAL)
     model_menu.config(state=tk.NORMAL)
     suffix_entry.config(state=tk.NORMAL)
     model_folder_entry.config(state=tk.NORMAL)
-    files_text.config(state=tk.NORMAL)
     up_btn.config(state=tk.NORMAL)
     down_btn.config(state=tk.NORMAL)
     del_btn.config(state=tk.NORMAL)
+    priority_btn.config(state=tk.NORMAL)
+    schedule_menu.config(state="readonly")
     export_format_menu.config(state="readonly")
     radio1.config(state=tk.NORMAL)
     radio2.config(state=tk.NORMAL)
+    workers_spin.config(state=tk.NORMAL)
+    cpu_threads_spin.config(state=tk.NORMAL)
+    chunk_workers_spin.config(state=tk.NORMAL)
+    vad_check.config(state=tk.NORMAL)
+    overlap_spin.config(state=tk.NORMAL)
+    batched_check.config(state=tk.NORMAL)
+    batch_size_spin.config(state=tk.NORMAL)
+    adaptive_check.config(state=tk.NORMAL)
+    server_check.config(state=tk.NORMAL)
     update_output_folder_state()
 
-# ---------------------- 其他辅助函数（时间、文件大小、时长） ----------------------
+# ---------------------- 其他辅助函数 ----------------------
 
-def format_hms(seconds):
-    """
-    将秒转换为更易读的字符串，例如：
-      - 3661 -> "1小时1分1秒"
-      - 125  -> "2分5秒"
-      - 9    -> "9秒"
-    """
-    seconds = int(seconds)
-    h = seconds // 3600
-    m = (seconds % 3600) // 60
-    s = seconds % 60
-    if h > 0:
-        return f"{h}小时{m}分{s}秒"
-    elif m > 0:
-        return f"{m}分{s}秒"
-    else:
-        return f"{s}秒"
-
-
-def get_total_size_mb(file_list):
-    """
-    计算 file_list 中所有文件的总大小（以 MB 为单位）。
-    用于估算处理速度 / 进度（可选）。
-    """
-    total_bytes = sum(os.path.getsize(f) for f in file_list if os.path.exists(f))
-    return total_bytes / (1024 * 1024)
-
-
-def get_audio_duration(file_path):
-    """
-    使用 ffprobe（ffmpeg 的子工具）以 JSON 模式查询音频/视频文件的时长（秒）。
-    优点：不需要把整个文件加载到内存，快速且准确。
-    返回 float 时长（秒），出错则返回 0。
-    """
+def read_int_var(var, default, minimum):
+    """读取整数型 Tk 变量（如 Spinbox 绑定的 IntVar）；内容非法时返回 default，并保证不小于 minimum。"""
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "json",
-            file_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        data = json.loads(result.stdout)
-        return float(data["format"]["duration"])
-    except Exception:
-        return 0
-
-# ---------------------- 状态刷新线程 ----------------------
-
-def update_status(stop_event, log_func, total_files, processed_files_func):
-    """
-    后台线程：每60秒刷新一次状态（写入日志窗口）。
-    参数：
-      - stop_event：threading.Event，用于停止循环
-      - log_func：用于写日志的函数（可传 log）
-      - total_files：任务总数
-      - processed_files_func：返回已处理文件数的函数（通常 lambda: current_file_index）
-    说明：这个线程只负责周期性写状态日志，不参与转写工作。
-    """
-    while not stop_event.is_set():
-        try:
-            processed = processed_files_func()
-            pending = total_files - processed
-            log_func(f"状态：正在处理任务数量：1，已处理任务数量：{processed}，待处理任务数量：{pending}")
-        except Exception as e:
-            log_func(f"状态刷新出错：{e}")
-        # sleep 分段进行可以更快响应 stop_event
-        for _ in range(60):
-            if stop_event.is_set():
-                break
-            time.sleep(1)
-
-# ---------------------- 分段转写函数（避免一次加载长音频导致内存暴涨） ----------------------
-
-def transcribe_in_chunks(model, input_file, lang_option, chunk_duration=60):
-    """
-    将长音频按若干 chunk（默认 60 秒）分割，每个 chunk 单独用 model.transcribe 转写。
-    主要目的是避免把整个长音频一次性加载到内存或一次性让模型处理导致内存/显存占用异常。
-    使用 ffmpeg 截取片段到临时 wav 文件，识别后删除临时文件。
-    参数：
-      - model：WhisperModel 实例（已加载）
-      - input_file：输入文件路径（音频或视频）
-      - lang_option：语言参数（"Auto" -> None）
-      - chunk_duration：每个片段的持续时间（秒）
-    返回：
-      - all_segments：合并了所有片段并修正时间戳后的 segments 列表
-    注意：
-      - chunk_duration 越小，内存压力越小，但识别上下文（跨片段）无法共享，可能略微影响连贯性。
-      - 如果你需要跨片段更好的连贯，可考虑 overlap（重叠）策略，但会稍微增加运算量。
-    """
-    total_duration = get_audio_duration(input_file)
-    all_segments = []
-    current_start = 0.0
-    index = 1
-
-    # 循环直到覆盖整个音频时长
-    while current_start < total_duration:
-        # 使用 ffmpeg 提取从 current_start 开始，长度为 chunk_duration 的音频片段
-        temp_chunk = f"temp_chunk_{index}.wav"  # 临时 wav 文件名（写在当前工作目录）
-        cmd = [
-            "ffmpeg",
-            "-y",                    # 覆盖输出文件（如果存在）
-            "-ss", str(current_start),  # 起始时间（秒）
-            "-t", str(chunk_duration),   # 持续时长（秒）
-            "-i", input_file,        # 输入文件
-            "-ac", "1",              # 单声道（1 通道）
-            "-ar", "16000",          # 采样率 16kHz（很多 ASR 更稳定）
-            temp_chunk,
-            "-loglevel", "error"     # 仅在出错时显示 ffmpeg 信息，保持日志清爽
-        ]
-        # 运行 ffmpeg，提取片段到磁盘（注意：对非常大的文件，磁盘 IO 较大）
-        subprocess.run(cmd)
-
-        # 转写这个临时片段
-        # 注意：word_timestamps=False（不开启逐词时间戳会更快），vad_filter=False（不做语音活动检测）
-        segments, _ = model.transcribe(
-            temp_chunk,
-            language=None if lang_option.lower() == "auto" else lang_option,
-            task="transcribe",
-            word_timestamps=False,
-            vad_filter=False
-        )
-
-        # 转写结果时间戳是相对于 temp_chunk 的（从 0 开始），所以要把每段时间加上 current_start
-        for seg in segments:
-            seg.start += current_start
-            seg.end += current_start
-            all_segments.append(seg)
+        return max(minimum, int(var.get()))
+    except (tk.TclError, ValueError):
+        return default
 
-        # 删除临时文件以释放磁盘空间（及时清理）
-        try:
-            os.remove(temp_chunk)
-        except Exception:
-            # 如果删除失败也不影响继续处理，只记录日志
-            log(f"警告：无法删除临时文件 {temp_chunk}（请手动删除）。")
 
-        # 前进到下一个片段
-        current_start += chunk_duration
-        index += 1
+def set_remote_status(lines):
+    """模型服务推送的进度面板内容（在客户端线程中调用；面板由 refresh_worker_panel 在主线程刷新）。"""
+    global remote_status_lines
+    remote_status_lines = lines
 
-    return all_segments
 
-# ---------------------- 主处理函数（循环处理 selected_files） ----------------------
+# ---------------------- 主处理函数（读取界面选项，交给 whisper_engine） ----------------------
 
 def process_files_func():
     """
     主工作流程：
       1. 禁用 UI 控件
-      2. 启动后台状态更新线程（每60秒写一次状态）
-      3. 加载 faster-whisper 模型（支持加载本地 snapshot 或直接模型名）
-      4. 对每个文件执行 transcribe_in_chunks（分片转写）
-      5. 把 segments 写入 SRT 或 TXT 文件
-      6. 最终恢复 UI
+      2. 读取界面选项（只在这里读一次 Tk 变量），整理成 engine 的选项字典
+      3. 调用 engine.process_files：按处理顺序分发给 N 个工作线程（或批量推理）、写 SRT/TXT、估算 ETA；
+         处理中导入的文件由 add_to_running_batch 加入同一批次
+         勾选“使用模型服务”时改为提交给 whisper_server.py（服务未启动则仍在本进程处理）
+      4. 最终恢复 UI
     重要：为了防止 GUI 阻塞，这个函数应在单独线程中运行（start_recognition 已在新线程中启动它）
     """
-    global current_file_index, total_files, processing
-    disable_all_controls()
-    current_file_index = 0
-    total_files = len(selected_files)
+    global processing, remote_status_lines
+    run_on_ui(disable_all_controls)  # 控件只能由主线程操作
     processing = True
-
-    # 启动周期性状态刷新线程
-    stop_event = threading.Event()
-    status_thread = threading.Thread(
-        target=update_status,
-        args=(stop_event, log, total_files, lambda: current_file_index),
-        daemon=True
-    )
-    status_thread.start()
-
-    # 统计变量（用于估算）
-    processed_durations = []
-    processing_times = []
-    start_overall = time.time()
-
     try:
-        # 读取用户选项：语言、模型名，并判断是否有 CUDA（GPU）
-        lang_option = lang_var.get().strip()
-        selected_model_name = model_var.get().strip()
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-
-        # ========== 加载模型 ==========
-        try:
-            # 如果用户指定了本地模型文件夹（model_folder_var 非空），尝试从里面加载
-            if model_folder_var.get().strip():
-                model_base_folder = os.path.join(model_folder_var.get().strip(), selected_model_name)
-                snapshots_path = os.path.join(model_base_folder, "snapshots")
-                if not os.path.exists(snapshots_path):
-                    log(f"错误：模型 {selected_model_name} 没有 snapshots 目录")
-                    return
-
-                # 取 snapshots 子目录下的第一个 snapshot（你可以改成选择最新/最大等策略）
-                snapshot_dirs = [d for d in os.listdir(snapshots_path) if os.path.isdir(os.path.join(snapshots_path, d))]
-                if not snapshot_dirs:
-                    log(f"错误：snapshots 目录为空")
-                    return
-
-                model_path = os.path.join(snapshots_path, snapshot_dirs[0])
-                log(f"正在加载本地 Faster-Whisper 模型目录：{model_path}")
-                # compute_type: GPU 使用 float16 可以节省显存，CPU 可使用 int8
-                model = WhisperModel(model_path, device=device, compute_type="float16" if device == "cuda" else "int8")
-            else:
-                # 直接使用官方模型名加载（例如 "tiny", "base", "small", "medium", "large-v3-turbo" 等）
-                log(f"正在加载官方 Faster-Whisper 模型：{selected_model_name}")
-                model = WhisperModel(selected_model_name, device=device, compute_type="float16" if device == "cuda" else "int8")
-            log("模型加载成功。")
-        except Exception as e:
-            log(f"加载模型失败：{e}")
-            return
-
-        # ========== 逐文件处理 ==========
-        for i, file in enumerate(selected_files):
-            current_file_index = i
-            task_name = os.path.basename(file)
-            log(f"开始处理任务 {i+1}/{total_files}：{task_name}")
-            file_start = time.time()
-
-            # 输出路径逻辑：如果选择统一存放，则使用 output_folder_var，否则使用源文件目录
-            if output_mode_var.get() == 2:
-                output_folder = output_folder_var.get().strip()
-                if not output_folder:
-                    log("请选择输出文件夹！")
-                    continue
-            else:
-                output_folder = os.path.dirname(file)
-
-            # 生成输出文件名（name[.suffix].ext）
-            name, _ = os.path.splitext(os.path.basename(file))
-            suffix = suffix_var.get().strip()
-            ext = "txt" if export_format_var.get() == "TXT" else "srt"
-            output_filename = f"{name}.{suffix}.{ext}" if suffix else f"{name}.{ext}"
-            output_path = os.path.join(output_folder, output_filename)
-            log(f"字幕文件将保存至：{output_path}")
-
-            # 获取音频时长（用于估算与日志）
-            try:
-                duration_sec = get_audio_duration(file)
-            except Exception:
-                duration_sec = 0
-
-            # ========== 分片转写（核心）==========
-            try:
-                segments = transcribe_in_chunks(model, file, lang_option, chunk_duration=60)
-            except Exception as e:
-                log(f"处理文件 {file} 失败：{e}")
-                continue
-
-            # ========== 写入字幕文件 ==========
+        options = {
+            "backend": "faster",
+            "model_name": model_var.get().strip(),
+            "model_folder": model_folder_var.get().strip(),
+            "lang_option": lang_var.get().strip(),
+            "workers": read_int_var(workers_var, default=1, minimum=1),
+            "cpu_threads": read_int_var(cpu_threads_var, default=0, minimum=0),
+            "chunk_workers": read_int_var(chunk_workers_var, default=1, minimum=1),
+            "chunking": "vad" if vad_chunking_var.get() else "fixed",
+            "overlap_seconds": read_int_var(overlap_var, default=0, minimum=0),
+            "batched": batched_var.get(),
+            "batch_size": read_int_var(batch_size_var, default=8, minimum=1),
+            "adaptive": adaptive_var.get(),
+            "output_mode": output_mode_var.get(),
+            "output_folder": output_folder_var.get().strip(),
+            "suffix": suffix_var.get().strip(),
+            "export_format": export_format_var.get(),
+            "schedule": SCHEDULE_BY_LABEL.get(schedule_var.get(), "fifo"),
+            "priorities": job_queue.priorities(),
+        }
+        if use_server_var.get():
             try:
-                if export_format_var.get() == "TXT":
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        for seg in segments:
-                            # seg.text 是识别出的文本（可能包含换行）
-                            f.write(seg.text.strip() + "\n")
-                else:
-                    # SRT 格式：编号 \n start --> end \n 文本 \n\n
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        for j, seg in enumerate(segments, start=1):
-                            f.write(f"{j}\n")
-                            f.write(f"{format_timestamp(seg.start)} --> {format_timestamp(seg.end)}\n")
-                            f.write(f"{seg.text.strip()}\n\n")
-                log(f"✅ 完成处理文件：{task_name}")
+                whisper_server.submit(job_queue.paths(), options, log_func=log, progress_func=set_remote_status)
+                return
+            except (ConnectionRefusedError, FileNotFoundError):
+                log("模型服务未运行（请先执行 python whisper_server.py），改为本地处理。")
             except Exception as e:
-                log(f"写入字幕文件失败：{e}")
-                continue
-
-            # ========== 统计与 ETA（简单估算） ==========
-            file_elapsed = time.time() - file_start
-            processing_times.append(file_elapsed)
-            processed_durations.append(duration_sec)
-            log(f"⏱ 当前文件用时：{format_hms(file_elapsed)}，音频时长：{format_hms(duration_sec)}")
-
-            if len(processing_times) >= 2 and sum(processed_durations) > 0:
-                # 平均每秒处理耗时（秒处理比） = 总耗时 / 总音频秒数
-                avg_speed = sum(processing_times) / sum(processed_durations)
-                remaining_files = selected_files[i+1:]
-                remaining_dur = 0
-                for f in remaining_files:
-                    try:
-                        remaining_dur += get_audio_duration(f)
-                    except Exception:
-                        pass
-                if remaining_dur > 0:
-                    eta = remaining_dur * avg_speed
-                    log(f"⏳ 预计剩余时间：约 {format_hms(eta)}（基于历史平均速率）")
-
-            log("-" * 50)
-            time.sleep(0.2)  # 给 UI 一点空隙，保持响应
-
+                log(f"模型服务处理失败：{e}")
+                return
+        # 本进程处理：已加载的模型留在 engine.model_manager 中，下次点击“开始识别”直接复用
+        engine.process_files(job_queue.paths(), options)
     finally:
-        # 停止状态线程并等待线程退出
-        stop_event.set()
-        status_thread.join()
-
         processing = False
-        total_time = time.time() - start_overall
-        log(f"🎉 所有文件处理完毕，总耗时：{format_hms(total_time)}。")
-        enable_all_controls()
+        remote_status_lines = []
+        run_on_ui(enable_all_controls)
 
 # ---------------------- 启动入口与环境检测 ----------------------
 
@@ -605,25 +581,75 @@ def start_recognition():
       - 如果选择了统一输出模式，则确保输出文件夹已选择
       - 在单独线程中运行 process_files_func，避免阻塞主线程（GUI）
     """
-    if not selected_files:
+    if not job_queue:
         log("请先选择音视频文件或文件夹！")
         return
     if output_mode_var.get() == 2 and not output_folder_var.get().strip():
         log("请选择输出文件夹！")
         return
+    if scanner is not None:
+        log("文件夹还在扫描中：本次只处理已经加入列表的文件。")
+    job_queue.reset_status()  # 新批次：所有文件重新标为待处理，引擎处理时逐个更新
+    update_files_view()
     threading.Thread(target=process_files_func, daemon=True).start()
 
 
-def check_cuda_pytorch():
-    """在 GUI 启动时显示 CUDA 是否可用以及 PyTorch 版本，便于排错/确认 GPU 可用性。"""
+def refresh_worker_panel():
+    """
+    在 Tk 主线程中每秒刷新一次并行进度面板（每个工作线程一行）和运行指标面板。
+    工作线程只修改 engine.worker_status 字典，真正操作控件的只有这里，避免跨线程直接改界面。
+    交给模型服务处理时显示服务推送过来的内容（运行指标只统计本进程）。
+    """
+    lines = remote_status_lines or engine.status_lines()
+    if lines:
+        worker_status_var.set("\n".join(lines))
+    else:
+        worker_status_var.set("（空闲）")
+    metrics_var.set("\n".join(metrics.registry.panel_lines()) or "（暂无数据，开始识别后显示各阶段用时）")
+    root.after(1000, refresh_worker_panel)
+
+
+def check_environment():
+    """
+    后台线程（窗口显示之后才启动）：预先导入 CTranslate2 / faster-whisper 并报告各模块导入耗时，
+    然后显示 CUDA 是否可用。faster-whisper 跑在 CTranslate2 上，直接问它有几块 CUDA 设备即可，不需要 torch。
+    点击“开始识别”时这些模块通常已加载完毕；即使还没加载完，工作线程也只是等待同一次导入完成。
+    """
+    timings = engine.prewarm_backend("faster")
+    log(f"后台预加载完成：{engine.format_import_timings(timings)}")
     try:
-        log(f"CUDA是否可用：{torch.cuda.is_available()}")
-        log(f"PyTorch版本：{torch.__version__}")
+        import ctranslate2
+        cuda_count = ctranslate2.get_cuda_device_count()
+        log(f"CUDA是否可用：{cuda_count > 0}（CUDA 设备数：{cuda_count}）")
+        log(f"CTranslate2版本：{ctranslate2.__version__}")
         # 这些 print 主要方便控制台查看（不是必需）
-        print("CUDA available:", torch.cuda.is_available())
-        print("PyTorch version:", torch.__version__)
+        print("CUDA devices:", cuda_count)
+        print("CTranslate2 version:", ctranslate2.__version__)
     except Exception as e:
-        log(f"检查CUDA和PyTorch失败：{e}")
+        log(f"检查CUDA和CTranslate2失败：{e}")
+
+
+def offer_resume():
+    """
+    启动时检查上次是否有意外中断（崩溃、断电、强制关闭）的批次：有就把未完成的文件放回队列，
+    点击“开始识别”即可继续；文件内部已识别的片段由引擎的分片日志自动跳过。
+    """
+    manifest = engine.load_batch_manifest()
+    if manifest is None:
+        return
+    files, options = manifest
+    if options.get("backend") != "faster":
+        return
+    job_queue.add(files)
+    update_files_view()
+    log(f"检测到上次未完成的批次：剩余 {len(files)} 个文件已放回队列，点击“开始识别”继续"
+        f"（模型 {options.get('model_name')}，语言 {options.get('lang_option')}；设置相同才能从断点续传）。")
+
+
+def on_first_paint():
+    """窗口第一次绘制完成后调用：报告启动耗时，再把耗时的预加载 / 环境检测放到后台线程。"""
+    log(f"窗口就绪，启动用时 {time.perf_counter() - STARTUP_BEGIN:.2f} 秒。")
+    threading.Thread(target=check_environment, daemon=True).start()
 
 # ---------------------- GUI 布局（完整） ----------------------
 
@@ -636,15 +662,32 @@ select_files_button = ttk.Button(main_frame, text="选择文件", command=select
 select_files_button.grid(row=0, column=1, sticky="w", padx=5, pady=5)
 select_folder_button = ttk.Button(main_frame, text="选择文件夹", command=select_folder)
 select_folder_button.grid(row=0, column=2, sticky="w", padx=5, pady=5)
-clear_files_button = ttk.Button(main_frame, text="清空", command=clear_files)
-clear_files_button.grid(row=0, column=3, sticky="w", padx=5, pady=5)
-
-# ---- 行1：文件列表显示（Text） ----
-files_text = tk.Text(main_frame, width=80, height=10, wrap='word')
-files_text.grid(row=1, column=0, columnspan=4, sticky="we", padx=5, pady=(0,5))
-# 阻止用户在 Text 中编辑（只允许选择）
-files_text.bind("<Key>", lambda e: "break")
-update_files_text()
+file_ops_frame = ttk.Frame(main_frame)
+file_ops_frame.grid(row=0, column=3, sticky="w", padx=5, pady=5)
+clear_files_button = ttk.Button(file_ops_frame, text="清空", command=clear_files)
+clear_files_button.pack(side=tk.LEFT)
+stop_scan_button = ttk.Button(file_ops_frame, text="停止扫描", command=stop_scan, state=tk.DISABLED)
+stop_scan_button.pack(side=tk.LEFT, padx=(10, 0))
+scan_filter_button = ttk.Button(file_ops_frame, text="导入筛选…", command=open_scan_filter_dialog)
+scan_filter_button.pack(side=tk.LEFT, padx=(10, 0))
+
+# ---- 行1：文件列表显示（Treeview，按页显示：序号 / 文件 / 状态） ----
+files_frame = ttk.Frame(main_frame)
+files_frame.grid(row=1, column=0, columnspan=4, sticky="we", padx=5, pady=(0,5))
+files_tree = ttk.Treeview(files_frame, columns=("index", "path", "priority", "status"), show="headings", height=10)
+files_tree.heading("index", text="#")
+files_tree.heading("path", text="文件")
+files_tree.heading("priority", text="优先级")
+files_tree.heading("status", text="状态")
+files_tree.column("index", width=60, anchor="e", stretch=False)
+files_tree.column("path", width=580)
+files_tree.column("priority", width=60, anchor="center", stretch=False)
+files_tree.column("status", width=80, anchor="center", stretch=False)
+files_scroll = ttk.Scrollbar(files_frame, orient=tk.VERTICAL, command=files_tree.yview)
+files_tree.configure(yscrollcommand=files_scroll.set)
+files_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+files_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+page_var = tk.StringVar(root, value="")
 
 # ---- 行2：上移/下移/删除按钮 ----
 btn_frame = ttk.Frame(main_frame)
@@ -655,6 +698,14 @@ down_btn = ttk.Button(btn_frame, text="下移", command=move_down)
 down_btn.pack(side=tk.LEFT, padx=5)
 del_btn = ttk.Button(btn_frame, text="删除", command=delete_selected)
 del_btn.pack(side=tk.LEFT, padx=5)
+ttk.Label(btn_frame, text="优先级：").pack(side=tk.LEFT, padx=(20, 0))
+ttk.Spinbox(btn_frame, from_=-99, to=99, textvariable=priority_var, width=4).pack(side=tk.LEFT)
+priority_btn = ttk.Button(btn_frame, text="设为选中", command=set_selected_priority)
+priority_btn.pack(side=tk.LEFT, padx=5)
+ttk.Button(btn_frame, text="上一页", command=lambda: change_page(-1)).pack(side=tk.LEFT, padx=(20, 5))
+ttk.Label(btn_frame, textvariable=page_var).pack(side=tk.LEFT, padx=5)
+ttk.Button(btn_frame, text="下一页", command=lambda: change_page(1)).pack(side=tk.LEFT, padx=5)
+update_files_view()
 
 # ---- 行3：语言 & 模型下拉 ----
 ttk.Label(main_frame, text="语言选项：").grid(row=3, column=0, sticky="w", padx=5, pady=5)
@@ -686,11 +737,33 @@ export_format_menu = ttk.Combobox(main_frame, textvariable=export_format_var,
                                   values=["SRT", "TXT"], state="readonly", width=10)
 export_format_menu.grid(row=5, column=1, sticky="w", padx=5, pady=5)
 export_format_menu.set("SRT")
+# 同一行右侧：分段方式
+ttk.Label(main_frame, text="分段方式：").grid(row=5, column=2, sticky="w", padx=5, pady=5)
+chunking_frame = ttk.Frame(main_frame)
+chunking_frame.grid(row=5, column=3, sticky="w", padx=5, pady=5)
+vad_check = ttk.Checkbutton(chunking_frame, text="VAD 智能分段（在静音处切分，跳过无语音部分）",
+                            variable=vad_chunking_var)
+vad_check.pack(side=tk.LEFT)
+ttk.Label(chunking_frame, text="固定分段重叠（秒）：").pack(side=tk.LEFT, padx=(10, 0))
+overlap_spin = ttk.Spinbox(chunking_frame, from_=0, to=30, textvariable=overlap_var, width=5)
+overlap_spin.pack(side=tk.LEFT)
 
 # ---- 行6：输出文件名后缀 ----
 ttk.Label(main_frame, text="输出文件名后缀：").grid(row=6, column=0, sticky="w", padx=5, pady=5)
 suffix_entry = ttk.Entry(main_frame, textvariable=suffix_var, width=20)
 suffix_entry.grid(row=6, column=1, sticky="w", padx=5, pady=5)
+# 同一行右侧：并行任务数 & 每任务 CPU 线程数
+ttk.Label(main_frame, text="并行任务数：").grid(row=6, column=2, sticky="w", padx=5, pady=5)
+parallel_frame = ttk.Frame(main_frame)
+parallel_frame.grid(row=6, column=3, sticky="w", padx=5, pady=5)
+workers_spin = ttk.Spinbox(parallel_frame, from_=1, to=64, textvariable=workers_var, width=5)
+workers_spin.pack(side=tk.LEFT)
+ttk.Label(parallel_frame, text="每任务CPU线程（0=自动）：").pack(side=tk.LEFT, padx=(10, 0))
+cpu_threads_spin = ttk.Spinbox(parallel_frame, from_=0, to=256, textvariable=cpu_threads_var, width=5)
+cpu_threads_spin.pack(side=tk.LEFT)
+ttk.Label(parallel_frame, text="片段并行：").pack(side=tk.LEFT, padx=(10, 0))
+chunk_workers_spin = ttk.Spinbox(parallel_frame, from_=1, to=32, textvariable=chunk_workers_var, width=5)
+chunk_workers_spin.pack(side=tk.LEFT)
 
 # ---- 行7/8：保存方式 & 输出文件夹 ----
 ttk.Label(main_frame, text="保存位置：").grid(row=7, column=0, sticky="w", padx=5, pady=5)
@@ -700,6 +773,16 @@ radio1.grid(row=7, column=1, sticky="w", padx=(5,2), pady=5)
 radio2 = ttk.Radiobutton(main_frame, text="统一存放到指定文件夹", variable=output_mode_var, value=2,
                          command=update_output_folder_state)
 radio2.grid(row=7, column=2, sticky="w", padx=(2,5), pady=5)
+# 同一行右侧：批量推理模式 & 批大小
+batch_frame = ttk.Frame(main_frame)
+batch_frame.grid(row=7, column=3, sticky="w", padx=5, pady=5)
+batched_check = ttk.Checkbutton(batch_frame, text="批量推理（多窗口/多文件凑批）", variable=batched_var)
+batched_check.pack(side=tk.LEFT)
+ttk.Label(batch_frame, text="批大小：").pack(side=tk.LEFT, padx=(10, 0))
+batch_size_spin = ttk.Spinbox(batch_frame, from_=1, to=128, textvariable=batch_size_var, width=5)
+batch_size_spin.pack(side=tk.LEFT)
+adaptive_check = ttk.Checkbutton(batch_frame, text="自适应片段长度/批大小", variable=adaptive_var)
+adaptive_check.pack(side=tk.LEFT, padx=(10, 0))
 ttk.Label(main_frame, text="输出文件夹：").grid(row=8, column=0, sticky="w", padx=5, pady=5)
 output_folder_entry = ttk.Entry(main_frame, textvariable=output_folder_var, width=60, state="disabled")
 output_folder_entry.grid(row=8, column=1, columnspan=2, sticky="w", padx=5, pady=5)
@@ -707,23 +790,57 @@ select_output_folder_button = ttk.Button(main_frame, text="选择文件夹", com
 select_output_folder_button.grid(row=8, column=3, sticky="w", padx=5, pady=5)
 
 # ---- 行9：开始识别按钮 ----
-start_button = ttk.Button(main_frame, text="开始识别", command=start_recognition, width=15)
-start_button.grid(row=9, column=0, columnspan=4, pady=10)
-
-# ---- 行10：日志区域（滚动） ----
+start_frame = ttk.Frame(main_frame)
+start_frame.grid(row=9, column=0, columnspan=4, pady=10)
+start_button = ttk.Button(start_frame, text="开始识别", command=start_recognition, width=15)
+start_button.pack(side=tk.LEFT)
+server_check = ttk.Checkbutton(start_frame, text="使用模型服务（whisper_server.py，模型常驻内存）", variable=use_server_var)
+server_check.pack(side=tk.LEFT, padx=(15, 0))
+ttk.Label(start_frame, text="处理顺序：").pack(side=tk.LEFT, padx=(15, 0))
+schedule_menu = ttk.Combobox(start_frame, textvariable=schedule_var, state="readonly", width=10,
+                             values=[whisper_jobs.SCHEDULE_LABELS[k] for k in whisper_jobs.SCHEDULE_POLICIES])
+schedule_menu.pack(side=tk.LEFT)
+
+# ---- 行10：并行进度面板（每个工作线程一行）与运行指标面板 ----
+panel_frame = ttk.Frame(main_frame)
+panel_frame.grid(row=10, column=0, columnspan=4, sticky="we", padx=5, pady=(0, 5))
+worker_status_var = tk.StringVar(root, value="（空闲）")
+worker_status_label = ttk.Label(panel_frame, textvariable=worker_status_var, justify=tk.LEFT)
+worker_status_label.pack(side=tk.LEFT, anchor="n")
+metrics_frame = ttk.LabelFrame(panel_frame, text="运行指标")
+metrics_frame.pack(side=tk.RIGHT, anchor="n", padx=(10, 0))
+metrics_var = tk.StringVar(root, value="")
+ttk.Label(metrics_frame, textvariable=metrics_var, justify=tk.LEFT).pack(anchor="w", padx=5, pady=2)
+
+# ---- 行11：日志区域（滚动） ----
 logging_text = scrolledtext.ScrolledText(main_frame, width=80, height=8, state=tk.DISABLED)
-logging_text.grid(row=10, column=0, columnspan=4, sticky="nsew", padx=5, pady=5)
+logging_text.grid(row=11, column=0, columnspan=4, sticky="nsew", padx=5, pady=5)
 # 右键菜单示例：在日志窗口右键可以全选
 log_menu = tk.Menu(root, tearoff=0)
 log_menu.add_command(label="全选", command=lambda: logging_text.tag_add("sel", "1.0", "end"))
 logging_text.bind("<Button-3>", lambda e: (log_menu.tk_popup(e.x_root, e.y_root), log_menu.grab_release()))
 
 # 让日志区域随窗口拉伸
-main_frame.rowconfigure(10, weight=1)
+main_frame.rowconfigure(11, weight=1)
 main_frame.columnconfigure(3, weight=1)
 
-# 启动时检查 CUDA / PyTorch 信息
-check_cuda_pytorch()
+# 引擎的日志也写进日志窗口（经由 log_queue，由主线程批量刷新）
+engine.set_log_handler(log)
+# 引擎汇报的文件状态（处理中 / 完成 / 失败…）交给主线程更新文件列表
+engine.set_job_status_handler(lambda file, status: run_on_ui(on_job_status, file, status))
+
+# 读取上次运行留下的媒体信息索引（重复导入同一批文件时不必再 ffprobe）
+engine.media_index.update(engine.load_media_index())
+
+# 上次的批次如果是中途被打断的，把未完成的文件放回队列
+offer_resume()
+
+# 启动日志队列的定时刷新，以及并行进度面板的定时刷新
+flush_ui_queues()
+refresh_worker_panel()
+
+# 窗口画出来之后再在后台预加载模型库、检查 CUDA
+root.after_idle(on_first_paint)
 
 # 启动 GUI 主循环（阻塞直到窗口关闭）
 root.mainloop()
@@ -0,0 +1,58 @@
+import whisper_engine as engine
+
+LEVELS = (15, 30, 60, 120)
+
+
+def make_sizer(start=30, memory="room"):
+    sizer = engine.AdaptiveSizer("片段长度", LEVELS, start, ceiling_bytes=1 << 30, unit="秒")
+    sizer.memory = memory
+    sizer._memory_state = lambda: sizer.memory   # 内存状况由测试直接指定
+    return sizer
+
+
+def run(sizer, rtf_by_level, steps):
+    """模拟 steps 个片段：每次先取长度，再按该档位的 RTF 报告推理用时。"""
+    seen = []
+    for _ in range(steps):
+        size = sizer.value()
+        seen.append(size)
+        sizer.observe(size, size, size * rtf_by_level[size])
+    return seen
+
+
+def test_grows_one_level_after_enough_samples_when_memory_allows():
+    sizer = make_sizer()
+    seen = run(sizer, {15: 0.5, 30: 0.5, 60: 0.4, 120: 0.3}, engine.ADAPTIVE_MIN_SAMPLES * 3 + 1)
+    assert seen[:engine.ADAPTIVE_MIN_SAMPLES] == [30] * engine.ADAPTIVE_MIN_SAMPLES
+    assert seen[engine.ADAPTIVE_MIN_SAMPLES] == 60
+    assert sizer.current == 120
+
+
+def test_falls_back_and_caps_when_rtf_gets_worse():
+    sizer = make_sizer()
+    run(sizer, {15: 0.5, 30: 0.4, 60: 0.8, 120: 0.8}, engine.ADAPTIVE_MIN_SAMPLES * 6)
+    assert sizer.current == 30
+    assert sizer.cap == LEVELS.index(30)   # 本批次不再尝试 60 秒
+
+
+def test_memory_pressure_shrinks_and_blocks_regrowth():
+    sizer = make_sizer(start=60, memory="high")
+    rtf = {level: 0.5 for level in LEVELS}
+    run(sizer, rtf, engine.ADAPTIVE_MIN_SAMPLES + 1)
+    assert sizer.current == 30
+    sizer.memory = "room"
+    run(sizer, rtf, engine.ADAPTIVE_MIN_SAMPLES * 4)
+    assert sizer.current == 30
+
+
+def test_unknown_memory_never_grows():
+    sizer = make_sizer(memory="unknown")
+    run(sizer, {level: 0.5 for level in LEVELS}, engine.ADAPTIVE_MIN_SAMPLES * 4)
+    assert sizer.current == 30
+
+
+def test_start_value_outside_levels_and_nearest_level():
+    sizer = engine.AdaptiveSizer("片段长度", LEVELS, 45)
+    assert sizer.current == 45 and sizer.max_value == 120
+    assert sizer.nearest_level(14.0) == 15
+    assert sizer.nearest_level(100.0) == 120
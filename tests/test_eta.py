@@ -0,0 +1,62 @@
+import pytest
+
+import whisper_engine as engine
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """EtaTracker 用 time.time() 计推理时间：换成可以手动拨动的时钟。"""
+    now = [1000.0]
+    monkeypatch.setattr(engine.time, "time", lambda: now[0])
+    return now
+
+
+def test_prior_gives_estimate_before_any_measurement():
+    tracker = engine.EtaTracker(total_audio=100.0, parallelism=2, total_files=4, prior_rtf=0.5)
+    fraction, rtf, eta = tracker.estimate()
+    assert (fraction, rtf, eta) == (0.0, 0.5, 25.0)   # 100 秒 × 0.5 / 2 个线程
+
+
+def test_no_prior_has_no_estimate_until_measured(clock):
+    tracker = engine.EtaTracker(total_audio=100.0, parallelism=1, total_files=1)
+    assert tracker.estimate() == (0.0, None, None)
+    tracker.begin(1)
+    clock[0] += 10.0
+    tracker.advance(1, 20.0)
+    fraction, rtf, eta = tracker.estimate()
+    assert fraction == pytest.approx(0.2)
+    assert rtf == pytest.approx(0.5)
+    assert eta == pytest.approx(40.0)
+    assert tracker.measured_rtf() == pytest.approx(0.5)
+
+
+def test_measurement_outweighs_prior_as_audio_accumulates(clock):
+    tracker = engine.EtaTracker(total_audio=10000.0, parallelism=1, total_files=1, prior_rtf=1.0)
+    tracker.begin(1)
+    clock[0] += 100.0
+    tracker.advance(1, 1000.0)   # 实测 RTF 0.1
+    _, rtf, _ = tracker.estimate()
+    expected = (1.0 * engine.RTF_PRIOR_WEIGHT + 100.0) / (engine.RTF_PRIOR_WEIGHT + 1000.0)
+    assert rtf == pytest.approx(expected)
+    assert 0.1 < rtf < 1.0
+
+
+def test_finish_deducts_unreported_audio_and_lowers_parallelism():
+    tracker = engine.EtaTracker(total_audio=300.0, parallelism=4, total_files=3, prior_rtf=1.0)
+    tracker.begin(1)
+    tracker.finish(1, 100.0)   # 失败 / 跳过：整个文件从剩余量中扣除
+    tracker.finish(1, 100.0)   # 重复调用无副作用
+    fraction, _, eta = tracker.estimate()
+    assert fraction == pytest.approx(1 / 3)
+    assert eta == pytest.approx(200.0 / 2)   # 只剩 2 个文件，实际并行度为 2
+    tracker.add_files(100.0, 1)
+    assert tracker.estimate()[2] == pytest.approx(300.0 / 3)
+
+
+def test_rtf_history_is_weighted_by_audio(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "RTF_HISTORY_PATH", str(tmp_path / "rtf_history.json"))
+    engine.record_rtf("tiny|cpu|int8|chunked", 0.4, 100.0)
+    engine.record_rtf("tiny|cpu|int8|chunked", 0.1, 300.0)
+    entry = engine.load_rtf_history()["tiny|cpu|int8|chunked"]
+    assert entry["rtf"] == pytest.approx((0.4 * 100 + 0.1 * 300) / 400)
+    assert entry["audio"] == 400.0
@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import whisper_jobs
+
+# (文件序号, 路径, 时长, 优先级)
+JOBS = [(0, "a.mp3", 30.0, 0), (1, "b.mp3", 10.0, 5), (2, "c.mp3", 60.0, 1), (3, "d.mp3", 10.0, 5)]
+
+
+def order(policy):
+    scheduler = whisper_jobs.JobScheduler(policy)
+    for index, path, duration, priority in JOBS:
+        scheduler.put((index, path), duration, priority)
+    return [path for _, path in scheduler.drain()]
+
+
+def test_policies_order_jobs():
+    assert order("fifo") == ["a.mp3", "b.mp3", "c.mp3", "d.mp3"]
+    assert order("sjf") == ["b.mp3", "d.mp3", "a.mp3", "c.mp3"]   # 时长相同按加入顺序
+    assert order("lpt") == ["c.mp3", "a.mp3", "b.mp3", "d.mp3"]
+    assert order("priority") == ["b.mp3", "d.mp3", "c.mp3", "a.mp3"]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        whisper_jobs.JobScheduler("random")
+
+
+def test_same_file_is_queued_once():
+    scheduler = whisper_jobs.JobScheduler()
+    assert scheduler.put((0, "a.mp3"))
+    assert not scheduler.put((1, "a.mp3"))
+    assert "a.mp3" in scheduler
+    assert scheduler.get_nowait() == (0, "a.mp3")
+    with pytest.raises(queue.Empty):
+        scheduler.get_nowait()
+
+
+def test_close_if_idle_waits_for_reserved_additions():
+    scheduler = whisper_jobs.JobScheduler()
+    assert scheduler.reserve()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(scheduler.close_if_idle()))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()           # 有正在加入的文件：不能关闭
+    scheduler.put((0, "late.mp3"))
+    scheduler.release()
+    waiter.join(5)
+    assert result == [False]           # 加入的文件还没被取走
+    assert not scheduler.closed
+    scheduler.get_nowait()
+    assert scheduler.close_if_idle()
+    assert not scheduler.reserve()     # 关闭后不再接受追加
+
+
+def test_close_returns_leftover_count():
+    scheduler = whisper_jobs.JobScheduler()
+    scheduler.put((0, "a.mp3"))
+    scheduler.put((1, "b.mp3"))
+    scheduler.get_nowait()
+    assert scheduler.close() == 1
+    assert not scheduler.reserve()
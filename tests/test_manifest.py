@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import whisper_engine as engine
+
+
+@pytest.fixture
+def manifest_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "APP_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(engine, "BATCH_MANIFEST_PATH", str(tmp_path / "batch_manifest.json"))
+    monkeypatch.setattr(engine, "BATCH_DONE_LOG_PATH", str(tmp_path / "batch_manifest.done.jsonl"))
+    files = []
+    for name in ("a.mp3", "b.mp3", "c.mp3", "d.mp3"):
+        (tmp_path / name).write_bytes(b"")
+        files.append(str(tmp_path / name))
+    yield files
+    engine.clear_batch_manifest()
+
+
+def test_resume_skips_files_in_done_log(manifest_dir):
+    files = manifest_dir
+    engine.save_batch_manifest(files[:3], {"model_name": "tiny"})
+    engine.extend_batch_manifest(files[3:])
+    manifest_bytes = os.path.getsize(engine.BATCH_MANIFEST_PATH)
+    engine.mark_manifest_done(files[0])
+    engine.mark_manifest_done(files[2])
+    # 完成一个文件只追加完成记录，不重写清单
+    assert os.path.getsize(engine.BATCH_MANIFEST_PATH) == manifest_bytes
+    pending, options = engine.load_batch_manifest()
+    assert pending == [files[1], files[3]]
+    assert options == {"model_name": "tiny"}
+
+
+def test_truncated_last_done_line_is_ignored(manifest_dir):
+    files = manifest_dir
+    engine.save_batch_manifest(files, {})
+    engine.mark_manifest_done(files[0])
+    with open(engine.BATCH_DONE_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write('"' + files[1][:5])  # 进程被杀时写了一半
+    assert engine.load_batch_manifest()[0] == files[1:]
+
+
+def test_new_batch_and_clear_drop_old_done_log(manifest_dir):
+    files = manifest_dir
+    engine.save_batch_manifest(files, {})
+    engine.mark_manifest_done(files[0])
+    engine.save_batch_manifest(files, {})
+    assert engine.load_batch_manifest()[0] == files
+    engine.clear_batch_manifest()
+    assert engine.load_batch_manifest() is None
+    assert not os.path.exists(engine.BATCH_DONE_LOG_PATH)
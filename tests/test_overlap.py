@@ -0,0 +1,45 @@
+from collections import namedtuple
+
+import whisper_engine as engine
+
+Word = namedtuple("Word", ["start", "end", "word"])
+
+
+def sentence(*words):
+    """由 (start, end, 文本) 组成带逐词时间戳的句子。"""
+    words = [Word(*w) for w in words]
+    return engine.Segment(words[0].start, words[-1].end, "".join(w.word for w in words), words)
+
+
+def test_trim_splits_sentence_at_word_midpoints():
+    seg = sentence((9.0, 9.6, "a"), (9.6, 10.2, "b"), (10.2, 11.0, "c"))
+    # b 的中点 9.9 < 10，保留；c 的中点 10.6 >= 10，丢弃
+    trimmed, = engine.trim_segments([seg], 0.0, 10.0)
+    assert (trimmed.start, trimmed.end, trimmed.text) == (9.0, 10.2, "ab")
+    assert engine.trim_segments([seg], 10.0, float("inf"))[0].text == "c"
+
+
+def test_trim_without_words_uses_sentence_midpoint():
+    segments = [engine.Segment(8.0, 9.0, "前"), engine.Segment(9.5, 11.0, "后")]
+    assert [s.text for s in engine.trim_segments(segments, 0.0, 10.0)] == ["前"]
+    assert [s.text for s in engine.trim_segments(segments, 10.0, 20.0)] == ["后"]
+
+
+def test_merger_keeps_each_word_once_and_lags_one_chunk():
+    emitted = []
+    merger = engine.ChunkOverlapMerger(lambda end, segments: emitted.append((end, [s.text for s in segments])))
+    # 片段 [0, 12) 与 [8, 20) 重叠 [8, 12)，切点 10：重叠区里两片都识别出了 "x"（中点 9.5）与 "y"（中点 10.5）
+    merger.add(0.0, 12.0, [sentence((1.0, 2.0, "head ")), sentence((9.0, 10.0, "x "), (10.0, 11.0, "y"))])
+    assert emitted == []   # 要等下一片才知道切点
+    merger.add(8.0, 20.0, [sentence((9.0, 10.0, "x "), (10.0, 11.0, "y")), sentence((15.0, 16.0, "tail"))])
+    assert emitted == [(10.0, ["head ", "x "])]
+    merger.finish()
+    assert emitted[1] == (20.0, ["y", "tail"])
+
+
+def test_merger_resume_starts_from_previous_cut():
+    emitted = []
+    merger = engine.ChunkOverlapMerger(lambda end, segments: emitted.extend(s.text for s in segments), left=30.0)
+    merger.add(28.0, 40.0, [engine.Segment(28.5, 29.5, "已写出"), engine.Segment(31.0, 33.0, "新的")])
+    merger.finish()
+    assert emitted == ["新的"]
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pytest
+
+import whisper_engine as engine
+
+SR = engine.PCM_SAMPLE_RATE
+
+
+class FakeProc:
+    """代替 ffmpeg 进程：stdout 直接给出 float32 PCM。"""
+
+    def __init__(self, samples):
+        self.stdout = io.BytesIO(samples.astype(np.float32).tobytes())
+        self.stderr = io.BytesIO(b"")
+        self.returncode = 0
+
+    def wait(self):
+        return 0
+
+    def poll(self):
+        return 0
+
+
+@pytest.fixture
+def pcm_source(monkeypatch):
+    """iter_pcm_windows 读到的音频为样本序号 0, 1, 2, ...（便于核对每个窗口的内容与偏移）。"""
+    def use(seconds):
+        samples = np.arange(int(seconds * SR), dtype=np.float32)
+        monkeypatch.setattr(engine, "open_pcm_stream", lambda input_file, start_time=0.0: FakeProc(samples))
+        return samples
+    return use
+
+
+def test_ring_buffer_wraps_around():
+    ring = engine.PcmRingBuffer(8)
+    ring.write(np.arange(6, dtype=np.float32))
+    assert list(ring.read(4)) == [0, 1, 2, 3]
+    ring.write(np.arange(6, 11, dtype=np.float32))   # 跨过缓冲区末尾
+    assert ring.size == 7 and ring.free == 1
+    assert list(ring.peek(7)) == [4, 5, 6, 7, 8, 9, 10]
+    ring.consume(2)
+    assert list(ring.read(10)) == [6, 7, 8, 9, 10]
+    assert ring.size == 0
+
+
+def test_ring_buffer_rejects_overflow():
+    ring = engine.PcmRingBuffer(4)
+    ring.write(np.zeros(3, dtype=np.float32))
+    with pytest.raises(ValueError):
+        ring.write(np.zeros(2, dtype=np.float32))
+
+
+def test_windows_cover_audio_without_overlap(pcm_source):
+    samples = pcm_source(3.5)
+    windows = list(engine.iter_pcm_windows("a.mp3", 1.0))
+    assert [offset for offset, _ in windows] == [0.0, 1.0, 2.0, 3.0]
+    assert [len(w) for _, w in windows] == [SR, SR, SR, SR // 2]
+    assert np.array_equal(np.concatenate([w for _, w in windows]), samples)
+
+
+def test_windows_overlap_and_start_time(pcm_source):
+    samples = pcm_source(5.0)
+    windows = list(engine.iter_pcm_windows("a.mp3", 2.0, start_time=10.0, overlap_seconds=0.5))
+    assert [offset for offset, _ in windows] == [10.0, 11.5, 13.0]
+    for offset, window in windows:
+        start = int((offset - 10.0) * SR)
+        assert np.array_equal(window, samples[start:start + len(window)])
+    assert windows[-1][0] - 10.0 + len(windows[-1][1]) / SR == 5.0
+
+
+def test_short_overlap_tail_is_folded_into_last_window(pcm_source):
+    # 2.5 秒窗口、0.5 秒重叠：第二个窗口之后只剩 0.5 秒新音频，并入第二个窗口
+    pcm_source(5.0)
+    windows = list(engine.iter_pcm_windows("a.mp3", 2.5, overlap_seconds=0.5))
+    assert [(offset, len(w) / SR) for offset, w in windows] == [(0.0, 2.5), (2.0, 3.0)]
@@ -0,0 +1,170 @@
+# HTTP 转写服务：用假模型离线测试（不加载模型、不调用 ffmpeg）
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import whisper_engine as engine
+import whisper_service as service_module
+
+SEGMENTS = [engine.Segment(0.0, 1.5, " 第一句"), engine.Segment(2.0, 3.25, " 第二句")]
+EXPECTED_SRT = "1\n00:00:00,000 --> 00:00:01,500\n第一句\n\n2\n00:00:02,000 --> 00:00:03,250\n第二句\n\n"
+
+
+class FakeModelManager:
+    def acquire(self, settings, num_workers=1):
+        return "fake-model"
+
+    def release(self, model):
+        pass
+
+    def describe(self):
+        return {}
+
+
+class FakeBackend:
+    """代替 prepare_settings / transcribe_file：gate 打开前识别一直阻塞，用来把队列占满。"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.files = []   # [(识别时的文件路径, 当时文件是否存在)]
+
+    def prepare_settings(self, options, file_count):
+        return {**engine.DEFAULT_SETTINGS, **options, "chunk_workers": 1}
+
+    def transcribe_file(self, model, file, settings, progress_callback=None, on_chunk=None, **kwargs):
+        self.files.append((file, os.path.exists(file)))
+        assert self.gate.wait(10)
+        for seg in SEGMENTS:
+            on_chunk(seg.end, [seg])
+            progress_callback(seg.end)
+        return []
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    backend = FakeBackend()
+    monkeypatch.setattr(engine, "prepare_settings", backend.prepare_settings)
+    monkeypatch.setattr(engine, "transcribe_file", backend.transcribe_file)
+    monkeypatch.setattr(engine, "model_manager", FakeModelManager())
+    monkeypatch.setattr(service_module, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    service = service_module.TranscriptionService({"model_name": "tiny", "result_cache": False},
+                                                  workers=1, queue_size=1).start(preload=False)
+    httpd = service_module.make_server(service, 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}", service, backend
+    backend.gate.set()
+    httpd.shutdown()
+    httpd.server_close()
+    service.stop()
+
+
+def request(url, data=None, content_type="application/json"):
+    """返回 (状态码, 响应头, 响应体文本)；HTTP 错误也照常返回。"""
+    headers = {"Content-Type": content_type} if data is not None else {}
+    req = urllib.request.Request(url, data=data, headers=headers, method="POST" if data is not None else "GET")
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, resp.headers, resp.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read().decode("utf-8")
+
+
+def post_path(base, path, query=""):
+    return request(f"{base}/transcribe{query}", json.dumps({"path": str(path)}).encode("utf-8"))
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_transcribe_local_path_returns_srt(server, tmp_path):
+    base, _, backend = server
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"audio")
+    status, headers, body = post_path(base, media)
+    assert status == 200
+    assert headers["Content-Type"].startswith("application/x-subrip")
+    assert body == EXPECTED_SRT
+    assert backend.files == [(str(media), True)]
+
+
+def test_upload_is_transcribed_and_removed(server):
+    base, _, backend = server
+    status, _, body = request(f"{base}/transcribe?filename=talk.mp3&format=json", b"audio-bytes",
+                              "application/octet-stream")
+    assert status == 200
+    assert json.loads(body) == [{"start": 0.0, "end": 1.5, "text": "第一句"},
+                                {"start": 2.0, "end": 3.25, "text": "第二句"}]
+    (upload, existed), = backend.files
+    assert existed and os.path.basename(upload).endswith("_talk.mp3")
+    assert not os.path.exists(upload)   # 返回结果之前临时文件已删除
+
+
+def test_full_queue_returns_503_with_retry_after(server, tmp_path):
+    base, service, backend = server
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"audio")
+    backend.gate.clear()
+    assert post_path(base, media, "?async=1")[0] == 202
+    wait_until(lambda: service.running == 1)          # 第一个任务已被工作线程取走
+    assert post_path(base, media, "?async=1")[0] == 202   # 第二个占满长度为 1 的队列
+    status, headers, body = post_path(base, media, "?async=1")
+    assert status == 503
+    assert headers["Retry-After"] == str(service_module.RETRY_AFTER_SECONDS)
+    assert "error" in json.loads(body)
+    assert service.health()["jobs"]["rejected"] == 1
+
+
+@pytest.mark.parametrize("body", [b"[]", b'"x"', b"1"])
+def test_non_object_json_body_is_rejected(server, body):
+    base, _, backend = server
+    status, _, text = request(f"{base}/transcribe", body)
+    assert status == 400
+    assert "error" in json.loads(text)
+    assert backend.files == []
+
+
+def test_stream_sends_sse_frames_in_order(server, tmp_path):
+    base, _, _ = server
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"audio")
+    status, headers, body = post_path(base, media, "?stream=1&format=txt")
+    assert status == 200
+    assert headers["Content-Type"].startswith("text/event-stream")
+    assert body.endswith("\n\n")
+    frames = []
+    for block in body[:-2].split("\n\n"):
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        frames.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    assert [event for event, _ in frames] == ["queued", "started", "segment", "progress", "segment", "progress", "done"]
+    assert frames[2][1] == {"start": 0.0, "end": 1.5, "text": "第一句"}
+    assert frames[-1][1]["format"] == "txt"
+    assert frames[-1][1]["result"] == "第一句\n第二句\n"
+
+
+def test_async_job_result_after_completion(server, tmp_path):
+    base, _, backend = server
+    media = tmp_path / "talk.mp3"
+    media.write_bytes(b"audio")
+    backend.gate.clear()
+    status, _, body = post_path(base, media, "?async=1")
+    assert status == 202
+    job = json.loads(body)
+    assert request(f"{base}/jobs/{job['id']}/result")[0] == 409   # 未完成
+    backend.gate.set()
+    wait_until(lambda: json.loads(request(f"{base}/jobs/{job['id']}")[2])["state"] == "done")
+    status, _, text = request(base + job["result_url"])
+    assert status == 200 and text == EXPECTED_SRT
+    status, _, text = request(f"{base}/jobs/{job['id']}/result?format=txt")
+    assert status == 200 and text == "第一句\n第二句\n"
+    assert request(f"{base}/jobs/nope/result")[0] == 404
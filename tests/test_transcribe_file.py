@@ -0,0 +1,42 @@
+import whisper_engine as engine
+
+
+class FakeOpenAIModel:
+    """代替 openai-whisper 模型：记下 transcribe 的参数，返回固定片段。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, file, **kwargs):
+        self.calls.append(kwargs)
+        return {"segments": [{"start": 0.0, "end": 3.5, "text": " 你好"},
+                             {"start": 4.0, "end": 9.0, "text": " 世界"}]}
+
+
+def openai_settings(**overrides):
+    return {**engine.DEFAULT_SETTINGS, "backend": "openai", **overrides}
+
+
+def test_openai_reports_progress_when_segments_go_to_on_chunk():
+    progress, chunks = [], []
+    returned = engine.transcribe_file(FakeOpenAIModel(), "a.mp3", openai_settings(),
+                                      progress_callback=progress.append,
+                                      on_chunk=lambda end, segments: chunks.append((end, len(segments))))
+    assert returned == []
+    assert progress == [9.0]
+    assert chunks == [(9.0, 2)]
+
+
+def test_openai_without_on_chunk_returns_segments():
+    progress = []
+    segments = engine.transcribe_file(FakeOpenAIModel(), "a.mp3", openai_settings(), progress_callback=progress.append)
+    assert [seg.text for seg in segments] == [" 你好", " 世界"]
+    assert progress == [9.0]
+
+
+def test_openai_never_conditions_on_previous_text():
+    # openai-whisper 整个文件一次识别：无论 carry_context 如何都关闭，避免整文件陷入重复
+    for carry_context in (True, False):
+        model = FakeOpenAIModel()
+        engine.transcribe_file(model, "a.mp3", openai_settings(carry_context=carry_context))
+        assert model.calls[0]["condition_on_previous_text"] is False
@@ -0,0 +1,42 @@
+import numpy as np
+
+import whisper_engine as engine
+
+SR = engine.PCM_SAMPLE_RATE
+
+
+def quiet_buffer(seconds, speech=(), amplitude=0.2):
+    """低噪声底上叠加若干段正弦"语音"：speech 为 [(起点秒, 终点秒), ...]。"""
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.001, seconds * SR).astype(np.float32)
+    for start, end in speech:
+        audio[start * SR:end * SR] += amplitude * np.sin(np.arange((end - start) * SR) * 0.1)
+    return audio
+
+
+def regions_seconds(regions):
+    return [(s / SR, e / SR) for s, e in regions]
+
+
+def test_sparse_speech_in_long_quiet_buffer_is_kept():
+    # 语音不到 10% 的帧：不能因为第 90 百分位仍是静音就整段丢弃
+    for seconds, speech in ((90, (40, 45)), (30, (10, 12))):
+        regions = regions_seconds(engine.energy_speech_timestamps(quiet_buffer(seconds, [speech])))
+        assert len(regions) == 1
+        start, end = regions[0]
+        assert start <= speech[0] and end >= speech[1]
+
+
+def test_silence_gaps_split_regions():
+    regions = regions_seconds(engine.energy_speech_timestamps(quiet_buffer(10, [(1, 3), (6, 8)])))
+    assert len(regions) == 2
+    assert regions[0][1] < 6 and regions[1][0] > 3
+
+
+def test_continuous_signal_is_all_speech():
+    audio = (0.3 * np.sin(np.arange(20 * SR) * 0.1)).astype(np.float32)
+    assert engine.energy_speech_timestamps(audio) == [(0, len(audio))]
+
+
+def test_digital_silence_has_no_speech():
+    assert engine.energy_speech_timestamps(np.zeros(5 * SR, np.float32)) == []
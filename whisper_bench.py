@@ -0,0 +1,445 @@
+# WhisperGUI 评测脚本
+# 目的：在自己的机器和素材上量化分片参数的影响，给 whisper_engine 的默认值和用户选参提供依据。
+# 用法：
+#   python whisper_bench.py boundary talk.mp3 --model small --chunk-seconds 30 --overlap 2
+#   python whisper_bench.py boundary talk.mp3 --chunk-seconds 20 --overlap 1 --overlap 3 --json result.json
+#   python whisper_bench.py sweep --model tiny --device cpu --lengths 60 300 --chunk-seconds 30 60 --workers 1 2
+#   python whisper_bench.py sweep --compute-types int8 float32 --decode-modes pipe tempfile --baseline last.json
+# 说明：
+#   boundary：比较“固定硬切”与“重叠 + 逐词去重合并”在切点附近的词错误率。
+#     参考结果 = 整个文件一次交给模型（faster-whisper 内部按 30 秒滑窗、带上下文识别，没有人为切点）；
+#     只统计每个切点前后 --window 秒内的词（中文按字、其他语言按词），两种方式的全部切点都计入。
+#     参考结果要把整段音频读进内存（每小时约 230MB），建议用几分钟到几十分钟的素材。
+#   sweep：在合成音频（或 --inputs 指定的素材）上扫描 片段长度 × 并行任务数 × 计算精度 × 解码方式，
+#     每个配置在独立子进程中走完整的 process_files 流程，报告 RTF（墙钟秒 / 音频秒）、文件/小时、
+#     解码与推理用时、峰值内存，输出表格与 JSON；给出 --baseline 时与上次的 JSON 比较，变慢超过容差则退出码为 1。
+#     合成音频只用来测吞吐量（模型对它的识别结果没有意义），离线、CPU、tiny 模型即可运行。
+
+import os
+import re
+import sys
+import json
+import time
+import wave
+import argparse
+import itertools
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+import whisper_engine as engine
+
+# 分词：中日文逐字，其他语言按字母数字串；忽略大小写与标点
+TOKEN_PATTERN = re.compile(r"[぀-ヿ㐀-鿿]|[^\W_]+")
+
+SYLLABLE_SECONDS = 0.25   # 合成“语音”的音节长度
+WARMUP_SECONDS = 5        # 预热文件长度（秒）
+RESULT_PREFIX = "BENCH_RESULT "   # 子进程输出结果行的前缀
+CONFIG_KEYS = ("chunk_seconds", "workers", "compute_type", "decode_mode")  # 区分配置（与基线对比）的字段
+
+
+def bench_log(msg):
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    print(timestamp + msg, flush=True)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def timed_tokens(segments):
+    """把片段展开成 [(时间, 词), ...]：有逐词时间戳时用词的中点，否则整句的词都记在句子中点。"""
+    result = []
+    for seg in segments:
+        words = getattr(seg, "words", None)
+        if words:
+            for w in words:
+                result.extend(((w.start + w.end) / 2, tok) for tok in tokenize(w.word))
+        else:
+            result.extend(((seg.start + seg.end) / 2, tok) for tok in tokenize(seg.text))
+    return result
+
+
+def edit_distance(ref, hyp):
+    """词序列的编辑距离（替换 / 插入 / 删除各记 1）。"""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def boundary_regions(cuts, window):
+    """每个切点前后 window 秒的区间，重叠的合并成一个，返回按时间排序的 [(起, 止), ...]。"""
+    regions = []
+    for cut in sorted(cuts):
+        start, end = cut - window, cut + window
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def boundary_word_error(reference, hypothesis, regions):
+    """在各边界区间内比较参考与候选的词序列，返回 (错误数, 参考词数)。"""
+    errors = total = 0
+    for start, end in regions:
+        ref = [tok for t, tok in reference if start <= t < end]
+        hyp = [tok for t, tok in hypothesis if start <= t < end]
+        errors += edit_distance(ref, hyp)
+        total += len(ref)
+    return errors, total
+
+
+def chunk_cuts(duration, chunk_seconds, overlap):
+    """固定分片的切点：硬切在每片末尾；重叠时在相邻两片重叠区的中点（与 ChunkOverlapMerger 一致）。"""
+    step = chunk_seconds - overlap
+    cuts = []
+    start = 0.0
+    while start + chunk_seconds < duration:
+        cuts.append(start + chunk_seconds - overlap / 2)
+        start += step
+    return cuts
+
+
+def format_table(headers, rows):
+    """把结果排成等宽文本表格（中文按两个字符宽计算）。"""
+    def width(text):
+        return sum(2 if ord(ch) > 0x2e80 else 1 for ch in text)
+    cells = [headers] + [[str(c) for c in row] for row in rows]
+    widths = [max(width(row[i]) for row in cells) for i in range(len(headers))]
+    lines = []
+    for n, row in enumerate(cells):
+        lines.append("  ".join(c + " " * (w - width(c)) for c, w in zip(row, widths)).rstrip())
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def run_boundary(args):
+    engine.set_log_handler(bench_log)
+    settings = engine.prepare_settings({
+        "backend": "faster",
+        "model_name": args.model,
+        "model_folder": args.model_dir,
+        "lang_option": args.language,
+        "cpu_threads": args.cpu_threads,
+        "chunking": "fixed",
+        "chunk_seconds": args.chunk_seconds,
+    }, 1)
+    if settings is None:
+        return 1
+    overlaps = sorted(set([0.0] + [o for o in args.overlap if o > 0]))
+    for overlap in overlaps:
+        if overlap * 2 > args.chunk_seconds:
+            bench_log(f"错误：重叠 {overlap} 秒超过了片段长度的一半")
+            return 1
+    language = None if args.language.lower() == "auto" else args.language
+    model = engine.load_model(settings)
+
+    bench_log("解码整个文件并生成参考结果（不切分）…")
+    audio = np.concatenate([samples for _, samples in engine.iter_pcm_windows(args.file, 600)])
+    duration = len(audio) / engine.PCM_SAMPLE_RATE
+    start = time.perf_counter()
+    reference = timed_tokens(engine.transcribe_window(model, audio, language, 0.0, word_timestamps=True)[0])
+    reference_time = time.perf_counter() - start
+    del audio
+
+    cuts = set()
+    for overlap in overlaps:
+        cuts.update(chunk_cuts(duration, args.chunk_seconds, overlap))
+    regions = boundary_regions(cuts, args.window)
+    results = [{"mode": "reference", "overlap": None, "seconds": round(reference_time, 2),
+                "rtf": round(reference_time / duration, 4) if duration else None,
+                "errors": 0, "tokens": boundary_word_error(reference, reference, regions)[1], "wer": 0.0}]
+    for overlap in overlaps:
+        bench_log(f"分片识别：片段 {args.chunk_seconds} 秒，重叠 {overlap} 秒…")
+        start = time.perf_counter()
+        segments = engine.transcribe_in_chunks(model, args.file, args.language, chunk_duration=args.chunk_seconds,
+                                               chunking="fixed", overlap=overlap, word_timestamps=True)
+        elapsed = time.perf_counter() - start
+        errors, total = boundary_word_error(reference, timed_tokens(segments), regions)
+        results.append({"mode": "overlap" if overlap > 0 else "fixed", "overlap": overlap,
+                        "seconds": round(elapsed, 2), "rtf": round(elapsed / duration, 4) if duration else None,
+                        "errors": errors, "tokens": total, "wer": round(errors / total, 4) if total else 0.0})
+
+    print()
+    print(f"文件：{args.file}，时长 {engine.format_hms(duration)}，片段 {args.chunk_seconds} 秒，"
+          f"{len(cuts)} 个切点，每个切点前后 {args.window} 秒")
+    rows = [["参考（不切分）" if r["mode"] == "reference" else ("硬切" if r["mode"] == "fixed" else f"重叠 {r['overlap']} 秒"),
+             f"{r['seconds']:.1f}", f"{r['rtf']:.3f}" if r["rtf"] is not None else "-",
+             r["errors"], r["tokens"], f"{r['wer'] * 100:.1f}%"] for r in results]
+    print(format_table(["方式", "用时(秒)", "RTF", "边界错误词", "边界参考词", "边界词错误率"], rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"file": args.file, "duration": duration, "chunk_seconds": args.chunk_seconds,
+                       "window": args.window, "cuts": sorted(cuts), "results": results}, f, ensure_ascii=False, indent=2)
+        bench_log(f"结果已写入 {args.json}")
+    return 0
+
+
+# ---------------------- sweep：合成音频上的吞吐量扫描 ----------------------
+
+def write_synthetic_wav(path, seconds, kind="speech", seed=0):
+    """
+    生成 16kHz 单声道 16 位 WAV（只用标准库 wave + numpy，不需要任何素材）：
+      - "tone"：440Hz 正弦；
+      - "speech"：类语音信号。每 SYLLABLE_SECONDS 一个“音节”，基频 100~220Hz 带 5 个谐波、升余弦包络，
+        其间随机出现成串的静音音节（模拟停顿），再叠加少量噪声。
+    按 10 秒一块生成并写入，长音频也不占多少内存；同样的参数总是生成同样的文件。
+    """
+    rate = engine.PCM_SAMPLE_RATE
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    syllables = int(np.ceil(seconds / SYLLABLE_SECONDS)) + 1
+    f0 = rng.uniform(100, 220, syllables)
+    voiced = np.ones(syllables)
+    pause = False
+    for i in range(syllables):
+        pause = rng.random() < (0.6 if pause else 0.08)
+        voiced[i] = 0.0 if pause else 1.0
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        for begin in range(0, total, 10 * rate):
+            t = np.arange(begin, min(begin + 10 * rate, total)) / rate
+            if kind == "tone":
+                audio = 0.3 * np.sin(2 * np.pi * 440 * t)
+            else:
+                idx = (t / SYLLABLE_SECONDS).astype(int)
+                envelope = 0.5 - 0.5 * np.cos(2 * np.pi * (t % SYLLABLE_SECONDS) / SYLLABLE_SECONDS)
+                audio = sum(np.sin(2 * np.pi * k * f0[idx] * t) / k for k in range(1, 6))
+                audio = 0.2 * audio * envelope * voiced[idx] + rng.normal(0, 0.005, len(t))
+            w.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def synthetic_files(workdir, lengths, count, kind, prefix=""):
+    """每种长度生成 count 个文件（已存在则直接复用），返回路径列表。"""
+    folder = os.path.join(workdir, "synthetic")
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for seconds in lengths:
+        for n in range(1, count + 1):
+            path = os.path.join(folder, f"{prefix}{kind}_{seconds:g}s_{n}.wav")
+            if not os.path.exists(path):
+                write_synthetic_wav(path, seconds, kind, seed=n)
+            files.append(path)
+    return files
+
+
+def peak_rss_mb():
+    """本进程的内存峰值（MB）：Linux / macOS 用 resource，Windows 用 psutil（没装时返回 None）。"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)  # macOS 单位是字节，Linux 是 KB
+
+
+def isolate_app_data(workdir):
+    """把引擎的用户数据（媒体索引、RTF 历史、结果缓存、分片日志、批次清单）改到评测目录，不碰 ~/.whispergui。"""
+    data_dir = os.path.join(workdir, "appdata")
+    for name in ("MEDIA_INDEX_PATH", "RTF_HISTORY_PATH", "RESULT_CACHE_DIR", "JOURNAL_DIR", "BATCH_MANIFEST_PATH",
+                 "BATCH_DONE_LOG_PATH"):
+        setattr(engine, name, os.path.join(data_dir, os.path.basename(getattr(engine, name))))
+    engine.APP_DATA_DIR = data_dir
+
+
+def run_one(config):
+    """
+    在子进程中跑一个配置（每个配置一个新进程，峰值内存互不影响）：
+    先用几个短文件预热（加载模型，计入 warmup_seconds），再正式处理全部文件并计时。
+    结果以 RESULT_PREFIX 开头的一行 JSON 打印到标准输出；引擎日志打印到标准错误。
+    """
+    engine.set_log_handler(lambda msg: print(msg, file=sys.stderr, flush=True))
+    isolate_app_data(config["workdir"])
+    options = {
+        "backend": "faster",
+        "model_name": config["model"],
+        "model_folder": config["model_dir"],
+        "lang_option": config["language"],
+        "device": config["device"],
+        "compute_type": config["compute_type"],
+        "workers": config["workers"],
+        "cpu_threads": config["cpu_threads"],
+        "chunking": config["chunking"],
+        "chunk_seconds": config["chunk_seconds"],
+        "decode_mode": config["decode_mode"],
+        "output_mode": 2,
+        "output_folder": os.path.join(config["workdir"], "out"),
+        "result_cache": False,
+    }
+    os.makedirs(options["output_folder"], exist_ok=True)
+    start = time.perf_counter()
+    engine.process_files(config["warmup_files"], options)  # 模型留在 model_manager 中，正式运行直接复用
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    succeeded = engine.process_files(config["files"], options)
+    wall = time.perf_counter() - start
+    audio = sum(engine.get_audio_duration(f) for f in config["files"])
+    rss = peak_rss_mb()
+    result = {key: config[key] for key in CONFIG_KEYS}
+    result.update({
+        "files": len(config["files"]),
+        "succeeded": succeeded,
+        "audio_seconds": round(audio, 2),
+        "wall_seconds": round(wall, 3),
+        "rtf": round(wall / audio, 4) if audio else None,
+        "files_per_hour": round(len(config["files"]) / wall * 3600, 1) if wall else None,
+        "decode_seconds": round(engine.stage_totals["decode"], 3),
+        "infer_seconds": round(engine.stage_totals["infer"], 3),
+        "wait_seconds": round(engine.stage_totals["wait"], 3),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "warmup_seconds": round(warmup, 2),
+    })
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+    return 0
+
+
+def run_config_subprocess(config, verbose=False):
+    """启动子进程跑一个配置，返回结果字典；子进程失败时返回 None 并打印其最后几行日志。"""
+    cmd = [sys.executable, os.path.abspath(__file__), "run-one", json.dumps(config)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=None if verbose else subprocess.PIPE,
+                          text=True, encoding="utf-8", errors="replace")
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    bench_log(f"配置运行失败（退出码 {proc.returncode}）")
+    for line in (proc.stderr or "").splitlines()[-10:]:
+        print("    " + line)
+    return None
+
+
+def find_regressions(results, baseline_path, tolerance):
+    """与基线 JSON 中相同配置的 RTF 比较，变慢超过 tolerance（比例）的记为回归。"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {tuple(r[k] for k in CONFIG_KEYS): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get(tuple(r[k] for k in CONFIG_KEYS))
+        if old and old.get("rtf") and r.get("rtf") and r["rtf"] > old["rtf"] * (1 + tolerance):
+            regressions.append((r, old))
+    return regressions
+
+
+def run_sweep(args):
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    if args.inputs:
+        files = [os.path.abspath(f) for f in args.inputs]
+    else:
+        bench_log(f"生成合成音频（{args.kind}）：{', '.join(f'{s:g}秒' for s in args.lengths)}，每种 {args.count} 个…")
+        files = synthetic_files(workdir, args.lengths, args.count, args.kind)
+    warmup_files = synthetic_files(workdir, [WARMUP_SECONDS], max(args.workers), args.kind, prefix="warmup_")
+
+    results = []
+    grid = list(itertools.product(args.chunk_seconds, args.workers, args.compute_types, args.decode_modes))
+    for n, (chunk_seconds, workers, compute_type, decode_mode) in enumerate(grid, 1):
+        bench_log(f"[{n}/{len(grid)}] 片段 {chunk_seconds:g} 秒，并行 {workers}，精度 {compute_type}，解码 {decode_mode}")
+        config = {
+            "workdir": workdir, "model": args.model, "model_dir": args.model_dir, "language": args.language,
+            "device": args.device, "cpu_threads": args.cpu_threads, "chunking": args.chunking,
+            "chunk_seconds": chunk_seconds, "workers": workers, "compute_type": compute_type,
+            "decode_mode": decode_mode, "files": files, "warmup_files": warmup_files[:workers],
+        }
+        result = run_config_subprocess(config, args.verbose)
+        if result is not None:
+            results.append(result)
+
+    print()
+    print(f"模型 {args.model}，设备 {args.device}，{len(files)} 个文件，分段方式 {args.chunking}")
+    rows = [[f"{r['chunk_seconds']:g}", r["workers"], r["compute_type"], r["decode_mode"],
+             f"{r['wall_seconds']:.1f}", f"{r['rtf']:.3f}" if r["rtf"] is not None else "-",
+             f"{r['files_per_hour']:.0f}" if r["files_per_hour"] is not None else "-",
+             f"{r['decode_seconds']:.1f}", f"{r['infer_seconds']:.1f}", f"{r['wait_seconds']:.1f}",
+             f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-",
+             f"{r['warmup_seconds']:.1f}"] for r in results]
+    print(format_table(["片段(秒)", "并行", "精度", "解码", "用时(秒)", "RTF", "文件/小时",
+                        "解码(秒)", "推理(秒)", "等待解码(秒)", "峰值内存(MB)", "预热(秒)"], rows))
+
+    json_path = args.json or os.path.join(workdir, "sweep.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({"machine": {"platform": platform.platform(), "cpu_count": os.cpu_count(),
+                               "python": platform.python_version()},
+                   "model": args.model, "device": args.device, "chunking": args.chunking,
+                   "files": [{"path": p, "seconds": engine.get_audio_duration(p)} for p in files],
+                   "results": results}, f, ensure_ascii=False, indent=2)
+    bench_log(f"结果已写入 {json_path}")
+
+    if len(results) < len(grid):
+        return 1
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.tolerance)
+        for r, old in regressions:
+            bench_log(f"⚠ 变慢：片段 {r['chunk_seconds']:g} 秒，并行 {r['workers']}，精度 {r['compute_type']}，"
+                      f"解码 {r['decode_mode']}：RTF {old['rtf']:.3f} → {r['rtf']:.3f}")
+        if regressions:
+            return 1
+        bench_log(f"与基线相比没有超过 {args.tolerance:.0%} 的变慢。")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WhisperGUI 评测：量化分片参数对速度与准确率的影响。")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    boundary = sub.add_parser("boundary", help="比较硬切与重叠合并在切点附近的词错误率（faster-whisper）")
+    boundary.add_argument("file", help="评测用的音视频文件")
+    boundary.add_argument("-m", "--model", default=engine.DEFAULT_SETTINGS["model_name"], help="模型名称")
+    boundary.add_argument("--model-dir", default="", help="本地模型根目录")
+    boundary.add_argument("-l", "--language", default="Auto", help="语言代码，Auto 为自动识别")
+    boundary.add_argument("--cpu-threads", type=int, default=0, help="CPU 线程数，0 = 自动")
+    boundary.add_argument("--chunk-seconds", type=float, default=30, help="片段长度（秒，默认 %(default)s）")
+    boundary.add_argument("--overlap", type=float, action="append", default=[],
+                          help="要评测的重叠秒数，可重复给出（默认 2；硬切总会参与比较）")
+    boundary.add_argument("--window", type=float, default=3.0, help="统计每个切点前后多少秒内的词（默认 %(default)s）")
+    boundary.add_argument("--json", default="", help="把结果另存为 JSON 文件")
+
+    sweep = sub.add_parser("sweep", help="在合成音频上扫描片段长度 / 并行数 / 计算精度 / 解码方式的吞吐量")
+    sweep.add_argument("-m", "--model", default="tiny", help="模型名称（默认 %(default)s）")
+    sweep.add_argument("--model-dir", default="", help="本地模型根目录（离线运行时指定）")
+    sweep.add_argument("-l", "--language", default="en", help="语言代码（默认 %(default)s，固定语言以免检测带来波动）")
+    sweep.add_argument("--device", choices=("auto", "cpu", "cuda"), default="cpu", help="推理设备（默认 %(default)s）")
+    sweep.add_argument("--cpu-threads", type=int, default=0, help="每个推理实例的 CPU 线程数，0 = 自动均分")
+    sweep.add_argument("--chunking", choices=("fixed", "vad"), default="fixed", help="分段方式（默认 %(default)s）")
+    sweep.add_argument("--inputs", nargs="+", default=[], help="用这些素材代替合成音频")
+    sweep.add_argument("--kind", choices=("speech", "tone"), default="speech", help="合成音频类型（默认 %(default)s）")
+    sweep.add_argument("--lengths", type=float, nargs="+", default=[60.0, 300.0], help="合成音频长度（秒，默认 60 300）")
+    sweep.add_argument("--count", type=int, default=2, help="每种长度生成几个文件（默认 %(default)s）")
+    sweep.add_argument("--chunk-seconds", type=float, nargs="+", default=[30.0, 60.0], help="片段长度（默认 30 60）")
+    sweep.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="并行任务数（默认 1 2）")
+    sweep.add_argument("--compute-types", nargs="+", default=["int8", "float32"], help="计算精度（默认 int8 float32）")
+    sweep.add_argument("--decode-modes", nargs="+", choices=("pipe", "tempfile"), default=["pipe", "tempfile"],
+                       help="解码方式（默认 pipe tempfile）")
+    sweep.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "whispergui_bench"),
+                       help="合成音频、输出与评测用数据目录（默认 %(default)s）")
+    sweep.add_argument("--json", default="", help="结果 JSON 路径（默认 <workdir>/sweep.json）")
+    sweep.add_argument("--baseline", default="", help="上次的结果 JSON，用于发现变慢的配置")
+    sweep.add_argument("--tolerance", type=float, default=0.1, help="RTF 变慢超过这个比例算回归（默认 %(default)s）")
+    sweep.add_argument("-v", "--verbose", action="store_true", help="显示各配置运行时的引擎日志")
+
+    run_one_parser = sub.add_parser("run-one", help="运行单个配置（由 sweep 在子进程中调用）")
+    run_one_parser.add_argument("config", help="配置 JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "boundary":
+        args.overlap = args.overlap or [2.0]
+        return run_boundary(args)
+    if args.command == "sweep":
+        return run_sweep(args)
+    return run_one(json.loads(args.config))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# WhisperGUI 命令行版（无界面）
+# 目的：在没有显示器的服务器 / 渲染节点上批量转写音视频并生成 SRT/TXT 字幕，与 GUI 共用 whisper_engine。
+# 用法示例：
+#   python whisper_cli.py D:\videos\*.mp4 --model large-v3 --language zh --workers 2
+#   python whisper_cli.py /data/in --recursive --output-dir /data/out --format txt --backend openai
+#   python whisper_cli.py D:\videos\*.mp4 --server   # 交给已启动的 whisper_server.py（模型常驻，不必重新加载）
+#   python whisper_cli.py --resume                     # 继续上次中断的批次（从第一个未完成的文件、文件内从断点继续）
+#   python whisper_cli.py /data/in -w 4 --schedule lpt # 长文件先开始，多个并行任务同时结束
+#   python whisper_cli.py /data/in --schedule priority --priority "*urgent*=10"
+# 说明：参数可以是文件、通配符（支持 **）或目录；目录按 supported_extensions 过滤。
+
+import os
+import sys
+import glob
+import fnmatch
+import argparse
+from datetime import datetime
+import whisper_engine as engine
+import whisper_metrics as metrics
+import whisper_jobs
+import whisper_server
+
+
+def cli_log(msg):
+    """带时间戳打印到标准输出（与 GUI 日志窗口格式一致）。"""
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    print(timestamp + msg, flush=True)
+
+
+def collect_files(inputs, recursive):
+    """
+    把命令行参数展开成文件列表（保持参数顺序、去重）：
+      - 目录：取其中扩展名受支持的文件（--recursive 时包含子目录）
+      - 通配符：用 glob 展开（** 可匹配多级目录）
+      - 其他：当作普通文件路径
+    """
+    files = []
+    seen = set()
+
+    def add(path):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for root_dir, dirs, names in os.walk(item):
+                    dirs.sort()
+                    for name in sorted(names):
+                        if name.lower().endswith(engine.supported_extensions):
+                            add(os.path.join(root_dir, name))
+            else:
+                for name in sorted(os.listdir(item)):
+                    path = os.path.join(item, name)
+                    if os.path.isfile(path) and name.lower().endswith(engine.supported_extensions):
+                        add(path)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            cli_log(f"警告：找不到文件 {item}，已忽略。")
+    return files
+
+
+def parse_priorities(specs, files):
+    """
+    把 --priority 通配符=优先级 展开成 {文件路径: 优先级}：通配符与完整路径或文件名匹配（不区分大小写），
+    一个文件匹配多条时以后面的为准。格式有误时抛出 ValueError。
+    """
+    rules = []
+    for spec in specs:
+        pattern, sep, value = spec.rpartition("=")
+        if not sep or not pattern or not value.strip().lstrip("+-").isdigit():
+            raise ValueError(f"优先级格式应为 通配符=整数：{spec}")
+        rules.append((pattern.lower(), int(value)))
+    priorities = {}
+    for path in files:
+        full, name = os.path.abspath(path).lower(), os.path.basename(path).lower()
+        for pattern, value in rules:
+            if fnmatch.fnmatchcase(full, pattern) or fnmatch.fnmatchcase(name, pattern):
+                priorities[path] = value
+    return priorities
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="WhisperGUI 命令行版：批量识别音视频并生成 SRT/TXT 字幕（faster-whisper 或 openai-whisper）。")
+    parser.add_argument("inputs", nargs="*", help="音视频文件、通配符或目录")
+    parser.add_argument("--resume", action="store_true",
+                        help="继续上次意外中断的批次（沿用当时的文件与选项，忽略其他参数）")
+    parser.add_argument("-r", "--recursive", action="store_true", help="目录参数包含子目录")
+    parser.add_argument("--backend", choices=engine.BACKENDS, default="faster",
+                        help="faster = faster-whisper（默认），openai = openai-whisper")
+    parser.add_argument("-m", "--model", default=engine.DEFAULT_SETTINGS["model_name"],
+                        help="模型名称（默认 %(default)s）")
+    parser.add_argument("--model-dir", default="",
+                        help="本地模型根目录（faster：<目录>/<模型名>/snapshots；openai：存放 <模型名>.pt 的目录）")
+    parser.add_argument("-l", "--language", default="Auto", help="语言代码，如 zh / en；Auto 为自动识别（默认）")
+    parser.add_argument("-o", "--output-dir", default="", help="字幕统一输出目录（默认与源文件同目录）")
+    parser.add_argument("-s", "--suffix", default="", help="输出文件名后缀：name[.suffix].srt")
+    parser.add_argument("-f", "--format", choices=("srt", "txt"), default="srt", help="输出格式（默认 srt）")
+    parser.add_argument("--device", choices=("auto", "cpu", "cuda"), default="auto", help="推理设备（默认自动检测）")
+    parser.add_argument("--compute-type", default="auto",
+                        help="计算精度：auto（GPU float16 / CPU int8，默认）或 int8、int8_float16、float16、float32 等（仅 faster）")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="并行任务数（同时处理的文件数）")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="每个推理实例的 CPU 线程数，0 = 自动均分")
+    parser.add_argument("--chunk-workers", type=int, default=1, help="同一文件内并行转写的片段数（仅 faster）")
+    parser.add_argument("--chunking", choices=("vad", "fixed"), default="vad",
+                        help="vad = 在静音处切分并跳过静音（默认），fixed = 固定长度切分")
+    parser.add_argument("--chunk-seconds", type=float, default=engine.CHUNK_SECONDS,
+                        help="每个片段的长度（秒，VAD 模式下为目标长度，默认 %(default)s）")
+    parser.add_argument("--overlap", type=float, default=engine.CHUNK_OVERLAP_SECONDS,
+                        help="fixed 模式相邻片段的重叠秒数，在重叠区中点按逐词时间戳去重合并（默认 %(default)s = 硬切）")
+    parser.add_argument("--no-context", action="store_true",
+                        help="不把前一片段的文本作为下一片段的提示（默认携带，人名、术语更连贯）。仅 faster："
+                             "openai-whisper 整个文件一次识别，始终关闭 condition_on_previous_text，此选项对它无效")
+    parser.add_argument("--batched", action="store_true", help="批量推理模式（BatchedInferencePipeline，仅 faster）")
+    parser.add_argument("--batch-size", type=int, default=8, help="批量推理每批窗口数（默认 8）")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="运行中按内存余量与实测 RTF 自动调整片段长度（批量推理模式下调整批大小），以上面的设置为起点")
+    parser.add_argument("--memory-ceiling", type=int, default=0, metavar="MB",
+                        help="自适应调整的常驻内存上限（MB，默认 0 = 按开始时的可用内存自动确定）")
+    parser.add_argument("--schedule", choices=whisper_jobs.SCHEDULE_POLICIES, default="fifo",
+                        help="处理顺序：fifo 按参数顺序（默认）/ sjf 短文件优先 / lpt 长文件优先（多个并行任务时整批更早结束）"
+                             " / priority 按 --priority 给出的优先级")
+    parser.add_argument("--priority", action="append", default=[], metavar="GLOB=N",
+                        help="匹配通配符的文件优先级为 N（越大越先处理，默认 0），可以重复给出；配合 --schedule priority")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用识别结果缓存（默认内容与参数都相同的文件直接取上次的识别结果）")
+    parser.add_argument("--model-cache-mb", type=int, default=None,
+                        help="进程内模型缓存预算（MB），默认 %d" % engine.MODEL_CACHE_BUDGET_MB)
+    parser.add_argument("--metrics-prom", default="",
+                        help="把运行指标（各阶段耗时、队列深度、CPU/内存/显存）以 Prometheus 文本格式定期写到这个文件")
+    parser.add_argument("--metrics-jsonl", default="", help="定期向这个文件追加一行 JSON 格式的运行指标")
+    parser.add_argument("--metrics-interval", type=float, default=engine.DEFAULT_SETTINGS["metrics_interval"],
+                        help="指标采样 / 导出间隔（秒，默认 %(default)s）")
+    parser.add_argument("--server", action="store_true",
+                        help="把任务交给本机的 whisper_server.py 模型服务（未启动时改为本地处理）")
+    parser.add_argument("--port", type=int, default=whisper_server.DEFAULT_PORT, help="模型服务端口（默认 %(default)s）")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.resume:
+        parser.error("请给出要处理的文件，或使用 --resume 继续上次的批次")
+    engine.set_log_handler(cli_log)
+    engine.media_index.update(engine.load_media_index())
+
+    if args.resume:
+        manifest = engine.load_batch_manifest()
+        if manifest is None:
+            cli_log("没有可以继续的批次（上次的批次已正常结束）。")
+            return 2
+        files, options = manifest
+        cli_log(f"继续上次中断的批次：剩余 {len(files)} 个文件。")
+        succeeded = engine.process_files(files, options)
+        cli_log(f"成功 {succeeded} / {len(files)} 个文件。")
+        return 0 if succeeded == len(files) else 1
+
+    files = collect_files(args.inputs, args.recursive)
+    if not files:
+        cli_log("没有找到可处理的音视频文件。")
+        return 2
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    cli_log(f"共 {len(files)} 个文件待处理。")
+    try:
+        priorities = parse_priorities(args.priority, files)
+    except ValueError as e:
+        parser.error(str(e))
+
+    options = {
+        "backend": args.backend,
+        "model_name": args.model,
+        "model_folder": args.model_dir,
+        "lang_option": args.language,
+        "device": args.device,
+        "compute_type": args.compute_type,
+        "workers": max(1, args.workers),
+        "cpu_threads": max(0, args.cpu_threads),
+        "chunk_workers": max(1, args.chunk_workers),
+        "chunking": args.chunking,
+        "chunk_seconds": args.chunk_seconds,
+        "overlap_seconds": args.overlap,
+        "carry_context": not args.no_context,
+        "batched": args.batched,
+        "batch_size": max(1, args.batch_size),
+        "adaptive": args.adaptive,
+        "memory_ceiling_mb": max(0, args.memory_ceiling),
+        "schedule": args.schedule,
+        "priorities": priorities,
+        "output_mode": 2 if args.output_dir else 1,
+        "output_folder": args.output_dir,
+        "suffix": args.suffix,
+        "export_format": args.format.upper(),
+        "model_cache_mb": args.model_cache_mb,
+        "result_cache": not args.no_cache,
+        "metrics_prom": args.metrics_prom,
+        "metrics_jsonl": args.metrics_jsonl,
+        "metrics_interval": max(0.1, args.metrics_interval),
+    }
+    succeeded = None
+    if args.server:
+        try:
+            succeeded = whisper_server.submit(files, options, log_func=cli_log, port=args.port)
+        except (ConnectionRefusedError, FileNotFoundError):
+            cli_log(f"模型服务未运行（127.0.0.1:{args.port}），改为本地处理。")
+    if succeeded is None:
+        succeeded = engine.process_files(files, options)
+        lines = metrics.registry.panel_lines()
+        if lines:
+            cli_log("各阶段用时汇总：")
+            for line in lines:
+                cli_log("  " + line)
+    cli_log(f"成功 {succeeded} / {len(files)} 个文件。")
+    return 0 if succeeded == len(files) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2717 @@
+# WhisperGUI 转写引擎（无界面）
+# 目的：把模型加载、ffmpeg 解码、分片/VAD、批量推理、SRT/TXT 写出、多线程调度等全部放在这里，
+#       GUI 脚本和命令行（whisper_cli.py）都只是它的“外壳”，在没有显示器的服务器上也能直接 import 使用。
+# 说明：本模块不导入 tkinter；faster-whisper / openai-whisper / torch 都在真正需要时才导入。
+#       日志通过 log() 输出，默认打印到控制台，GUI 用 set_log_handler 把它接到日志窗口。
+
+import os
+import importlib
+import queue
+import threading
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+import subprocess                         # 用于调用 ffmpeg / ffprobe
+import json                               # 解析 ffprobe 的 JSON 输出
+import gzip                               # 识别结果缓存的压缩存储
+import hashlib
+import numpy as np                        # PCM 音频缓冲（faster-whisper / openai-whisper 依赖中都已包含 numpy）
+import whisper_metrics as metrics         # 各阶段耗时、队列深度、资源占用（GUI 指标面板 / 导出）
+import whisper_jobs                       # 批次内的任务调度（JobScheduler）
+
+# ---------------------- 常量 ----------------------
+supported_extensions = (  # 支持的音视频文件扩展名
+    ".m4a", ".mp3", ".mp4", ".wav", ".avi", ".vob",
+    ".mov", ".mkv", ".aac", ".flac", ".ogg", ".webm",
+    ".flv", ".rmvb", ".wmv"
+)
+
+# ffmpeg 管道解码参数：16kHz 单声道 float32（faster-whisper 直接接受这种 numpy 数组）
+PCM_SAMPLE_RATE = 16000
+PCM_BYTES_PER_SAMPLE = 4
+PIPE_READ_BYTES = 1 << 16  # 每次从 ffmpeg stdout 读取的字节数（64KB）
+
+# VAD 智能分段参数：静音至少持续这么久才允许在此处切分；每段语音前后保留的余量
+VAD_MIN_SILENCE_MS = 500
+VAD_SPEECH_PAD_MS = 200
+# 能量检测（后备 VAD）：高于这个 dBFS 的帧无论噪声底多高都算语音；响、静两端差距不足 ENERGY_MIN_CONTRAST_DB
+# 时无法区分语音与静音，整段按语音处理（宁可多识别一段背景音，也不能丢掉内容）
+ENERGY_SPEECH_FLOOR_DB = -35.0
+ENERGY_SILENCE_DB = -50.0
+ENERGY_MIN_CONTRAST_DB = 6.0
+
+# 批量推理模式下每个窗口的长度（秒），与 Whisper 模型一次处理的 30 秒输入一致
+BATCH_WINDOW_SECONDS = 30
+
+# 固定分片模式每片的长度（秒）；VAD 模式下也是每片的目标长度
+CHUNK_SECONDS = 60
+
+# 固定分片模式相邻片段的默认重叠（秒）：0 = 硬切；大于 0 时在重叠区中点按逐词时间戳去重合并
+CHUNK_OVERLAP_SECONDS = 0
+# 重叠切分时，最后剩下的新音频不足这么多秒就并入上一个窗口，避免为几乎全是重叠区的尾窗多做一次识别
+OVERLAP_MIN_TAIL_SECONDS = 1.0
+
+# 自适应片段长度 / 批大小（AdaptiveSizer）：候选档位、每档至少观测几次才比较、放大后 RTF 变差多少即退回
+ADAPTIVE_CHUNK_LEVELS = (15, 30, 60, 120, 240, 480)
+ADAPTIVE_BATCH_LEVELS = (1, 2, 4, 8, 16, 32, 64)
+ADAPTIVE_MIN_SAMPLES = 2
+ADAPTIVE_RTF_TOLERANCE = 0.05
+ADAPTIVE_RESERVE_MB = 512   # 系统可用内存至少保留这么多（或总内存的 10%，取大者），低于它就缩小
+
+# 解码 / 推理流水线：解码线程最多领先推理多少个片段（识别第 N 片时第 N+1、N+2 片已在解码）
+PREFETCH_CHUNKS = 2
+
+# 跨片段上下文：上一片识别出的文本作为下一片的 initial_prompt，最多保留这么多字符
+# （faster-whisper 会把提示再截到模型上限约 223 个 token）
+CONTEXT_PROMPT_CHARS = 200
+
+# 识别流程的版本号：分片 / VAD / 解码参数等改动会影响输出时加 1，旧的识别结果缓存随之失效
+ENGINE_VERSION = 2
+
+# 媒体信息（时长/编码/声道）缓存：每个文件只 ffprobe 一次，结果持久化到用户目录下的索引文件
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".whispergui")
+MEDIA_INDEX_PATH = os.path.join(APP_DATA_DIR, "media_index.json")
+PROBE_WORKERS = 8        # 导入文件时并发运行的 ffprobe 数量
+media_index = {}         # 绝对路径 -> {"size", "mtime_ns", "duration", "codec", "channels", "sample_rate"}
+media_index_lock = threading.Lock()
+media_index_dirty = False  # 内存中的索引是否有尚未写回磁盘的改动
+
+# ETA 估算：按 模型/设备/计算精度 记录历次运行的实时率（RTF = 推理秒 / 音频秒），作为下次估算的先验
+RTF_HISTORY_PATH = os.path.join(APP_DATA_DIR, "rtf_history.json")
+RTF_PRIOR_WEIGHT = 300     # 历史 RTF 先验相当于多少秒“已观测音频”
+RTF_HISTORY_CAP = 3600     # 历史记录最多按多少秒音频计权，让最近几次运行的速度占主导
+eta_tracker = None         # 当前批次的 EtaTracker（未在处理时为 None）
+chunk_sizer = None         # 当前批次的自适应片段长度 AdaptiveSizer（未开启自适应或未在处理时为 None）
+batch_sizer = None         # 同上，批量推理模式的自适应批大小
+
+# 识别结果缓存：按“内容指纹 + 识别参数”保存片段，同一段录音（即使改名/移动过）再次处理时直接取结果
+RESULT_CACHE_DIR = os.path.join(APP_DATA_DIR, "results")
+FINGERPRINT_SAMPLE_BYTES = 1 << 16   # 指纹从文件开头 / 中间 / 结尾各取这么多字节（64KB）
+cache_stats = {"hits": 0, "misses": 0}  # 本批次的缓存命中 / 未命中数（在 stats_lock 下修改）
+
+# 断点续传：每个文件的分片日志，以及记录整批文件与已完成文件的批次清单
+JOURNAL_DIR = os.path.join(APP_DATA_DIR, "journal")
+BATCH_MANIFEST_PATH = os.path.join(APP_DATA_DIR, "batch_manifest.json")
+BATCH_DONE_LOG_PATH = os.path.join(APP_DATA_DIR, "batch_manifest.done.jsonl")  # 已完成文件，每完成一个追加一行
+batch_manifest = None      # 当前批次清单（内存副本），只在批次开始 / 追加文件时写回磁盘
+manifest_lock = threading.Lock()
+running_batch = None       # 正在处理的批次 (调度器, settings, stats, 本批次全部输入文件的 path_key 集合,
+                           # 补足工作线程的函数)，add_jobs 向这里追加文件；未在处理时为 None
+
+# ---------------------- 运行状态（供界面 / 命令行读取） ----------------------
+worker_status = {}         # 工作线程编号 -> 当前状态文字（并行进度面板）
+stats_lock = threading.Lock()  # 保护多个工作线程共享的统计数据
+processed_count = 0        # 本批次已处理完成的文件数量
+stage_totals = {"decode": 0.0, "infer": 0.0, "wait": 0.0}  # 本批次各文件流水线阶段用时之和（秒，在 stats_lock 下修改）
+_log_handler = print       # 日志输出函数，GUI 通过 set_log_handler 替换
+_job_status_handler = None # 文件状态回调 func(文件路径, 状态)，GUI 通过 set_job_status_handler 设置（更新文件列表）
+
+
+def set_log_handler(func):
+    """设置日志输出函数（例如 GUI 的日志窗口），默认直接 print。"""
+    global _log_handler
+    _log_handler = func
+
+
+def log(msg):
+    """输出一行日志（线程安全与否取决于 handler，GUI 的 handler 只是放入队列）。"""
+    _log_handler(msg)
+
+
+def set_job_status_handler(func):
+    """设置文件状态回调 func(文件路径, 状态)；状态为 whisper_jobs 中的 running / done / failed / skipped / cached。"""
+    global _job_status_handler
+    _job_status_handler = func
+
+
+def report_job_status(file, status):
+    """在工作线程中汇报一个文件的状态（没有设置回调时什么也不做）。"""
+    if _job_status_handler is not None:
+        _job_status_handler(file, status)
+
+# ---------------------- 格式化 / 通用辅助 ----------------------
+
+def format_timestamp(seconds):
+    """
+    将秒数转换为 SRT 时间戳格式：HH:MM:SS,mmm
+    注意输入 seconds 可以是 float（带小数），函数会把毫秒部分保留三位。
+    """
+    hrs = int(seconds // 3600)
+    mins = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millis = int((seconds - int(seconds)) * 1000)
+    return f"{hrs:02}:{mins:02}:{secs:02},{millis:03}"
+
+
+def format_hms(seconds):
+    """
+    将秒转换为更易读的字符串，例如：
+      - 3661 -> "1小时1分1秒"
+      - 125  -> "2分5秒"
+      - 9    -> "9秒"
+    """
+    seconds = int(seconds)
+    h = seconds // 3600
+    m = (seconds % 3600) // 60
+    s = seconds % 60
+    if h > 0:
+        return f"{h}小时{m}分{s}秒"
+    elif m > 0:
+        return f"{m}分{s}秒"
+    else:
+        return f"{s}秒"
+
+
+def get_total_size_mb(file_list):
+    """
+    计算 file_list 中所有文件的总大小（以 MB 为单位）。
+    用于估算处理速度 / 进度（可选）。
+    """
+    total_bytes = sum(os.path.getsize(f) for f in file_list if os.path.exists(f))
+    return total_bytes / (1024 * 1024)
+
+# ---------------------- 媒体信息缓存（ffprobe 结果索引） ----------------------
+
+def ffprobe_media(file_path):
+    """
+    使用 ffprobe（ffmpeg 的子工具）以 JSON 模式一次性查询文件的时长与第一条音轨的信息。
+    优点：不需要把整个文件加载到内存，快速且准确。
+    返回字典 {"duration": 秒, "codec": 编码名, "channels": 声道数, "sample_rate": 采样率}，
+    出错时 duration 为 0，其余为 None。
+    """
+    info = {"duration": 0.0, "codec": None, "channels": None, "sample_rate": None}
+    try:
+        cmd = [
+            "ffprobe",
+            "-v", "error",
+            "-show_entries", "format=duration:stream=codec_type,codec_name,channels,sample_rate",
+            "-of", "json",
+            file_path
+        ]
+        with metrics.registry.timer("probe"):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        data = json.loads(result.stdout)
+        info["duration"] = float(data.get("format", {}).get("duration", 0) or 0)
+        for stream in data.get("streams", []):
+            if stream.get("codec_type") == "audio":
+                info["codec"] = stream.get("codec_name")
+                info["channels"] = stream.get("channels")
+                info["sample_rate"] = int(stream.get("sample_rate", 0) or 0) or None
+                break
+    except Exception:
+        pass
+    return info
+
+
+def load_media_index():
+    """启动时读取磁盘上的媒体信息索引（文件不存在或损坏时返回空字典）。"""
+    try:
+        with open(MEDIA_INDEX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_media_index():
+    """把媒体信息索引写回磁盘（先写临时文件再替换，避免中途退出把索引写坏）。"""
+    global media_index_dirty
+    with media_index_lock:
+        if not media_index_dirty:
+            return
+        snapshot = dict(media_index)
+        media_index_dirty = False
+    try:
+        os.makedirs(os.path.dirname(MEDIA_INDEX_PATH), exist_ok=True)
+        tmp_path = MEDIA_INDEX_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, MEDIA_INDEX_PATH)
+    except Exception as e:
+        log(f"保存媒体信息索引失败：{e}")
+
+
+def get_media_info(file_path):
+    """
+    查询媒体信息（时长/编码/声道/采样率），带缓存：
+    以绝对路径为键，同时记录文件大小和修改时间，三者都一致才算命中，
+    否则（新文件或文件已被修改）重新调用 ffprobe 并更新索引。
+    """
+    global media_index_dirty
+    path = os.path.abspath(file_path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {"duration": 0.0, "codec": None, "channels": None, "sample_rate": None}
+    with media_index_lock:
+        entry = media_index.get(path)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return entry
+    entry = ffprobe_media(path)
+    entry["size"] = st.st_size
+    entry["mtime_ns"] = st.st_mtime_ns
+    with media_index_lock:
+        media_index[path] = entry
+        media_index_dirty = True
+    return entry
+
+
+def forget_media_info(file_path):
+    """从媒体信息索引中去掉一个文件（例如用完即删的临时文件），避免索引里堆积再也不会出现的路径。"""
+    global media_index_dirty
+    with media_index_lock:
+        if media_index.pop(os.path.abspath(file_path), None) is not None:
+            media_index_dirty = True
+
+
+def prefetch_media_info(file_list):
+    """
+    后台线程：文件导入队列时就并发探测所有未缓存文件的媒体信息，完成后写回磁盘索引。
+    之后无论是处理时取时长还是估算 ETA，都只是查字典。
+    """
+    def worker():
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+            infos = list(pool.map(get_media_info, file_list))
+        save_media_index()
+        total = sum(info.get("duration", 0) for info in infos)
+        log(f"媒体信息已就绪：{len(file_list)} 个文件，总时长 {format_hms(total)}（用时 {time.time() - start:.1f} 秒）")
+
+    if file_list:
+        threading.Thread(target=worker, daemon=True).start()
+
+
+def get_audio_duration(file_path):
+    """返回文件时长（秒），出错返回 0。数据来自 get_media_info 的缓存索引。"""
+    return get_media_info(file_path).get("duration", 0) or 0
+
+# ---------------------- 识别结果缓存（内容指纹） ----------------------
+
+def compute_fingerprint(file_path, size):
+    """
+    快速内容指纹：sha1(文件大小 + 开头/中间/结尾各 64KB)。只读约 192KB，几 GB 的视频也是毫秒级；
+    与路径、文件名、修改时间无关，所以改名或移动过的同一份录音也能命中。
+    """
+    h = hashlib.sha1(str(size).encode("ascii"))
+    with open(file_path, "rb") as f:
+        for offset in (0, max(0, size // 2 - FINGERPRINT_SAMPLE_BYTES // 2), max(0, size - FINGERPRINT_SAMPLE_BYTES)):
+            f.seek(offset)
+            h.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def get_fingerprint(file_path):
+    """取文件的内容指纹，结果记在媒体信息索引里（文件大小/修改时间变了会随索引一起失效）；读不了返回 None。"""
+    global media_index_dirty
+    entry = get_media_info(file_path)
+    if entry.get("fingerprint"):
+        return entry["fingerprint"]
+    if "size" not in entry:
+        return None  # 文件不存在
+    try:
+        fingerprint = compute_fingerprint(file_path, entry["size"])
+    except OSError:
+        return None
+    with media_index_lock:
+        entry["fingerprint"] = fingerprint
+        media_index_dirty = True
+    return fingerprint
+
+
+def result_cache_key(file_path, settings):
+    """
+    识别结果缓存键：内容指纹 + 会影响识别结果的参数（引擎版本、后端、模型、精度、语言、分片方式与参数）。
+    并行数、批大小、输出格式等只影响速度或写法，不计入；分片参数只计入所选解码方式实际用到的，
+    例如 tempfile 模式总是固定长度切分、不重叠，改 chunking / overlap 不会让它的缓存失效。
+    """
+    fingerprint = get_fingerprint(file_path)
+    if fingerprint is None:
+        return None
+    params = [ENGINE_VERSION, fingerprint, settings["backend"], settings["model_name"],
+              os.path.basename(os.path.normpath(settings["model_path"])), settings["compute_type"], settings["lang_option"].lower()]
+    if settings["backend"] == "faster":
+        vad = settings["chunking"] == "vad"
+        if settings["batched"]:
+            # 固定 30 秒窗口；chunking 只决定是否跳过整窗静音
+            params += ["batched", BATCH_WINDOW_SECONDS, settings["chunking"]]
+        else:
+            params += [settings["decode_mode"], settings["chunk_seconds"]]
+            if settings["decode_mode"] == "pipe":
+                params.append(settings["chunking"])
+                if not vad and settings["overlap_seconds"] > 0:
+                    params.append(settings["overlap_seconds"])  # 重叠只用于 fixed 切分
+            else:
+                vad = False  # tempfile 模式总是固定长度切分
+            if not settings["carry_context"]:
+                params.append("no_context")  # pipe 与 tempfile 顺序识别都会携带前文
+            if settings["adaptive"]:
+                params.append("adaptive")  # 片段长度在运行中变化，与固定长度的结果分开缓存
+        if vad:
+            params += [VAD_MIN_SILENCE_MS, VAD_SPEECH_PAD_MS]
+    return hashlib.sha1(json.dumps(params).encode("utf-8")).hexdigest()
+
+
+def result_cache_path(key):
+    return os.path.join(RESULT_CACHE_DIR, key[:2], key + ".json.gz")
+
+
+def load_cached_result(key):
+    """按缓存键读取识别结果，返回 Segment 列表；没有或损坏时返回 None。"""
+    try:
+        with gzip.open(result_cache_path(key), "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return [Segment(start, end, text) for start, end, text in data["segments"]]
+    except Exception:
+        return None
+
+
+def store_cached_result(key, segments, source):
+    """把识别结果写进缓存（gzip 压缩的 JSON，时间保留到毫秒）；先写临时文件再替换。"""
+    path = result_cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {"source": os.path.basename(source),
+                "segments": [[round(seg.start, 3), round(seg.end, 3), seg.text] for seg in segments]}
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log(f"写入识别结果缓存失败：{e}")
+
+
+def format_cache_line():
+    """进度面板 / 日志中的一行缓存统计；本批次还没有查询过缓存时返回 None。"""
+    with stats_lock:
+        hits, misses = cache_stats["hits"], cache_stats["misses"]
+    if hits + misses == 0:
+        return None
+    return f"识别结果缓存：命中 {hits}，未命中 {misses}"
+
+# ---------------------- 断点续传（分片日志 / 批次清单） ----------------------
+
+class ChunkJournal:
+    """
+    单个文件的分片日志（追加写入的 JSONL）：每完成一个片段，就在 JOURNAL_DIR/<缓存键>.jsonl 末尾追加一行
+    {"end": 片段结束秒数, "segments": [[start, end, text], ...]} 并 fsync。
+      - 进程中途退出后再次处理同一文件时，从最后一个完整片段的结束处继续（ffmpeg -ss 跳过已完成部分）
+      - 最后写字幕时逐行从日志读回片段（对象本身可重复迭代），识别结果不必全部留在内存里
+    文件名用 result_cache_key：内容或参数（模型、语言、分片方式…）变了就是另一份日志，不会把两次结果拼在一起。
+    """
+
+    def __init__(self, key):
+        self.path = os.path.join(JOURNAL_DIR, key + ".jsonl")
+        self.resume_from = 0.0
+        self._file = None
+
+    def open(self):
+        """读取已有日志，打开以便追加，返回可以续传的起点（秒）；末尾写了一半的行会被截掉。"""
+        good_bytes = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        self.resume_from = float(json.loads(line)["end"])
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    good_bytes += len(line)
+        except FileNotFoundError:
+            pass
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._file.truncate(good_bytes)
+        return self.resume_from
+
+    def append(self, chunk_end, segments):
+        """记录一个已完成的片段（transcribe_in_chunks 的 on_chunk 回调，按时间顺序调用）。"""
+        record = {"end": round(chunk_end, 3),
+                  "segments": [[round(seg.start, 3), round(seg.end, 3), seg.text] for seg in segments]}
+        self._file.write((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __iter__(self):
+        """按顺序读回日志中的全部片段（Segment）。"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                for start, end, text in json.loads(line)["segments"]:
+                    yield Segment(start, end, text)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """文件已成功写出：删除日志。"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def save_batch_manifest(files, options):
+    """批次开始时记录整批文件与选项；进程意外退出后，load_batch_manifest 据此从第一个未完成的文件继续。"""
+    global batch_manifest
+    options = dict(options)
+    for key in ("model_folder", "output_folder"):
+        if options.get(key):
+            options[key] = os.path.abspath(options[key])  # 续传时的工作目录可能不同
+    with manifest_lock:
+        batch_manifest = {"files": [os.path.abspath(f) for f in files], "options": options}
+        try:
+            os.remove(BATCH_DONE_LOG_PATH)  # 上一个批次留下的完成记录
+        except OSError:
+            pass
+        write_batch_manifest_locked()
+
+
+def extend_batch_manifest(files):
+    """批次进行中追加的文件也记入清单，意外中断后一并续传。"""
+    with manifest_lock:
+        if batch_manifest is not None:
+            batch_manifest["files"].extend(os.path.abspath(f) for f in files)
+            write_batch_manifest_locked()
+
+
+def mark_manifest_done(file_path):
+    """
+    某个文件的字幕已写出（或命中缓存）：在完成记录末尾追加一行（路径的 JSON 字符串）。
+    不重写整个清单，大批次下每个文件的开销也是常数；load_batch_manifest 读取时合并。
+    """
+    with manifest_lock:
+        if batch_manifest is not None:
+            try:
+                with open(BATCH_DONE_LOG_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(os.path.abspath(file_path), ensure_ascii=False) + "\n")
+            except Exception as e:
+                log(f"保存批次清单失败：{e}")
+
+
+def write_batch_manifest_locked():
+    try:
+        os.makedirs(APP_DATA_DIR, exist_ok=True)
+        tmp_path = BATCH_MANIFEST_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(batch_manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, BATCH_MANIFEST_PATH)
+    except Exception as e:
+        log(f"保存批次清单失败：{e}")
+
+
+def clear_batch_manifest():
+    """批次正常结束（不论成败）：删除清单，下次启动不再提示续传。"""
+    global batch_manifest
+    with manifest_lock:
+        batch_manifest = None
+        for path in (BATCH_MANIFEST_PATH, BATCH_DONE_LOG_PATH):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def load_batch_manifest():
+    """
+    读取上次意外中断的批次：返回 (未完成的文件列表（保持原顺序）, 当时的选项)；没有可续传的批次时返回 None。
+    已不存在的文件会被略过。
+    """
+    try:
+        with open(BATCH_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        done = set(manifest.get("done", []))  # 旧版本把完成列表写在清单里
+        try:
+            with open(BATCH_DONE_LOG_PATH, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line))
+                    except ValueError:
+                        break  # 进程被杀时写了一半的最后一行
+        except FileNotFoundError:
+            pass
+        pending = [f for f in manifest["files"] if f not in done and os.path.exists(f)]
+    except Exception:
+        return None
+    return (pending, manifest["options"]) if pending else None
+
+# ---------------------- 进度 / ETA 估算 ----------------------
+
+class EtaTracker:
+    """
+    增量式进度与剩余时间估算器，所有方法都是 O(1)，可以在每个片段完成时调用：
+      - 开始前就知道整批文件的总音频时长，之后只维护几个累加值（已完成音频秒数、对应的推理耗时）
+      - RTF = 推理耗时 / 音频秒数；历史 RTF 作为先验（相当于 RTF_PRIOR_WEIGHT 秒的音频），
+        与本次实测值按音频量加权，因此从第一个片段起就有估计，且实测越多越以实测为准
+      - ETA = 剩余音频秒数 × RTF / 并行数
+    每个工作线程是一条“流”（stream_id），按 begin -> advance... -> finish 的顺序汇报。
+    """
+
+    def __init__(self, total_audio, parallelism, total_files, prior_rtf=None):
+        self.total_audio = total_audio
+        self.parallelism = max(1, parallelism)
+        self.files_left = total_files
+        self.prior_rtf = prior_rtf
+        self.audio_done = 0.0      # 已识别完成并计时的音频秒数
+        self.audio_skipped = 0.0   # 失败/跳过等没有计时的音频秒数（只从剩余量中扣除）
+        self.busy_time = 0.0       # 上述已完成音频实际花费的推理时间（各线程累加）
+        self._streams = {}         # stream_id -> (当前文件已识别到的秒数, 上次汇报时间)
+        self._lock = threading.Lock()
+
+    def add_files(self, audio, count):
+        """批次进行中又加入了 count 个文件、共 audio 秒音频。"""
+        with self._lock:
+            self.total_audio += audio
+            self.files_left += count
+
+    def begin(self, stream_id, done_sec=0.0):
+        """某条流开始处理一个新文件（或批量推理开始）；从断点续传时 done_sec 为已完成的部分，直接从剩余量中扣除。"""
+        with self._lock:
+            self.audio_skipped += done_sec
+            self._streams[stream_id] = (done_sec, time.time())
+
+    def advance(self, stream_id, done_sec):
+        """汇报该流当前文件已识别到 done_sec 秒：只累加与上次汇报之间的增量。"""
+        now = time.time()
+        with self._lock:
+            last_done, last_time = self._streams.get(stream_id, (0.0, now))
+            if done_sec > last_done:
+                self.audio_done += done_sec - last_done
+                self.busy_time += now - last_time
+                self._streams[stream_id] = (done_sec, now)
+
+    def finish(self, stream_id, duration):
+        """该流的文件结束（成功、失败或跳过）：没汇报到的剩余部分直接从剩余量中扣除。重复调用无副作用。"""
+        with self._lock:
+            if stream_id not in self._streams:
+                return
+            last_done, _ = self._streams.pop(stream_id)
+            if duration > last_done:
+                self.audio_skipped += duration - last_done
+            self.files_left -= 1
+
+    def measured_rtf(self):
+        """本次运行实测的 RTF（没有数据时为 None），用于写回历史。"""
+        with self._lock:
+            return self.busy_time / self.audio_done if self.audio_done > 0 else None
+
+    def estimate(self):
+        """返回 (完成比例 0~1, 当前 RTF 估计或 None, 预计剩余秒数或 None)。"""
+        with self._lock:
+            if self.prior_rtf is not None:
+                rtf = (self.prior_rtf * RTF_PRIOR_WEIGHT + self.busy_time) / (RTF_PRIOR_WEIGHT + self.audio_done)
+            elif self.audio_done > 0:
+                rtf = self.busy_time / self.audio_done
+            else:
+                rtf = None
+            finished = self.audio_done + self.audio_skipped
+            remaining = max(0.0, self.total_audio - finished)
+            # 剩余文件数少于线程数时，实际并行度也随之下降
+            parallel = max(1, min(self.parallelism, self.files_left))
+        fraction = min(1.0, finished / self.total_audio) if self.total_audio > 0 else 0.0
+        eta = remaining * rtf / parallel if rtf is not None else None
+        return fraction, rtf, eta
+
+
+def rtf_history_key(settings):
+    """历史 RTF 的键：模型名 / 设备 / 计算精度，批量推理模式单独记录（速度差异很大）。"""
+    model_name = os.path.basename(os.path.normpath(settings["model_path"]))
+    mode = "batched" if settings["batched"] else "chunked"
+    return f"{model_name}|{settings['device']}|{settings['compute_type']}|{mode}"
+
+
+def load_rtf_history():
+    """读取历史 RTF 记录 {键: {"rtf", "audio"}}（不存在或损坏时返回空字典）。"""
+    try:
+        with open(RTF_HISTORY_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def record_rtf(key, rtf, audio_seconds):
+    """把本次实测 RTF 按音频量加权合并进历史记录（历史权重封顶 RTF_HISTORY_CAP 秒）。"""
+    history = load_rtf_history()
+    old = history.get(key)
+    if old:
+        old_weight = min(old.get("audio", 0), RTF_HISTORY_CAP)
+        rtf = (old["rtf"] * old_weight + rtf * audio_seconds) / (old_weight + audio_seconds)
+        audio_seconds = old_weight + audio_seconds
+    history[key] = {"rtf": rtf, "audio": min(audio_seconds, RTF_HISTORY_CAP)}
+    try:
+        os.makedirs(os.path.dirname(RTF_HISTORY_PATH), exist_ok=True)
+        tmp_path = RTF_HISTORY_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, RTF_HISTORY_PATH)
+    except Exception as e:
+        log(f"保存 RTF 历史失败：{e}")
+
+
+def format_eta_line(tracker):
+    """把 EtaTracker 的估计格式化成一行文字（进度面板 / 日志共用）。"""
+    fraction, rtf, eta = tracker.estimate()
+    line = f"总进度：{fraction * 100:.0f}%（共 {format_hms(tracker.total_audio)} 音频）"
+    if rtf is not None:
+        line += f"，RTF {rtf:.2f}"
+    if eta is not None:
+        line += f"，预计剩余：约 {format_hms(eta)}"
+    return line
+
+# ---------------------- 状态刷新线程 ----------------------
+
+def update_status(stop_event, log_func, total_files_func, processed_files_func, active_workers_func):
+    """
+    后台线程：每60秒刷新一次状态（写入日志窗口）。
+    参数：
+      - stop_event：threading.Event，用于停止循环
+      - log_func：用于写日志的函数（可传 log）
+      - total_files_func：返回任务总数的函数（批次进行中可能追加文件）
+      - processed_files_func：返回已处理文件数的函数（通常 lambda: processed_count）
+      - active_workers_func：返回正在处理中的任务数（即忙碌的工作线程数）的函数
+    说明：这个线程只负责周期性写状态日志，不参与转写工作。
+    """
+    while not stop_event.is_set():
+        try:
+            processed = processed_files_func()
+            active = active_workers_func()
+            pending = total_files_func() - processed - active
+            log_func(f"状态：正在处理任务数量：{active}，已处理任务数量：{processed}，待处理任务数量：{pending}")
+        except Exception as e:
+            log_func(f"状态刷新出错：{e}")
+        # 在 stop_event 上等待：批次结束时立即醒来，不会让 process_files 多等最多 1 秒
+        stop_event.wait(60)
+
+# ---------------------- ffmpeg 管道解码（流式 PCM，不写临时文件） ----------------------
+
+class PcmRingBuffer:
+    """
+    固定容量的 float32 环形缓冲区。
+    ffmpeg 从 stdout 吐出的 PCM 样本先写入这里，再按窗口（例如 60 秒）整块取出交给模型。
+    容量在创建时一次性分配，之后读写只做拷贝，不会随音频长度增长。
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        self._head = 0   # 读指针（最早的有效样本位置）
+        self._size = 0   # 当前缓冲的有效样本数
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def free(self):
+        return self._capacity - self._size
+
+    def write(self, samples):
+        """追加样本；调用方需保证不超过 free（否则抛 ValueError）。"""
+        n = len(samples)
+        if n > self.free:
+            raise ValueError(f"环形缓冲区溢出：写入 {n}，剩余空间 {self.free}")
+        tail = (self._head + self._size) % self._capacity
+        first = min(n, self._capacity - tail)
+        self._buf[tail:tail + first] = samples[:first]
+        if n > first:
+            self._buf[:n - first] = samples[first:]
+        self._size += n
+
+    def peek(self, n):
+        """返回最早的 n 个样本的连续副本（不移动读指针）。"""
+        n = min(n, self._size)
+        first = min(n, self._capacity - self._head)
+        if first == n:
+            return self._buf[self._head:self._head + n].copy()
+        return np.concatenate((self._buf[self._head:], self._buf[:n - first]))
+
+    def consume(self, n):
+        """丢弃最早的 n 个样本。"""
+        n = min(n, self._size)
+        self._head = (self._head + n) % self._capacity
+        self._size -= n
+
+    def read(self, n):
+        """取出最早的 n 个样本（peek + consume）。"""
+        samples = self.peek(n)
+        self.consume(len(samples))
+        return samples
+
+
+def open_pcm_stream(input_file, start_time=0.0):
+    """
+    启动一个 ffmpeg 进程，把 input_file 的音轨解码为 16kHz 单声道 float32 PCM 并写到 stdout。
+    start_time > 0 时从该位置开始解码（只 seek 一次）。
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start_time > 0:
+        cmd += ["-ss", str(start_time)]
+    cmd += [
+        "-i", input_file,
+        "-vn",                          # 忽略视频流
+        "-ac", "1",                     # 单声道
+        "-ar", str(PCM_SAMPLE_RATE),    # 16kHz
+        "-f", "f32le",                  # 原始 float32 小端 PCM
+        "-"                             # 输出到 stdout
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def fill_ring_buffer(proc, ring, target_size):
+    """
+    从 ffmpeg stdout 读取 PCM 写入 ring，直到缓冲样本数达到 target_size 或读到末尾。
+    返回 True 表示 ffmpeg 输出已读完（EOF）。
+    """
+    while ring.size < target_size:
+        want = min(PIPE_READ_BYTES, ring.free * PCM_BYTES_PER_SAMPLE)
+        data = proc.stdout.read(want)
+        if not data:
+            return True
+        usable = len(data) - len(data) % PCM_BYTES_PER_SAMPLE
+        ring.write(np.frombuffer(data[:usable], dtype=np.float32))
+    return False
+
+
+def close_pcm_stream(proc, finished):
+    """
+    回收 ffmpeg 进程。finished=True 表示正常读到末尾，此时检查返回码，失败抛 RuntimeError；
+    否则（生成器被提前关闭：出错/取消）直接结束进程。
+    """
+    try:
+        if finished:
+            proc.wait()
+            if proc.returncode != 0:
+                err = proc.stderr.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"ffmpeg 解码失败（返回码 {proc.returncode}）：{err}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def iter_pcm_windows(input_file, window_seconds, start_time=0.0, overlap_seconds=0.0):
+    """
+    生成器：整个文件只启动一个 ffmpeg 进程，按 window_seconds 切出 numpy 窗口。
+    每次 yield (offset_seconds, samples)，offset_seconds 是窗口在原始时间轴上的起点。
+    最后一个窗口可能不足 window_seconds。ffmpeg 异常退出时抛出 RuntimeError。
+    overlap_seconds > 0 时相邻窗口重叠这么多秒（每次只前进 window - overlap），
+    缓冲区里保留上一窗口的尾部，不需要重新解码；最后一个窗口总含有前一个窗口之外的新音频，
+    剩下的新音频不足 OVERLAP_MIN_TAIL_SECONDS 时直接并入当前窗口（最后一个窗口可能略长于 window_seconds）。
+    window_seconds 也可以是 AdaptiveSizer：每个窗口开始前取一次当前的片段长度。
+    """
+    next_seconds, max_seconds = chunk_seconds_source(window_seconds)
+    overlap = int(overlap_seconds * PCM_SAMPLE_RATE)
+    tail = int(OVERLAP_MIN_TAIL_SECONDS * PCM_SAMPLE_RATE) if overlap > 0 else 0
+    ring = PcmRingBuffer(int(max_seconds * PCM_SAMPLE_RATE) + tail + PIPE_READ_BYTES // PCM_BYTES_PER_SAMPLE)
+    proc = open_pcm_stream(input_file, start_time)
+    offset = 0      # 当前窗口起点（样本数）
+    eof = False
+    finished = False
+    try:
+        while True:
+            window = int(next_seconds() * PCM_SAMPLE_RATE)
+            step = window - overlap
+            # 把缓冲区填到至少一个窗口（或读到文件末尾）；重叠时多读 tail + 1 个样本，
+            # 以便判断这是不是最后一个窗口、剩下的尾巴是否太短
+            if not eof:
+                eof = fill_ring_buffer(proc, ring, window + tail + 1 if step < window else window)
+            if ring.size == 0:
+                break
+            if step >= window:
+                samples = ring.read(window)
+                yield start_time + offset / PCM_SAMPLE_RATE, samples
+                offset += len(samples)
+                continue
+            if eof and ring.size <= window + tail:
+                yield start_time + offset / PCM_SAMPLE_RATE, ring.peek(ring.size)
+                break
+            yield start_time + offset / PCM_SAMPLE_RATE, ring.peek(window)
+            ring.consume(step)
+            offset += step
+        finished = True
+    finally:
+        close_pcm_stream(proc, finished)
+
+# ---------------------- VAD 智能分段（在静音处切分，跳过无语音区域） ----------------------
+
+def energy_speech_timestamps(audio, frame_ms=30, min_silence_ms=VAD_MIN_SILENCE_MS, pad_ms=VAD_SPEECH_PAD_MS):
+    """
+    基于短时能量的简易语音检测（Silero VAD 不可用时的后备方案）。
+    以 30ms 为一帧计算 dB 能量，噪声底取第 10 百分位，高于噪声底 10dB 或高于 ENERGY_SPEECH_FLOOR_DB 的帧视为语音；
+    最响的帧与噪声底差距不足 ENERGY_MIN_CONTRAST_DB 时（持续讲话、背景音乐下讲话等没有安静帧的情况）
+    整段视为语音，每一帧都不高于 ENERGY_SILENCE_DB 时才视为静音（长静音里的零星语音也要保留）。
+    间隔短于 min_silence_ms 的语音区合并，每段前后各留 pad_ms 余量。
+    返回 [(start_sample, end_sample), ...]。
+    """
+    frame = PCM_SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    noise_db = np.percentile(energy_db, 10)
+    peak_db = energy_db.max()
+    if peak_db <= ENERGY_SILENCE_DB:
+        return []
+    if peak_db - noise_db < ENERGY_MIN_CONTRAST_DB:
+        return [(0, len(audio))]
+    threshold = max(min(noise_db + 10, ENERGY_SPEECH_FLOOR_DB), ENERGY_SILENCE_DB)
+    voiced = np.flatnonzero(energy_db > threshold)
+    if len(voiced) == 0:
+        return []
+
+    max_gap = max(1, min_silence_ms // frame_ms)
+    pad = PCM_SAMPLE_RATE * pad_ms // 1000
+    regions = []
+    run_start = prev = voiced[0]
+    for idx in voiced[1:]:
+        if idx - prev > max_gap:
+            regions.append((run_start, prev + 1))
+            run_start = idx
+        prev = idx
+    regions.append((run_start, prev + 1))
+    return [(max(0, int(s) * frame - pad), min(len(audio), int(e) * frame + pad)) for s, e in regions]
+
+
+def detect_speech(audio):
+    """
+    对一段 16kHz 音频做语音活动检测，返回 [(start_sample, end_sample), ...]。
+    优先使用 faster-whisper 自带的 Silero VAD，不可用或出错时退回能量检测。
+    """
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps  # faster-whisper 自带的 Silero VAD
+    except ImportError:
+        get_speech_timestamps = None  # 没装 faster-whisper 或旧版本没有时退回能量检测
+    if get_speech_timestamps is not None:
+        try:
+            options = VadOptions(min_silence_duration_ms=VAD_MIN_SILENCE_MS, speech_pad_ms=VAD_SPEECH_PAD_MS)
+            return [(ts["start"], ts["end"]) for ts in get_speech_timestamps(audio, options)]
+        except Exception:
+            pass
+    return energy_speech_timestamps(audio)
+
+
+def plan_vad_cut(regions, buffer_size, target, eof):
+    """
+    在当前缓冲区的语音区间 regions 中选出下一个片段 [start, end)（样本下标）。
+      - start 取第一个语音区的起点（之前的静音直接跳过）；
+      - end 取某个语音区的终点，要求其后紧跟足够长的静音（语音区之间的间隙，
+        或缓冲区末尾已确认的静音 / 文件结尾），在这些候选切点里选离 start + target 最近的；
+      - 找不到静音切点（语音一直延续到缓冲区末尾）时 end 返回 None，由调用方决定
+        先丢掉前面的静音再补数据，还是在缓冲区末尾硬切。
+    """
+    start = regions[0][0]
+    min_silence = PCM_SAMPLE_RATE * VAD_MIN_SILENCE_MS // 1000
+    candidates = [regions[k][1] for k in range(len(regions) - 1)]
+    last_end = regions[-1][1]
+    if eof or buffer_size - last_end >= min_silence:
+        candidates.append(last_end)
+    if not candidates:
+        return start, None
+    end = min(candidates, key=lambda c: abs(c - start - target))
+    return start, end
+
+
+def iter_vad_chunks(input_file, target_seconds, start_time=0.0):
+    """
+    生成器：与 iter_pcm_windows 一样只用一个 ffmpeg 进程流式解码，但先做语音活动检测再切片：
+      - 缓冲区保持约 1.5 × target_seconds 的音频，在其中寻找靠近目标长度的静音切点；
+      - 片段之间的非语音区域直接丢弃，不送进模型；
+      - yield (offset_seconds, samples)，offset_seconds 是片段在原始时间轴上的起点，
+        所以识别结果只需加上 offset 即可映射回原始时间轴。
+    target_seconds 也可以是 AdaptiveSizer：每次找切点前取一次当前的目标长度。
+    """
+    next_seconds, max_seconds = chunk_seconds_source(target_seconds)
+    max_target = int(max_seconds * PCM_SAMPLE_RATE)
+    keep_tail = PCM_SAMPLE_RATE  # 全是静音时保留末尾 1 秒，防止截断刚开始的语音
+    ring = PcmRingBuffer(max_target + max_target // 2 + PIPE_READ_BYTES // PCM_BYTES_PER_SAMPLE)
+    proc = open_pcm_stream(input_file, start_time)
+    consumed = 0     # 已从缓冲区移除（交出或跳过）的样本数
+    emitted = 0      # 实际送去识别的样本数
+    eof = False
+    finished = False
+    try:
+        while True:
+            target = int(next_seconds() * PCM_SAMPLE_RATE)
+            buffer_target = target + target // 2
+            if not eof:
+                eof = fill_ring_buffer(proc, ring, buffer_target)
+            if ring.size == 0:
+                break
+            buf = ring.peek(ring.size)
+            regions = detect_speech(buf)
+            if not regions:
+                # 整个缓冲区都是静音：跳过
+                drop = ring.size if eof else max(1, ring.size - keep_tail)
+                ring.consume(drop)
+                consumed += drop
+                continue
+
+            start, end = plan_vad_cut(regions, len(buf), target, eof)
+            if end is None:
+                if start > 0:
+                    # 先丢掉语音前的静音，让缓冲区补满后再找切点
+                    ring.consume(start)
+                    consumed += start
+                    continue
+                # 整个缓冲区都是连续语音：只能在末尾硬切
+                end = len(buf)
+            yield start_time + (consumed + start) / PCM_SAMPLE_RATE, buf[start:end]
+            emitted += end - start
+            ring.consume(end)
+            consumed += end
+        finished = True
+        skipped = consumed - emitted
+        if skipped > 0:
+            log(f"VAD：跳过静音约 {format_hms(skipped / PCM_SAMPLE_RATE)}"
+                f"（占 {skipped / max(consumed, 1) * 100:.0f}%）")
+    finally:
+        close_pcm_stream(proc, finished)
+
+# ---------------------- 解码 / 推理流水线（预取片段） ----------------------
+
+class ChunkPrefetcher:
+    """
+    流水线的解码一端：后台线程从片段生成器（iter_pcm_windows / iter_vad_chunks，即 ffmpeg 解码 + VAD 切分）
+    取片段放进有界队列，推理线程迭代本对象从队列取，两者互不等待；队列满时解码线程暂停，
+    内存最多多占 depth 个片段。生成器的异常在推理线程迭代时重新抛出。
+    统计（秒）：decode_time 解码线程产出片段所花的时间，wait_time 推理线程等片段的时间；
+    wait_time 接近 0 说明解码完全被推理遮盖。
+    on_done：解码结束（读完、出错或被取消）时在解码线程中调用，并且一定在推理线程读到结尾之前，
+    工作线程借此提前领取并开始解码下一个文件。
+    """
+
+    def __init__(self, chunks, depth=PREFETCH_CHUNKS, on_done=None):
+        self.decode_time = 0.0
+        self.wait_time = 0.0
+        self.decode_finished = threading.Event()
+        self._chunks = chunks
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._on_done = on_done
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            it = iter(self._chunks)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                elapsed = time.perf_counter() - start
+                self.decode_time += elapsed
+                metrics.registry.observe("decode", elapsed)
+                metrics.registry.add_gauge("prefetch_queue_depth", 1)  # 先计数再入队，取走时才会减到 0 以下
+                if not self._put(("chunk", item)):
+                    metrics.registry.add_gauge("prefetch_queue_depth", -1)
+        except Exception as e:
+            self._put(("error", e))
+        finally:
+            if hasattr(self._chunks, "close"):
+                self._chunks.close()  # 提前结束时由生成器的 finally 结束 ffmpeg
+            self.decode_finished.set()
+            if self._on_done:
+                self._on_done()
+            self._put(("end", None))
+
+    def _put(self, item):
+        """放进队列；被取消时放弃并返回 False。"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            kind, payload = self._queue.get()
+            waited = time.perf_counter() - start
+            self.wait_time += waited
+            if kind == "end":
+                return
+            if kind == "error":
+                raise payload
+            metrics.registry.add_gauge("prefetch_queue_depth", -1)
+            metrics.registry.observe("decode_wait", waited)
+            yield payload
+
+    def cancel(self):
+        """停止解码并等待解码线程退出（推理出错、文件被跳过时调用；正常读完后调用也无妨）。"""
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        # 丢弃还没被取走的片段（及早释放内存，已预取片段数随之扣除）
+        while True:
+            try:
+                kind, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "chunk":
+                metrics.registry.add_gauge("prefetch_queue_depth", -1)
+
+
+def iter_file_chunks(input_file, chunking, start_time=0.0, chunk_duration=CHUNK_SECONDS, overlap=0.0):
+    """
+    按切分方式返回文件的片段生成器（"vad" 在静音处切分，"fixed" 固定长度）。
+    chunk_duration 为秒数，或开启自适应时的 AdaptiveSizer。
+    overlap 只用于 "fixed"（VAD 本来就切在静音处）；续传时 start_time 是上次的合并切点，
+    从它之前 overlap / 2 处开始解码，窗口位置与不中断时完全一致。
+    """
+    if chunking == "vad":
+        return iter_vad_chunks(input_file, chunk_duration, start_time)
+    if overlap > 0 and start_time > 0:
+        start_time = max(0.0, start_time - overlap / 2)
+    return iter_pcm_windows(input_file, chunk_duration, start_time, overlap)
+
+# ---------------------- 自适应片段长度 / 批大小 ----------------------
+
+class AdaptiveSizer:
+    """
+    运行中调节片段长度（或批大小）：只在 levels 的相邻档位之间移动，起点为用户设置的值。
+      - 内存：本进程常驻内存达到上限 ceiling 的 90%，或系统可用内存低于保留量时缩小一档，
+        并且本批次不再放大到这一档以上；常驻内存低于上限的 60% 且系统内存充裕时才考虑放大；
+      - 吞吐：按档位记录实测 RTF（推理秒 / 音频秒，滑动平均）。当前档位观测满 ADAPTIVE_MIN_SAMPLES 次且内存充裕时
+        放大一档；放大后的 RTF 比上一档差 ADAPTIVE_RTF_TOLERANCE 以上就退回，并以上一档为上限。
+    读不到内存信息（例如 Windows 上没装 psutil）或 ceiling 为 None 时只会因 RTF 变差而缩小，不会放大。
+    多个工作线程共享一个实例：value() 在每个片段 / 批次开始前调用，observe() 在推理结束后调用。
+    """
+
+    def __init__(self, name, levels, start, ceiling_bytes=None, unit="", gauge=None):
+        self.name = name
+        self.unit = unit
+        self.levels = sorted(set(levels) | {start})
+        self.index = self.levels.index(start)
+        self.cap = len(self.levels) - 1   # 本批次允许的最大档位
+        self.ceiling = ceiling_bytes
+        self.gauge = gauge
+        self._probe = metrics.ResourceProbe()
+        self._rtf = {}          # 档位 -> RTF 滑动平均
+        self._count = {}        # 档位 -> 观测次数
+        self._since_move = 0    # 上次换档以来在当前档位的观测次数（换档后先观测几次再决定下一步）
+        self._lock = threading.Lock()
+        if gauge:
+            metrics.registry.set_gauge(gauge, start)
+
+    @property
+    def max_value(self):
+        return self.levels[-1]
+
+    @property
+    def current(self):
+        return self.levels[self.index]
+
+    def _memory_state(self):
+        """"high" 需要缩小，"room" 可以放大，"ok" 保持，"unknown" 读不到内存信息。"""
+        rss = self._probe.rss_bytes()
+        total, available = metrics.system_memory()
+        if rss is None or self.ceiling is None:
+            return "unknown"
+        reserve = max(ADAPTIVE_RESERVE_MB << 20, (total or 0) // 10)
+        if rss >= self.ceiling * 0.9 or (available is not None and available < reserve):
+            return "high"
+        if rss < self.ceiling * 0.6 and (available is None or available >= reserve * 2):
+            return "room"
+        return "ok"
+
+    def _move(self, step, reason):
+        old = self.levels[self.index]
+        self.index += step
+        self._since_move = 0
+        new = self.levels[self.index]
+        if self.gauge:
+            metrics.registry.set_gauge(self.gauge, new)
+        log(f"自适应{self.name}：{old}{self.unit} -> {new}{self.unit}（{reason}）")
+
+    def value(self):
+        """取当前档位；先按内存状况缩小或放大一档。"""
+        with self._lock:
+            if self._since_move >= ADAPTIVE_MIN_SAMPLES:
+                state = self._memory_state()
+                if state == "high":
+                    if self.index > 0:
+                        self._move(-1, "内存接近上限")
+                    self.cap = min(self.cap, self.index)
+                elif state == "room" and self.index < self.cap:
+                    self._move(1, "内存充裕，尝试更大的档位")
+            return self.levels[self.index]
+
+    def nearest_level(self, size):
+        """实际长度（最后一片、VAD 片段长短不一）按对数距离归到最近的档位。"""
+        size = max(size, 1e-3)
+        return min(self.levels, key=lambda level: abs(np.log(size / level)))
+
+    def observe(self, size, audio_seconds, infer_seconds):
+        """记录一次推理：size 为片段秒数（或批大小），audio_seconds 秒音频用了 infer_seconds 秒。"""
+        if audio_seconds <= 0:
+            return
+        level = self.nearest_level(size)
+        rtf = infer_seconds / audio_seconds
+        with self._lock:
+            prev = self._rtf.get(level)
+            self._rtf[level] = rtf if prev is None else prev * 0.7 + rtf * 0.3
+            self._count[level] = self._count.get(level, 0) + 1
+            current = self.levels[self.index]
+            if level != current:
+                return
+            self._since_move += 1
+            lower = self.levels[self.index - 1] if self.index > 0 else None
+            if (lower is not None and self._count[current] >= ADAPTIVE_MIN_SAMPLES
+                    and self._count.get(lower, 0) >= ADAPTIVE_MIN_SAMPLES
+                    and self._rtf[current] > self._rtf[lower] * (1 + ADAPTIVE_RTF_TOLERANCE)):
+                self.cap = self.index - 1
+                self._move(-1, f"RTF {self._rtf[current]:.2f} 比 {lower}{self.unit} 时的 {self._rtf[lower]:.2f} 差")
+
+    def summary(self):
+        with self._lock:
+            parts = [f"{level}{self.unit} {self._rtf[level]:.2f}（{self._count[level]} 次）"
+                     for level in self.levels if level in self._rtf]
+        return f"自适应{self.name}：最终 {self.current}{self.unit}；各档位 RTF：{'，'.join(parts) or '（无）'}"
+
+
+def chunk_seconds_source(duration):
+    """片段长度的来源：固定秒数或 AdaptiveSizer。返回 (取当前值的函数, 最大值)，最大值用来分配缓冲区。"""
+    if isinstance(duration, AdaptiveSizer):
+        return duration.value, duration.max_value
+    return (lambda: duration), duration
+
+
+def memory_ceiling_bytes(settings):
+    """
+    自适应调节的常驻内存上限：设置了 memory_ceiling_mb 就用它；
+    否则取批次开始时的常驻内存 + 系统可用内存的 80%（模型加载后的占用也算在里面）。读不到内存信息时返回 None。
+    """
+    if settings["memory_ceiling_mb"]:
+        return int(settings["memory_ceiling_mb"]) << 20
+    _, available = metrics.system_memory()
+    rss = metrics.ResourceProbe().rss_bytes()
+    if available is None or rss is None:
+        return None
+    return rss + int(available * 0.8)
+
+
+def create_sizers(settings):
+    """按设置为本批次创建自适应调节器（chunk_sizer / batch_sizer）；未开启自适应时两者都为 None。"""
+    global chunk_sizer, batch_sizer
+    chunk_sizer = batch_sizer = None
+    if not settings["adaptive"]:
+        return
+    ceiling = memory_ceiling_bytes(settings)
+    if settings["batched"]:
+        batch_sizer = AdaptiveSizer("批大小", ADAPTIVE_BATCH_LEVELS, settings["batch_size"], ceiling,
+                                    gauge="adaptive_batch_size")
+    else:
+        # 重叠不能超过片段长度的一半：太短的档位不参与
+        levels = [s for s in ADAPTIVE_CHUNK_LEVELS if s >= settings["overlap_seconds"] * 2]
+        chunk_sizer = AdaptiveSizer("片段长度", levels, settings["chunk_seconds"], ceiling, unit="秒",
+                                    gauge="adaptive_chunk_seconds")
+    log("自适应调节已开启：常驻内存上限 "
+        + (metrics.format_bytes(ceiling) if ceiling else "未知（读不到内存信息，只会缩小不会放大）"))
+
+# ---------------------- 分段转写函数（避免一次加载长音频导致内存暴涨） ----------------------
+
+def transcribe_window(model, audio, language, offset, word_timestamps=False, initial_prompt=None):
+    """
+    转写一个 numpy 音频窗口，并把结果时间戳加上 offset（窗口在原始时间轴上的起点）。
+    model.transcribe 返回的是惰性生成器，真正的解码发生在遍历时，所以这里一次性遍历成列表；
+    这样在线程池中调用时，整个推理过程都发生在工作线程里。
+    word_timestamps=True 时同时给出逐词时间戳（seg.words，同样加上 offset），重叠分片的合并要用到。
+    initial_prompt 为前文（ChunkContext.prompt）。返回 (segments, info)，info.language 为检测到的语言。
+    """
+    segments, info = model.transcribe(
+        audio,
+        language=language,
+        task="transcribe",
+        word_timestamps=word_timestamps,
+        initial_prompt=initial_prompt,
+        vad_filter=False
+    )
+    result = []
+    for seg in segments:
+        seg.start += offset
+        seg.end += offset
+        for word in seg.words or ():
+            word.start += offset
+            word.end += offset
+        result.append(seg)
+    return result, info
+
+
+class ChunkContext:
+    """
+    分片之间携带的上下文：
+      - language：文件的语言。Auto 时用第一个识别出文字的片段检测一次，之后的片段固定使用，
+        不再逐片检测（省掉每片一次的语言检测，也避免个别片段被误判成别的语言）；
+      - 最近识别出的文本：作为下一片的 initial_prompt，人名、术语、标点习惯得以延续。
+        疑似重复 / 幻觉的句子（压缩率过高或多半是静音）不放进提示，避免错误在片段之间传递。
+    carry_text=False 时只携带语言。
+    """
+
+    def __init__(self, language=None, carry_text=True, max_chars=CONTEXT_PROMPT_CHARS):
+        self.language = language
+        self.carry_text = carry_text
+        self.max_chars = max_chars
+        self._recent = deque()   # 最近的句子：(结束秒数, 文本)
+        self._chars = 0
+
+    def prompt(self, before=None):
+        """下一片的 initial_prompt：结束于 before（下一片起点）之前的最近文本，截到 max_chars；没有时返回 None。"""
+        if not self.carry_text:
+            return None
+        text = "".join(t for end, t in self._recent if before is None or end <= before).strip()
+        if len(text) > self.max_chars:
+            text = text[-self.max_chars:]
+            if " " in text:
+                text = text.split(" ", 1)[1]  # 不从半个单词开始
+        return text or None
+
+    def update(self, segments, info=None):
+        """记入一个片段的识别结果；语言未定且这一片识别出了文字时，采用它检测到的语言。"""
+        if self.language is None and info is not None and segments:
+            self.language = info.language
+            log(f"检测到语言：{info.language}（置信度 {getattr(info, 'language_probability', 0):.0%}），"
+                f"本文件后续片段固定使用。")
+        if not self.carry_text:
+            return
+        if self._recent:
+            # 重叠分片时这一片的开头与上一片重复：只记已记录内容之后的部分
+            segments = trim_segments(segments, self._recent[-1][0], float("inf"))
+        for seg in segments:
+            if getattr(seg, "compression_ratio", 0) > 2.4 or getattr(seg, "no_speech_prob", 0) > 0.6:
+                continue
+            self._recent.append((seg.end, seg.text))
+            self._chars += len(seg.text)
+        # 多留一倍：重叠分片时最后几句可能还在下一片的范围内，prompt 会把它们过滤掉
+        while self._recent and self._chars - len(self._recent[0][1]) >= self.max_chars * 2:
+            self._chars -= len(self._recent.popleft()[1])
+
+
+def trim_segments(segments, left, right):
+    """
+    只保留 [left, right) 内的内容：有逐词时间戳时按词的中点取舍，句子被切开的部分
+    用保留下来的词重新拼出文本与起止时间；没有逐词时间戳的句子按整句的中点取舍。
+    """
+    result = []
+    for seg in segments:
+        words = getattr(seg, "words", None)
+        if not words:
+            if left <= (seg.start + seg.end) / 2 < right:
+                result.append(seg)
+            continue
+        kept = [w for w in words if left <= (w.start + w.end) / 2 < right]
+        if len(kept) == len(words):
+            result.append(seg)
+        elif kept:
+            result.append(Segment(kept[0].start, kept[-1].end, "".join(w.word for w in kept), kept))
+    return result
+
+
+class ChunkOverlapMerger:
+    """
+    重叠分片的合并：相邻两片在重叠区的中点切开，前一片只留中点之前的词，后一片只留中点之后的词，
+    重叠区里两边都识别出来的词因此只保留一份，而切点附近的词总有一侧带着完整的上下文。
+    片段按时间顺序 add()；要等到下一片才知道切点，所以输出比输入晚一片，最后一片由 finish() 交出。
+    输出通过 emit(已定稿到的秒数, segments) 交出；left 为第一片的左切点（续传时是上次的切点）。
+    """
+
+    def __init__(self, emit, left=0.0):
+        self.emit = emit
+        self.left = left
+        self.pending = None   # 等待切点的上一片：(片段结束秒数, segments)
+
+    def add(self, chunk_start, chunk_end, segments):
+        if self.pending is not None:
+            prev_end, prev_segments = self.pending
+            cut = (chunk_start + prev_end) / 2   # 重叠区 [chunk_start, prev_end] 的中点
+            with metrics.registry.timer("merge"):
+                merged = trim_segments(prev_segments, self.left, cut)
+            self.emit(cut, merged)
+            self.left = cut
+        self.pending = (chunk_end, segments)
+
+    def finish(self):
+        if self.pending is not None:
+            end, segments = self.pending
+            self.pending = None
+            with metrics.registry.timer("merge"):
+                merged = trim_segments(segments, self.left, float("inf"))
+            self.emit(end, merged)
+
+
+def record_stage_timings(decode_time, infer_time, wait_time, wall_time):
+    """一个文件（或一次批量推理）结束：阶段用时累加到 stage_totals，并写一行日志。"""
+    with stats_lock:
+        stage_totals["decode"] += decode_time
+        stage_totals["infer"] += infer_time
+        stage_totals["wait"] += wait_time
+    log(format_stage_timings(decode_time, infer_time, wait_time, wall_time))
+
+
+def format_stage_timings(decode_time, infer_time, wait_time, wall_time):
+    """
+    一个文件的流水线各阶段用时：解码（解码线程）、推理（各推理线程累加）、推理等解码的时间与墙钟时间。
+    “解码被遮盖”= 解码时间中与推理重叠的比例；100% 表示推理从未因等待音频而空转。
+    """
+    hidden = 100.0 if decode_time <= 0 else max(0.0, 1 - wait_time / decode_time) * 100
+    return (f"⚙ 阶段用时：解码 {decode_time:.1f}秒，推理 {infer_time:.1f}秒，等待解码 {wait_time:.1f}秒，"
+            f"总计 {wall_time:.1f}秒（解码被遮盖 {hidden:.0f}%）")
+
+
+def transcribe_in_chunks(model, input_file, lang_option, chunk_duration=60, decode_mode="pipe",
+                         progress_callback=None, parallel_chunks=1, chunking="fixed",
+                         start_time=0.0, on_chunk=None, chunks=None, overlap=0.0, word_timestamps=False,
+                         carry_context=True, context_seed=None):
+    """
+    将长音频按若干 chunk（默认 60 秒）分割，每个 chunk 单独用 model.transcribe 转写。
+    主要目的是避免把整个长音频一次性加载到内存或一次性让模型处理导致内存/显存占用异常。
+    参数：
+      - model：WhisperModel 实例（已加载）
+      - input_file：输入文件路径（音频或视频）
+      - lang_option：语言参数（"Auto" -> None）
+      - chunk_duration：每个片段的持续时间（秒）；也可以是 AdaptiveSizer，运行中按内存与实测 RTF 调整，
+          每个片段推理完把用时交给它
+      - decode_mode：
+          "pipe"（默认）：整个文件只启动一个 ffmpeg，PCM 经 stdout 流入环形缓冲区，
+                          按窗口直接把 numpy 数组交给模型，不写任何临时文件；
+          "tempfile"：旧方式，每个片段单独调用 ffmpeg -ss/-t 截取到临时 wav 再识别。
+      - progress_callback：可选，每完成一个片段调用一次 progress_callback(已识别到的音频秒数)
+      - parallel_chunks：同一个文件内同时转写的片段数（仅 pipe 模式）。
+          各片段之间本来就不共享上下文，可以互相独立地并行识别，结果按片段顺序拼回。
+          需要模型以 num_workers >= parallel_chunks 加载，CTranslate2 才会真正并行执行。
+      - chunking：切分方式（仅 pipe 模式）。
+          "fixed"：固定每 chunk_duration 秒切一刀；
+          "vad"：先做语音活动检测，在靠近 chunk_duration 的静音处切分，并跳过整段静音。
+      - start_time：从这个时间点（秒）开始识别，用于断点续传（ffmpeg -ss 直接跳过已完成的部分）
+      - on_chunk：可选，每个片段按时间顺序完成时调用 on_chunk(片段结束秒数, 该片段的 segments)；
+          给出时结果交给回调（例如写入分片日志），不在内存中累积
+      - chunks：可选，已经开始预取的 ChunkPrefetcher（工作线程提前为下一个文件启动的）；
+          不给时按 chunking / start_time 新建（此时要与这里的 chunk_duration / overlap 一致）。
+          pipe 模式下解码总在独立线程中领先推理 PREFETCH_CHUNKS 个片段，结束时在日志中输出各阶段用时
+      - overlap：相邻片段的重叠秒数（仅 pipe + fixed）。大于 0 时开启逐词时间戳，
+          由 ChunkOverlapMerger 在重叠区中点去重合并；on_chunk / 进度汇报的是合并切点，晚一个片段
+      - word_timestamps：结果保留逐词时间戳（seg.words），评测边界词错误时用
+      - carry_context：把前一片识别出的文本作为下一片的 initial_prompt（见 ChunkContext）。
+          片段并行时各片同时识别，只携带语言；语言总是只检测一次（Auto 时在第一个识别出文字的片段上）
+      - context_seed：可选，续传时已完成部分的 segments，用来恢复前文
+    返回：
+      - all_segments：合并了所有片段并修正时间戳后的 segments 列表（给出 on_chunk 时为空列表）
+    注意：
+      - chunk_duration 越小，内存压力越小，但识别上下文（跨片段）无法共享，可能略微影响连贯性；
+        用 overlap 让切点两侧都有上下文，可以放心使用更长或更短的片段。
+    """
+    language = None if lang_option.lower() == "auto" else lang_option
+    context = ChunkContext(language, carry_text=carry_context and parallel_chunks <= 1)
+    if context_seed is not None:
+        context.update(list(context_seed))
+    all_segments = []
+    merger = None
+
+    def deliver(chunk_end, segments):
+        # 片段按时间顺序定稿：交给 on_chunk 或累积到 all_segments，再汇报进度
+        if on_chunk:
+            on_chunk(chunk_end, segments)
+        else:
+            all_segments.extend(segments)
+        if progress_callback:
+            progress_callback(chunk_end)
+
+    def chunk_done(chunk_start, chunk_end, segments):
+        if merger is not None:
+            merger.add(chunk_start, chunk_end, segments)
+        else:
+            deliver(chunk_end, segments)
+
+    if decode_mode == "pipe":
+        if chunking != "fixed":
+            overlap = 0.0
+        if overlap > 0:
+            merger = ChunkOverlapMerger(deliver, start_time)
+            word_timestamps = True
+        if chunks is None:
+            chunks = ChunkPrefetcher(iter_file_chunks(input_file, chunking, start_time, chunk_duration, overlap))
+        infer_time = [0.0]
+        infer_lock = threading.Lock()
+
+        def timed_transcribe(audio, offset, prompt=None):
+            start = time.perf_counter()
+            try:
+                return transcribe_window(model, audio, context.language, offset, word_timestamps, prompt)
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.registry.observe("infer", elapsed)
+                if isinstance(chunk_duration, AdaptiveSizer):
+                    seconds = len(audio) / PCM_SAMPLE_RATE
+                    chunk_duration.observe(seconds, seconds, elapsed)
+                with infer_lock:
+                    infer_time[0] += elapsed
+
+        wall_start = time.perf_counter()
+        try:
+            if parallel_chunks <= 1:
+                for current_start, audio in chunks:
+                    segments, info = timed_transcribe(audio, current_start, context.prompt(current_start))
+                    context.update(segments, info)
+                    chunk_done(current_start, current_start + len(audio) / PCM_SAMPLE_RATE, segments)
+            else:
+                # 片段并行：解码仍按顺序进行，片段提交到线程池；pending 按提交顺序排队，
+                # 从队头依次取结果，保证合并后的 segments 严格按时间排序。
+                # 同时在途的片段最多 2 × parallel_chunks 个，避免解码远快于识别时内存无限增长。
+                # 语言未定（Auto）时先在本线程逐片识别，直到检测出语言，之后的片段才提交到线程池。
+                pending = deque()
+                with ThreadPoolExecutor(max_workers=parallel_chunks) as pool:
+                    for current_start, audio in chunks:
+                        chunk_end = current_start + len(audio) / PCM_SAMPLE_RATE
+                        if context.language is None:
+                            segments, info = timed_transcribe(audio, current_start)
+                            context.update(segments, info)
+                            chunk_done(current_start, chunk_end, segments)
+                            continue
+                        future = pool.submit(timed_transcribe, audio, current_start)
+                        pending.append((current_start, chunk_end, future))
+                        while len(pending) >= parallel_chunks * 2:
+                            chunk_start, chunk_end, future = pending.popleft()
+                            chunk_done(chunk_start, chunk_end, future.result()[0])
+                    while pending:
+                        chunk_start, chunk_end, future = pending.popleft()
+                        chunk_done(chunk_start, chunk_end, future.result()[0])
+            if merger is not None:
+                merger.finish()
+        finally:
+            chunks.cancel()
+        record_stage_timings(chunks.decode_time, infer_time[0], chunks.wait_time,
+                             time.perf_counter() - wall_start)
+        return all_segments
+
+    total_duration = get_audio_duration(input_file)
+    current_start = start_time
+    index = 1
+    decode_time = infer_time = 0.0   # tempfile 模式解码与识别串行：等待解码的时间就是解码时间
+    wall_start = time.perf_counter()
+
+    next_seconds, _ = chunk_seconds_source(chunk_duration)
+
+    # 循环直到覆盖整个音频时长
+    while current_start < total_duration:
+        seconds = next_seconds()
+        # 使用 ffmpeg 提取从 current_start 开始，长度为 chunk_duration 的音频片段
+        # 临时 wav 文件名（写在当前工作目录；带上线程号，多个工作线程同时处理时不会互相覆盖）
+        temp_chunk = f"temp_chunk_{threading.get_ident()}_{index}.wav"
+        cmd = [
+            "ffmpeg",
+            "-y",                    # 覆盖输出文件（如果存在）
+            "-ss", str(current_start),  # 起始时间（秒）
+            "-t", str(seconds),      # 持续时长（秒）
+            "-i", input_file,        # 输入文件
+            "-ac", "1",              # 单声道（1 通道）
+            "-ar", "16000",          # 采样率 16kHz（很多 ASR 更稳定）
+            temp_chunk,
+            "-loglevel", "error"     # 仅在出错时显示 ffmpeg 信息，保持日志清爽
+        ]
+        # 运行 ffmpeg，提取片段到磁盘（注意：对非常大的文件，磁盘 IO 较大）
+        step_start = time.perf_counter()
+        subprocess.run(cmd)
+        elapsed = time.perf_counter() - step_start
+        decode_time += elapsed
+        metrics.registry.observe("decode", elapsed)
+        step_start = time.perf_counter()
+
+        # 转写这个临时片段
+        # 注意：word_timestamps=False（不开启逐词时间戳会更快），vad_filter=False（不做语音活动检测）
+        segments, info = model.transcribe(
+            temp_chunk,
+            language=context.language,
+            task="transcribe",
+            word_timestamps=False,
+            initial_prompt=context.prompt(),
+            vad_filter=False
+        )
+
+        # 转写结果时间戳是相对于 temp_chunk 的（从 0 开始），所以要把每段时间加上 current_start
+        chunk_segments = []
+        for seg in segments:
+            seg.start += current_start
+            seg.end += current_start
+            chunk_segments.append(seg)
+        elapsed = time.perf_counter() - step_start
+        infer_time += elapsed
+        metrics.registry.observe("infer", elapsed)
+        if isinstance(chunk_duration, AdaptiveSizer):
+            length = min(seconds, total_duration - current_start)
+            chunk_duration.observe(length, length, elapsed)
+
+        # 删除临时文件以释放磁盘空间（及时清理）
+        try:
+            os.remove(temp_chunk)
+        except Exception:
+            # 如果删除失败也不影响继续处理，只记录日志
+            log(f"警告：无法删除临时文件 {temp_chunk}（请手动删除）。")
+        context.update(chunk_segments, info)
+
+        # 前进到下一个片段
+        chunk_start = current_start
+        current_start += seconds
+        index += 1
+        chunk_done(chunk_start, min(current_start, total_duration), chunk_segments)
+
+    record_stage_timings(decode_time, infer_time, decode_time, time.perf_counter() - wall_start)
+    return all_segments
+
+# ---------------------- 批量推理（多个 30 秒窗口凑成一批送入模型） ----------------------
+
+def iter_files_windows(files, window_seconds):
+    """
+    生成器：依次流式解码 files 中的每个文件（files 为 [(序号, 路径), ...]），逐个吐出窗口：
+      - (idx, offset_seconds, samples)：文件 idx 的一个音频窗口；
+      - (idx, None, error)：文件 idx 解码结束的标记，error 为 None 表示正常结束，否则为异常对象。
+    """
+    for idx, file in files:
+        try:
+            for offset, samples in iter_pcm_windows(file, window_seconds):
+                yield idx, offset, samples
+        except Exception as e:
+            yield idx, None, e
+        else:
+            yield idx, None, None
+
+
+def transcribe_batched(model, files, lang_option, batch_size=8, skip_silence=False,
+                       on_file_done=None, progress_callback=None):
+    """
+    批量推理模式：基于 faster-whisper 的 BatchedInferencePipeline，把一个或多个文件的 30 秒窗口
+    凑成 batch_size 个一批送入模型，识别完再把结果按窗口分发回各自文件的 segments 列表。
+    batch_size 也可以是 AdaptiveSizer：每个批次开始凑批时取一次当前批大小，凑满的批次识别完把用时交给它。
+    实现方式：
+      - 把一批窗口各自补零到整 30 秒后首尾拼接成一段音频，clip_timestamps 逐窗口给出；
+        每个窗口恰好等于模型的 chunk 长度，所以 pipeline 不会把两个窗口合并到一起；
+      - 结果里每个 segment 按起点所在的窗口映射回 (文件, 文件内偏移)，落在补零区域的丢弃。
+    参数：
+      - files：[(序号, 路径), ...]
+      - lang_option："Auto" 或语言代码。Auto 时 pipeline 每次调用只检测一次语言，
+        所以一个批次内只放同一个文件的窗口；指定语言时不同文件的窗口可以拼进同一批。
+        Auto 时每个文件第一个识别出文字的批次检测出的语言会记下来，该文件之后的批次直接使用。
+      - skip_silence：为 True 时先对每个窗口做 VAD，整窗都是静音的直接跳过。
+      - on_file_done(idx, segments, error)：某个文件全部窗口识别完（或解码失败）时调用。
+      - progress_callback(已处理音频秒数, 已用秒数)：每批结束时调用。
+    解码由 ChunkPrefetcher 在独立线程中进行，最多领先一个批次（batch_size 个窗口），结束时输出各阶段用时。
+    返回：(处理的音频总秒数, 总耗时秒数)，二者之比即吞吐量（音频秒 / 墙钟秒）。
+    """
+    try:
+        from faster_whisper import BatchedInferencePipeline  # 批量推理（faster-whisper >= 1.1）
+    except ImportError:
+        raise RuntimeError("当前 faster-whisper 版本没有 BatchedInferencePipeline，请升级到 1.1 以上。")
+    pipeline = BatchedInferencePipeline(model=model)
+    language = None if lang_option.lower() == "auto" else lang_option
+    window = BATCH_WINDOW_SECONDS * PCM_SAMPLE_RATE
+    next_batch_size, _ = chunk_seconds_source(batch_size)
+    limit = next_batch_size()  # 当前批次凑满多少个窗口
+
+    batch = []            # 当前批次：[(idx, offset_seconds, samples)]
+    file_segments = {}    # idx -> 已识别的 segments
+    outstanding = {}      # idx -> 还在批次中、尚未识别的窗口数
+    decoded = {}          # idx -> 解码结束标记（None = 正常结束，异常对象 = 失败）
+    file_language = {}    # idx -> 已检测出的语言（Auto 时）
+    audio_done = 0.0
+    infer_time = 0.0
+    start = time.time()
+
+    def finish_ready_files():
+        for idx in [i for i in decoded if outstanding.get(i, 0) == 0]:
+            error = decoded.pop(idx)
+            segments = file_segments.pop(idx, [])
+            outstanding.pop(idx, None)
+            file_language.pop(idx, None)
+            if on_file_done:
+                on_file_done(idx, segments, error)
+
+    def run_batch():
+        nonlocal audio_done, infer_time
+        infer_start = time.perf_counter()
+        audio = np.zeros(len(batch) * window, dtype=np.float32)
+        clips = []
+        for k, (_, _, samples) in enumerate(batch):
+            audio[k * window:k * window + len(samples)] = samples
+            clips.append({"start": k * window, "end": (k + 1) * window})
+        batch_language = language or file_language.get(batch[0][0])
+        segments, info = pipeline.transcribe(
+            audio,
+            language=batch_language,
+            task="transcribe",
+            batch_size=len(batch),
+            vad_filter=False,
+            clip_timestamps=clips,
+            without_timestamps=False,
+            word_timestamps=False
+        )
+        for seg in segments:
+            k = min(int(seg.start // BATCH_WINDOW_SECONDS), len(batch) - 1)
+            idx, offset, samples = batch[k]
+            local_start = seg.start - k * BATCH_WINDOW_SECONDS
+            length = len(samples) / PCM_SAMPLE_RATE
+            if local_start >= length:
+                continue  # 落在补零区域
+            seg.start = offset + local_start
+            seg.end = offset + min(seg.end - k * BATCH_WINDOW_SECONDS, length)
+            file_segments.setdefault(idx, []).append(seg)
+        if batch_language is None and file_segments.get(batch[0][0]):
+            file_language[batch[0][0]] = info.language
+        elapsed = time.perf_counter() - infer_start
+        infer_time += elapsed
+        metrics.registry.observe("infer_batch", elapsed)
+        batch_audio = 0.0
+        for idx, _, samples in batch:
+            outstanding[idx] -= 1
+            batch_audio += len(samples) / PCM_SAMPLE_RATE
+        audio_done += batch_audio
+        if isinstance(batch_size, AdaptiveSizer) and len(batch) == limit:
+            batch_size.observe(limit, batch_audio, elapsed)  # 不满的批次（文件结尾）不计入
+        batch.clear()
+        if progress_callback:
+            progress_callback(audio_done, time.time() - start)
+
+    windows = ChunkPrefetcher(iter_files_windows(files, BATCH_WINDOW_SECONDS), depth=limit)
+    try:
+        for idx, offset, samples in windows:
+            if offset is None:
+                decoded[idx] = samples
+                if language is None and batch:
+                    run_batch()  # 自动检测语言时不跨文件拼批
+                finish_ready_files()
+                continue
+            if skip_silence and not detect_speech(samples):
+                continue
+            if not batch:
+                limit = next_batch_size()
+            batch.append((idx, offset, samples))
+            outstanding[idx] = outstanding.get(idx, 0) + 1
+            if len(batch) >= limit:
+                run_batch()
+                finish_ready_files()
+        if batch:
+            run_batch()
+        finish_ready_files()
+    finally:
+        windows.cancel()
+    record_stage_timings(windows.decode_time, infer_time, windows.wait_time, time.time() - start)
+    return audio_done, time.time() - start
+
+
+# ---------------------- 后端 / 设备 / 模型加载 ----------------------
+
+BACKENDS = ("faster", "openai")  # faster-whisper（CTranslate2）或 openai-whisper（PyTorch）
+
+# openai-whisper 的结果是字典，统一成与 faster-whisper 相同的 .start / .end / .text 访问方式；
+# words 只在重叠合并切开句子时带上保留下来的逐词时间戳，其余情况为 None
+Segment = namedtuple("Segment", ["start", "end", "text", "words"], defaults=(None,))
+
+# 选项默认值：GUI 与命令行都只需要覆盖自己关心的部分
+DEFAULT_SETTINGS = {
+    "backend": "faster",
+    "model_name": "large-v3",
+    "model_folder": "",      # 本地模型根目录（faster: <目录>/<模型名>/snapshots；openai: download_root）
+    "lang_option": "Auto",
+    "workers": 1,            # 并行任务数（同时处理的文件数）
+    "cpu_threads": 0,        # 每个推理实例的 CPU 线程数，0 = 按核心数自动均分
+    "chunk_workers": 1,      # 同一文件内并行转写的片段数（仅 faster）
+    "chunking": "vad",       # "vad" 在静音处切分 / "fixed" 固定长度
+    "chunk_seconds": CHUNK_SECONDS,  # 每个片段的长度（秒；VAD 模式下为目标长度）
+    "overlap_seconds": CHUNK_OVERLAP_SECONDS,  # fixed 模式相邻片段的重叠（秒），不超过片段长度的一半
+    "carry_context": True,   # 前一片的文本作为下一片的提示（仅 faster 顺序分片，openai 始终关闭；语言总是每个文件只检测一次）
+    "decode_mode": "pipe",   # "pipe" ffmpeg 管道流式解码 / "tempfile" 每片截取临时 wav（旧方式，仅 faster，评测对比用）
+    "device": "auto",        # "auto" 自动检测，或 "cpu" / "cuda"
+    "compute_type": "auto",  # "auto"：GPU 用 float16、CPU 用 int8（faster）；也可指定 int8 / float32 等
+    "metrics_interval": 2.0,  # 资源采样 / 指标导出的间隔（秒）
+    "metrics_prom": "",      # 非空时把指标以 Prometheus 文本格式写到这个文件（每次采样覆盖）
+    "metrics_jsonl": "",     # 非空时每次采样向这个文件追加一行 JSON
+    "batched": False,        # 批量推理模式（仅 faster）
+    "batch_size": 8,
+    "schedule": "fifo",      # 调度策略：fifo 按列表顺序 / sjf 短文件优先 / lpt 长文件优先 / priority 按优先级
+    "priorities": {},        # {文件路径: 优先级}，越大越先处理（schedule 为 priority 时使用），未列出的为 0
+    "open_batch": False,     # 批次会持续用 add_jobs 追加文件（监视模式）：并行任务数不按开始时的文件数削减
+    "adaptive": False,       # 运行中按内存余量与实测 RTF 调整片段长度（批量推理模式下调整批大小），仅 faster
+    "memory_ceiling_mb": 0,  # 自适应调节的常驻内存上限（MB），0 = 按批次开始时的可用内存自动确定
+    "output_mode": 1,        # 1 = 跟随源文件目录，2 = 统一存放到 output_folder
+    "output_folder": "",
+    "suffix": "",
+    "export_format": "SRT",  # "SRT" 或 "TXT"
+    "model_cache_mb": None,  # 模型缓存预算（MB），None = 保持 model_manager 当前的设置
+    "result_cache": True,    # 使用识别结果缓存（内容相同且参数相同的文件直接取上次的结果）
+    "stream_output": True,   # 边识别边写字幕（<输出>.partial，完成后改名）；False = 识别完再一次写出
+}
+
+
+# 各后端真正用到的重量级模块（按依赖顺序），prewarm_backend 按这个顺序预先导入并计时
+BACKEND_MODULES = {
+    "faster": ("ctranslate2", "faster_whisper"),
+    "openai": ("torch", "whisper"),
+}
+
+
+def prewarm_backend(backend):
+    """
+    预先导入某个后端的重量级模块，返回 [(模块名, 导入耗时秒数), ...]；导入失败的模块耗时记为 None。
+    GUI 在窗口显示之后于后台线程调用，点击“开始识别”时这些模块已经在内存里；已导入过的模块耗时约为 0。
+    """
+    timings = []
+    for name in BACKEND_MODULES[backend]:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings.append((name, time.perf_counter() - start))
+        except ImportError:
+            timings.append((name, None))
+    return timings
+
+
+def format_import_timings(timings):
+    """把 prewarm_backend 的结果格式化成一行，例如 “ctranslate2 0.41秒，faster_whisper 1.20秒”。"""
+    return "，".join(f"{name} {sec:.2f}秒" if sec is not None else f"{name} 未安装" for name, sec in timings)
+
+
+def detect_device(backend="faster"):
+    """
+    有可用的 CUDA 就用 GPU，否则用 CPU：
+      - faster：直接问 CTranslate2 有几块 CUDA 设备，不需要 torch（也就不必为此加载 torch 的几百 MB）
+      - openai：模型本身跑在 PyTorch 上，用 torch.cuda.is_available()
+    """
+    try:
+        if backend == "faster":
+            import ctranslate2
+            return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+def resolve_model_path(selected_model_name, model_folder):
+    """
+    根据用户选择得到真正传给 WhisperModel 的模型路径/名称：
+      - 如果指定了本地模型文件夹，取 <模型文件夹>/<模型名>/snapshots 下的第一个 snapshot 目录；
+      - 否则直接返回官方模型名（例如 "tiny", "large-v3-turbo"），由 faster-whisper 自动下载。
+    出错时写日志并返回 None。
+    """
+    if not model_folder:
+        log(f"正在加载官方 Faster-Whisper 模型：{selected_model_name}")
+        return selected_model_name
+
+    model_base_folder = os.path.join(model_folder, selected_model_name)
+    snapshots_path = os.path.join(model_base_folder, "snapshots")
+    if not os.path.exists(snapshots_path):
+        log(f"错误：模型 {selected_model_name} 没有 snapshots 目录")
+        return None
+
+    # 取 snapshots 子目录下的第一个 snapshot（你可以改成选择最新/最大等策略）
+    snapshot_dirs = [d for d in os.listdir(snapshots_path) if os.path.isdir(os.path.join(snapshots_path, d))]
+    if not snapshot_dirs:
+        log("错误：snapshots 目录为空")
+        return None
+
+    model_path = os.path.join(snapshots_path, snapshot_dirs[0])
+    log(f"正在加载本地 Faster-Whisper 模型目录：{model_path}")
+    return model_path
+
+
+def prepare_settings(options, file_count):
+    """
+    在 DEFAULT_SETTINGS 基础上合并调用方的选项，并计算派生值：
+    设备、计算精度、实际并行数、CPU 线程数、模型路径。选项有误时写日志并返回 None。
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(options)
+    if settings["backend"] not in BACKENDS:
+        log(f"错误：未知的后端 {settings['backend']}（可选：{', '.join(BACKENDS)}）")
+        return None
+    if settings["output_mode"] == 2 and not settings["output_folder"]:
+        log("请选择输出文件夹！")
+        return None
+    if settings["chunk_seconds"] <= 0:
+        log(f"错误：片段长度必须大于 0 秒（当前 {settings['chunk_seconds']}）")
+        return None
+    if not 0 <= settings["overlap_seconds"] * 2 <= settings["chunk_seconds"]:
+        log(f"错误：片段重叠必须在 0 到片段长度的一半之间（当前 {settings['overlap_seconds']} 秒）")
+        return None
+    if settings["schedule"] not in whisper_jobs.SCHEDULE_POLICIES:
+        log(f"错误：未知的调度策略 {settings['schedule']}（可选：{', '.join(whisper_jobs.SCHEDULE_POLICIES)}）")
+        return None
+
+    device = detect_device(settings["backend"]) if settings["device"] == "auto" else settings["device"]
+    settings["device"] = device
+    settings["total_files"] = file_count
+    if not settings["open_batch"]:
+        settings["workers"] = max(1, min(settings["workers"], file_count))
+
+    if settings["backend"] == "openai":
+        # openai-whisper 整个文件一次 transcribe：没有片段并行与批量推理
+        settings["chunk_workers"] = 1
+        settings["batched"] = False
+        settings["adaptive"] = False
+        settings["compute_type"] = "fp16" if device == "cuda" else "fp32"  # openai-whisper 只区分 fp16 / fp32
+        settings["model_path"] = settings["model_name"]
+        log(f"加载模型 {settings['model_name']} …")
+    else:
+        # compute_type: GPU 使用 float16 可以节省显存，CPU 可使用 int8
+        if settings["compute_type"] == "auto":
+            settings["compute_type"] = "float16" if device == "cuda" else "int8"
+        settings["model_path"] = resolve_model_path(settings["model_name"], settings["model_folder"])
+        if settings["model_path"] is None:
+            return None
+
+    settings["requested_cpu_threads"] = settings["cpu_threads"]
+    plan_cpu_threads(settings)
+    return settings
+
+
+def plan_cpu_threads(settings):
+    """按用户设置（requested_cpu_threads，0 = 自动）和实际并行数计算每个推理实例的 CPU 线程数。"""
+    cpu_count = os.cpu_count() or 1
+    requested = settings["requested_cpu_threads"]
+    if settings["batched"]:
+        # 批量推理只有一份模型，CPU 线程全部给它
+        settings["cpu_threads"] = requested or cpu_count
+    elif requested == 0:
+        # 自动：把 CPU 核心平均分给所有并行的推理实例（文件并行数 × 片段并行数）
+        settings["cpu_threads"] = max(1, cpu_count // (settings["workers"] * settings["chunk_workers"]))
+    else:
+        settings["cpu_threads"] = requested
+
+
+def load_model(settings, num_workers=1):
+    """按 settings 加载一份模型；num_workers > 1 时允许多个线程同时调用 transcribe（片段并行需要，仅 faster）。"""
+    if settings["backend"] == "openai":
+        import whisper            # pip install -U openai-whisper
+        if settings["model_folder"]:
+            # whisper.load_model 会在 download_root 目录下查找 <name>.pt
+            return whisper.load_model(settings["model_name"], device=settings["device"],
+                                      download_root=settings["model_folder"])
+        return whisper.load_model(settings["model_name"], device=settings["device"])
+
+    from faster_whisper import WhisperModel   # faster-whisper 的模型接口
+    return WhisperModel(
+        settings["model_path"],
+        device=settings["device"],
+        compute_type=settings["compute_type"],
+        cpu_threads=settings["cpu_threads"],
+        num_workers=num_workers
+    )
+
+
+# ---------------------- 模型缓存（批次结束后保留已加载的模型） ----------------------
+
+MODEL_CACHE_BUDGET_MB = 8192   # 已加载模型的估计总占用上限（MB），超出时按最近最少使用淘汰空闲模型
+
+# 在线模型名无法从磁盘统计大小时，按官方模型 float16 权重的大致体积估算（MB）；先匹配的优先
+MODEL_SIZE_MB = (("turbo", 1600), ("large", 3000), ("medium", 1500),
+                 ("small", 480), ("base", 145), ("tiny", 75))
+COMPUTE_TYPE_SCALE = {"int8": 0.5, "float16": 1.0, "fp16": 1.0, "float32": 2.0, "fp32": 2.0}
+
+
+def model_cache_key(settings):
+    """模型缓存键：(后端, 模型路径, 设备, 计算精度)；openai 的本地模型目录也算进路径里。"""
+    path = settings["model_path"]
+    if settings["backend"] == "openai" and settings["model_folder"]:
+        path = os.path.join(settings["model_folder"], f"{settings['model_name']}.pt")
+    return (settings["backend"], path, settings["device"], settings["compute_type"])
+
+
+def estimate_model_mb(settings):
+    """
+    估算一份模型加载后的占用（MB）：本地模型按磁盘上的文件大小，在线模型按 MODEL_SIZE_MB，
+    再按计算精度缩放（int8 约为 float16 的一半）。只用于缓存预算，不需要很精确。
+    """
+    path = model_cache_key(settings)[1]
+    size_mb = None
+    if os.path.isfile(path):
+        size_mb = os.path.getsize(path) / (1 << 20)
+    elif os.path.isdir(path):
+        size_mb = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file()) / (1 << 20)
+    if not size_mb:
+        name = settings["model_name"].lower()
+        size_mb = next((mb for key, mb in MODEL_SIZE_MB if key in name), 1500)
+    return size_mb * COMPUTE_TYPE_SCALE.get(settings["compute_type"], 1.0)
+
+
+class ModelManager:
+    """
+    进程内的模型缓存：批次结束后模型不丢弃，下一批次相同配置直接复用，省去几十秒的加载。
+      - 缓存键见 model_cache_key；同一个键下可以有多份实例（并行任务各用一份）
+      - 实例另外记录加载参数 (cpu_threads, num_workers)，参数不同不复用（线程分配会不一样）
+      - acquire 取出（或加载）一份模型独占使用，release 归还；只有归还后的空闲模型可以被淘汰
+      - 已加载模型的估计总占用超过 budget_mb 时，按最近最少使用（LRU）淘汰空闲模型；budget_mb = 0 即不缓存
+    GUI 进程本身就长期存在；whisper_server.py 把它放进一个常驻进程，供命令行和 GUI 共用。
+    """
+
+    def __init__(self, budget_mb=MODEL_CACHE_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self.hits = 0
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()   # 编号 -> 条目，越靠后越是最近使用
+        self._busy = {}              # id(model) -> 条目
+        self._next_id = 0
+
+    def acquire(self, settings, num_workers=1):
+        """取一份与 settings 匹配的空闲模型；没有就调用 load_model 加载（加载时不持锁）。"""
+        key = model_cache_key(settings)
+        params = (settings["cpu_threads"], num_workers)
+        with self._lock:
+            for entry_id, entry in self._idle.items():
+                if entry["key"] == key and entry["params"] == params:
+                    del self._idle[entry_id]
+                    self._busy[id(entry["model"])] = entry
+                    self.hits += 1
+                    log(f"♻ 复用已加载的模型：{settings['model_name']}（{settings['device']} / {settings['compute_type']}）")
+                    return entry["model"]
+
+        model = load_model(settings, num_workers=num_workers)
+        entry = {"key": key, "params": params, "model": model,
+                 "name": settings["model_name"], "size_mb": estimate_model_mb(settings)}
+        with self._lock:
+            self._busy[id(model)] = entry
+            self.loads += 1
+        return model
+
+    def release(self, model):
+        """归还模型：放回空闲队列的最新一端，然后按预算淘汰。"""
+        with self._lock:
+            entry = self._busy.pop(id(model), None)
+            if entry is None:
+                return
+            self._idle[self._next_id] = entry
+            self._next_id += 1
+            evicted = self._evict_locked()
+        for entry in evicted:
+            log(f"模型缓存超出预算，释放：{entry['name']}（约 {entry['size_mb']:.0f} MB）")
+
+    def set_budget(self, budget_mb):
+        """修改预算（MB），立即按新预算淘汰空闲模型。"""
+        with self._lock:
+            self.budget_mb = max(0, budget_mb)
+            evicted = self._evict_locked()
+        for entry in evicted:
+            log(f"模型缓存超出预算，释放：{entry['name']}（约 {entry['size_mb']:.0f} MB）")
+
+    def clear(self):
+        """释放全部空闲模型（正在使用的不受影响），返回释放的数量。"""
+        with self._lock:
+            count = len(self._idle)
+            self._idle.clear()
+        return count
+
+    def _evict_locked(self):
+        used = sum(e["size_mb"] for e in self._idle.values()) + sum(e["size_mb"] for e in self._busy.values())
+        evicted = []
+        while self._idle and used > self.budget_mb:
+            _, entry = self._idle.popitem(last=False)
+            used -= entry["size_mb"]
+            evicted.append(entry)
+        return evicted
+
+    def describe(self):
+        """当前缓存状态（用于日志 / 模型服务的 status 命令）。"""
+        with self._lock:
+            idle = [(e["name"], e["key"][2], e["key"][3], round(e["size_mb"])) for e in self._idle.values()]
+            busy = [(e["name"], e["key"][2], e["key"][3], round(e["size_mb"])) for e in self._busy.values()]
+            return {"budget_mb": self.budget_mb, "hits": self.hits, "loads": self.loads,
+                    "idle": idle, "busy": busy}
+
+
+model_manager = ModelManager()
+
+
+def transcribe_file(model, file, settings, progress_callback=None, start_time=0.0, on_chunk=None, chunks=None,
+                    context_seed=None):
+    """
+    转写单个文件，返回统一的片段列表（每个元素都有 .start / .end / .text）：
+      - faster：transcribe_in_chunks 流式分片（fixed / vad），每个片段完成时回调进度；
+        start_time > 0 时从该处续传；给出 on_chunk 时每个片段完成就交给它（分片日志、增量写字幕），返回空列表；
+        chunks 为已经开始解码的 ChunkPrefetcher（此时它已按 start_time 定位）；
+        context_seed 为续传前已完成的 segments，用来恢复跨片段的前文
+      - openai：model.transcribe 整个文件一次完成，结束时回调一次进度（忽略 start_time，on_chunk 只调用一次）
+    """
+    lang_option = settings["lang_option"]
+    if settings["backend"] == "openai":
+        result = model.transcribe(
+            file,
+            language=None if lang_option.lower() == "auto" else lang_option,
+            # ✅ 防止重复；有意不跟随 carry_context：整个文件一次识别，没有片段边界可以携带前文，
+            # 而以前文为条件正是整文件识别陷入重复循环的原因（见 README「识别设置说明」）
+            condition_on_previous_text=False,
+            word_timestamps=True                # ✅ 保留时间轴
+        )
+        segments = [Segment(seg.get("start", 0.0), seg.get("end", 0.0), seg.get("text", ""))
+                    for seg in result.get("segments", [])]
+        # 先汇报进度再交给 on_chunk：给出 on_chunk 时返回空列表，之后就拿不到结束时间了
+        if progress_callback and segments:
+            progress_callback(segments[-1].end)
+        if on_chunk:
+            on_chunk(segments[-1].end if segments else 0.0, segments)
+            segments = []
+        return segments
+
+    return transcribe_in_chunks(model, file, lang_option, chunk_duration=chunk_sizer or settings["chunk_seconds"],
+                                progress_callback=progress_callback,
+                                parallel_chunks=settings["chunk_workers"],
+                                chunking=settings["chunking"],
+                                start_time=start_time, on_chunk=on_chunk, chunks=chunks,
+                                overlap=settings["overlap_seconds"],
+                                carry_context=settings["carry_context"], context_seed=context_seed,
+                                decode_mode=settings["decode_mode"])
+
+# ---------------------- 输出路径 / 写字幕 ----------------------
+
+def build_output_path(file, settings):
+    """
+    生成字幕输出路径：name[.suffix].ext
+    如果选择统一存放，则放到 settings["output_folder"]，否则放在源文件同目录。
+    """
+    if settings["output_mode"] == 2:
+        output_folder = settings["output_folder"]
+    else:
+        output_folder = os.path.dirname(file)
+    name, _ = os.path.splitext(os.path.basename(file))
+    suffix = settings["suffix"]
+    ext = "txt" if settings["export_format"] == "TXT" else "srt"
+    output_filename = f"{name}.{suffix}.{ext}" if suffix else f"{name}.{ext}"
+    return os.path.join(output_folder, output_filename)
+
+
+def format_segments(segments, export_format, first_index=0):
+    """把片段排成 SRT（编号从 first_index + 1 开始）或 TXT 文本；增量写字幕与 HTTP 服务返回结果共用。"""
+    lines = []
+    for k, seg in enumerate(segments, first_index + 1):
+        if export_format == "TXT":
+            # seg.text 是识别出的文本（可能包含换行）
+            lines.append(seg.text.strip() + "\n")
+        else:
+            # SRT 格式：编号 \n start --> end \n 文本 \n\n
+            lines.append(f"{k}\n{format_timestamp(seg.start)} --> {format_timestamp(seg.end)}\n{seg.text.strip()}\n\n")
+    return "".join(lines)
+
+
+class SubtitleWriter:
+    """
+    增量写字幕：片段一到就追加到 <输出路径>.partial 并 flush，SRT 编号跨片段连续；
+    close 时用 os.replace 原子地改名为正式文件，所以正式文件要么不存在、要么是完整的。
+    识别过程中可以用 tail -f 等工具查看 .partial 文件，实时检查识别效果；内存中也不必保留全部片段。
+    """
+
+    def __init__(self, output_path, export_format):
+        self.output_path = output_path
+        self.partial_path = output_path + ".partial"
+        self.export_format = export_format
+        self.count = 0   # 已写出的片段数（SRT 编号）
+        self._file = open(self.partial_path, "w", encoding="utf-8")
+
+    def write(self, segments):
+        """追加一批片段：SRT 写编号和时间轴，TXT 每段一行纯文本；写完立即 flush。"""
+        segments = list(segments)
+        self._file.write(format_segments(segments, self.export_format, self.count))
+        self.count += len(segments)
+        self._file.flush()
+
+    def close(self):
+        """全部写完：关闭并把 .partial 改名为正式文件（已存在的旧字幕被原子替换）。"""
+        self._file.close()
+        os.replace(self.partial_path, self.output_path)
+
+    def abort(self):
+        """放弃（识别失败等）：删除 .partial；已经 close 过则什么也不做。"""
+        if self._file.closed:
+            return
+        self._file.close()
+        try:
+            os.remove(self.partial_path)
+        except OSError:
+            pass
+
+
+def write_subtitle_file(output_path, segments, export_format):
+    """把 segments 一次写成 SRT（带编号和时间轴）或 TXT（每段一行纯文本），同样先写 .partial 再替换。"""
+    writer = SubtitleWriter(output_path, export_format)
+    try:
+        writer.write(segments)
+        writer.close()
+    finally:
+        writer.abort()
+
+# ---------------------- 并行工作线程 ----------------------
+
+def set_worker_status(worker_id, text):
+    """更新某个工作线程在进度面板上显示的状态文字（线程安全）。"""
+    with stats_lock:
+        worker_status[worker_id] = text
+
+
+def status_lines():
+    """并行进度面板的文字：每个工作线程一行，处理中再加一行 ETA；空闲时返回空列表。"""
+    with stats_lock:
+        items = sorted(worker_status.items())
+    lines = [f"线程{worker_id}：{text}" for worker_id, text in items]
+    tracker = eta_tracker
+    if lines and tracker is not None:
+        lines.append(format_eta_line(tracker))
+    cache_line = format_cache_line()
+    if cache_line:
+        lines.append(cache_line)
+    return lines
+
+
+def serve_cached_results(jobs, settings, stats):
+    """
+    开始识别前先查识别结果缓存：命中的文件直接用缓存的片段写出字幕（不需要加载模型），
+    返回仍需识别的 [(文件序号, 文件路径), ...]。指纹并发计算，每个文件只读约 192KB。
+    """
+    global processed_count
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+        keys = list(pool.map(lambda job: result_cache_key(job[1], settings), jobs))
+    remaining = []
+    for (i, file), key in zip(jobs, keys):
+        segments = load_cached_result(key) if key else None
+        if segments is None:
+            remaining.append((i, file))
+            with stats_lock:
+                cache_stats["misses"] += 1
+            continue
+        output_path = build_output_path(file, settings)
+        ok = False
+        try:
+            write_subtitle_file(output_path, segments, settings["export_format"])
+            log(f"⚡ 命中识别结果缓存：{os.path.basename(file)} -> {output_path}")
+            mark_manifest_done(file)
+            ok = True
+        except Exception as e:
+            log(f"写入字幕文件失败：{e}")
+        report_job_status(file, "cached" if ok else "failed")
+        with stats_lock:
+            cache_stats["hits"] += 1
+            processed_count += 1
+            if ok:
+                stats["succeeded"] += 1
+    return remaining
+
+
+def transcription_worker(worker_id, job_queue, settings, stats):
+    """
+    工作线程：从 model_manager 取一份模型（缓存中没有才加载），然后不断从共享队列 job_queue 取文件转写，
+    直到队列为空；结束后把模型归还给缓存。
+    之所以用线程而不是进程：CTranslate2 / PyTorch 推理时会释放 GIL，多线程即可真正并行，
+    同时还能直接共享日志/进度等状态；每个线程的 CPU 占用由 cpu_threads 控制。
+    参数：
+      - worker_id：工作线程编号（从 1 开始，用于日志和进度面板）
+      - job_queue：whisper_jobs.JobScheduler（接口同 queue.Queue），元素为 (文件序号, 文件路径)
+      - settings：prepare_settings 返回的选项字典（工作线程不读界面控件）
+      - stats：共享统计字典（active / succeeded），需在 stats_lock 下修改
+    进度与 ETA 通过全局 eta_tracker 按片段汇报。
+    """
+    tag = f"[线程{worker_id}] " if settings["workers"] > 1 else ""
+
+    # ========== 每个工作线程取一份自己的模型（优先复用 model_manager 中已加载的） ==========
+    set_worker_status(worker_id, "正在加载模型…")
+    try:
+        model = model_manager.acquire(settings, num_workers=settings["chunk_workers"])
+        log(f"{tag}模型已就绪。")
+    except Exception as e:
+        log(f"{tag}加载模型失败：{e}")
+        set_worker_status(worker_id, "模型加载失败，已退出")
+        return
+
+    try:
+        process_job_queue(worker_id, tag, model, job_queue, settings, stats)
+    finally:
+        model_manager.release(model)  # 归还给缓存，下一批次可以直接复用
+    set_worker_status(worker_id, "已完成")
+
+
+def open_chunk_journal(file, settings, tag=""):
+    """为 faster 的分片转写打开分片日志（openai 整文件识别没有分片，返回 None）；有已完成的片段时写日志说明。"""
+    if settings["backend"] != "faster":
+        return None
+    key = result_cache_key(file, settings)
+    if key is None:
+        return None
+    journal = ChunkJournal(key)
+    try:
+        resume_from = journal.open()
+    except OSError as e:
+        log(f"{tag}无法打开分片日志（本文件不支持断点续传）：{e}")
+        return None
+    if resume_from > 0:
+        log(f"{tag}↻ 断点续传：{os.path.basename(file)} 的前 {format_hms(resume_from)} 已识别，从这里继续。")
+    return journal
+
+
+def process_job_queue(worker_id, tag, model, job_queue, settings, stats):
+    """
+    transcription_worker 的主循环：不断从 job_queue 取文件转写并写出字幕，直到队列为空。
+    faster 分片模式下每个文件的解码都在 ChunkPrefetcher 的线程里领先推理进行；当前文件解码完毕时，
+    再从队列提前领取下一个文件开始解码（最多领先一个文件，领得晚也就不会让其他工作线程没活干）。
+    """
+    global processed_count
+    lookahead = deque()   # 提前领取、已开始解码的任务：(文件序号, 文件路径, 分片日志, 预取器)
+    lookahead_lock = threading.Lock()
+
+    def start_job(i, file):
+        journal = open_chunk_journal(file, settings, tag)
+        prefetcher = None
+        if settings["backend"] == "faster" and settings["decode_mode"] == "pipe":
+            start_time = journal.resume_from if journal else 0.0
+            chunks = iter_file_chunks(file, settings["chunking"], start_time,
+                                      chunk_sizer or settings["chunk_seconds"], settings["overlap_seconds"])
+            prefetcher = ChunkPrefetcher(chunks, on_done=reserve_next)
+        return i, file, journal, prefetcher
+
+    def reserve_next():
+        # 在解码线程中调用：当前文件已解码完，领取下一个文件并开始解码
+        with lookahead_lock:
+            if lookahead:
+                return
+            try:
+                i, file = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            lookahead.append(start_job(i, file))
+
+    while True:
+        with lookahead_lock:
+            job = lookahead.popleft() if lookahead else None
+        if job is None:
+            try:
+                job = start_job(*job_queue.get_nowait())
+            except queue.Empty:
+                break
+        i, file, journal, prefetcher = job
+        if prefetcher is not None and prefetcher.decode_finished.is_set():
+            reserve_next()  # 短文件在上一个文件识别期间就已解码完：接着预取下一个
+
+        with stats_lock:
+            stats["active"] += 1
+        task_name = os.path.basename(file)
+        log(f"{tag}开始处理任务 {i+1}/{settings['total_files']}：{task_name}")
+        report_job_status(file, "running")
+        outcome = "failed"   # 中途 continue（失败）时保持 failed，成功 / 跳过时改掉
+        file_start = time.time()
+
+        output_path = build_output_path(file, settings)
+        log(f"{tag}字幕文件将保存至：{output_path}")
+
+        # 获取媒体信息（来自缓存索引，导入时已探测过，用于估算与日志）
+        media = get_media_info(file)
+        duration_sec = media.get("duration", 0) or 0
+        if media.get("codec"):
+            log(f"{tag}音频流：{media['codec']}，{media.get('channels') or '?'} 声道，"
+                f"{media.get('sample_rate') or '?'} Hz，时长 {format_hms(duration_sec)}")
+        set_worker_status(worker_id, f"{task_name}：开始识别")
+        resume_from = journal.resume_from if journal else 0.0
+        eta_tracker.begin(worker_id, resume_from)
+        writer = None
+        collected = []   # 没有分片日志时在内存中收集片段（用于写缓存 / 一次性写出）
+
+        def on_chunk(chunk_end, segments):
+            # 每个片段完成（按时间顺序）：记入分片日志，并追加到正在写的字幕文件
+            with metrics.registry.timer("write"):
+                if journal is not None:
+                    journal.append(chunk_end, segments)
+                else:
+                    collected.extend(segments)
+                if writer is not None:
+                    writer.write(segments)
+
+        def on_progress(done_sec):
+            # 每完成一个片段：更新 ETA 累加值，并刷新面板显示已识别到的位置 / 总时长
+            eta_tracker.advance(worker_id, done_sec)
+            if duration_sec > 0:
+                percent = min(100.0, done_sec / duration_sec * 100)
+                set_worker_status(worker_id, f"{task_name}：{format_hms(done_sec)} / {format_hms(duration_sec)}（{percent:.0f}%）")
+            else:
+                set_worker_status(worker_id, f"{task_name}：已识别 {format_hms(done_sec)}")
+
+        try:
+            if duration_sec > 0 and not media.get("codec"):
+                # ffprobe 能读出时长却找不到音轨：纯视频/图片等，没有可识别的内容
+                log(f"{tag}跳过：{task_name} 没有音频流。")
+                outcome = "skipped"
+                continue
+
+            # ========== 转写（核心），边识别边写字幕 ==========
+            try:
+                if settings["stream_output"]:
+                    writer = SubtitleWriter(output_path, settings["export_format"])
+                    if resume_from > 0:
+                        writer.write(journal)  # 续传：先把日志里已完成的片段写进去，编号接着往下排
+                transcribe_file(model, file, settings, progress_callback=on_progress,
+                                start_time=resume_from, on_chunk=on_chunk, chunks=prefetcher,
+                                context_seed=journal if resume_from > 0 else None)
+            except Exception as e:
+                log(f"{tag}处理文件 {file} 失败：{e}")
+                continue
+            segments = journal if journal is not None else collected
+            if settings["result_cache"]:
+                key = result_cache_key(file, settings)
+                if key:
+                    store_cached_result(key, segments, file)
+
+            # ========== 写入字幕文件（增量写出时只需改名） ==========
+            try:
+                with metrics.registry.timer("write"):
+                    if writer is not None:
+                        writer.close()
+                    else:
+                        write_subtitle_file(output_path, segments, settings["export_format"])
+                log(f"{tag}✅ 完成处理文件：{task_name}")
+            except Exception as e:
+                log(f"{tag}写入字幕文件失败：{e}")
+                continue
+            with stats_lock:
+                stats["succeeded"] += 1
+            outcome = "done"
+            mark_manifest_done(file)
+            if journal is not None:
+                journal.discard()
+
+            # ========== 统计与 ETA ==========
+            file_elapsed = time.time() - file_start
+            metrics.registry.observe("file", file_elapsed)
+            log(f"{tag}⏱ 当前文件用时：{format_hms(file_elapsed)}，音频时长：{format_hms(duration_sec)}")
+            eta_tracker.finish(worker_id, duration_sec)
+            log(f"⏳ {format_eta_line(eta_tracker)}")
+            log("-" * 50)
+        finally:
+            if prefetcher is not None:
+                prefetcher.cancel()  # 跳过 / 失败时停止解码（正常结束时解码线程早已退出）
+            if writer is not None:
+                writer.abort()   # 失败时删除 .partial（成功时已改名，这里什么也不做）
+            if journal is not None:
+                journal.close()  # 失败时保留日志，下次从断点继续
+            eta_tracker.finish(worker_id, duration_sec)  # 失败/跳过的文件在这里从剩余量中扣除
+            with stats_lock:
+                stats["active"] -= 1
+                processed_count += 1
+            report_job_status(file, outcome)
+            set_worker_status(worker_id, "空闲")
+
+
+def batched_runner(files, settings, stats):
+    """
+    批量推理模式的处理流程：只加载一份模型（CPU 线程全部给它），由 transcribe_batched
+    把所有文件的 30 秒窗口凑批识别；每个文件识别完成时按原规则写出字幕文件。
+    结束后在日志中输出吞吐量（音频秒 / 墙钟秒）。
+    """
+    set_worker_status(1, "正在加载模型…")
+    try:
+        model = model_manager.acquire(settings)
+        log("模型已就绪（批量推理模式）。")
+    except Exception as e:
+        log(f"加载模型失败：{e}")
+        set_worker_status(1, "模型加载失败")
+        return
+
+    paths = dict(files)
+
+    def on_file_done(idx, segments, error):
+        global processed_count
+        file = paths[idx]
+        task_name = os.path.basename(file)
+        ok = False
+        if error is not None:
+            log(f"处理文件 {file} 失败：{error}")
+        else:
+            if settings["result_cache"]:
+                key = result_cache_key(file, settings)
+                if key:
+                    store_cached_result(key, segments, file)
+            output_path = build_output_path(file, settings)
+            try:
+                with metrics.registry.timer("write"):
+                    write_subtitle_file(output_path, segments, settings["export_format"])
+                log(f"✅ 完成处理文件：{task_name} -> {output_path}")
+                mark_manifest_done(file)
+                ok = True
+            except Exception as e:
+                log(f"写入字幕文件失败：{e}")
+        with stats_lock:
+            processed_count += 1
+            if ok:
+                stats["succeeded"] += 1
+        report_job_status(file, "done" if ok else "failed")
+
+    def on_progress(audio_done, elapsed):
+        eta_tracker.advance(1, audio_done)  # 批量模式下整批视为一条流，audio_done 为累计值
+        speed = audio_done / elapsed if elapsed > 0 else 0
+        set_worker_status(1, f"批量推理：已处理音频 {format_hms(audio_done)}，吞吐 {speed:.1f} 音频秒/秒")
+
+    stats["active"] = 1
+    eta_tracker.begin(1)
+    try:
+        audio_done, elapsed = transcribe_batched(
+            model, files, settings["lang_option"],
+            batch_size=batch_sizer or settings["batch_size"],
+            skip_silence=settings["chunking"] == "vad",
+            on_file_done=on_file_done,
+            progress_callback=on_progress
+        )
+    except Exception as e:
+        log(f"批量推理失败：{e}")
+        return
+    finally:
+        model_manager.release(model)
+        stats["active"] = 0
+        set_worker_status(1, "已完成")
+
+    if elapsed > 0:
+        size = f"{settings['batch_size']} -> {batch_sizer.current}（自适应）" if batch_sizer else settings['batch_size']
+        log(f"📈 批量推理吞吐量：{audio_done / elapsed:.2f} 音频秒/秒"
+            f"（共 {format_hms(audio_done)} 音频，用时 {format_hms(elapsed)}，批大小 {size}）")
+
+# ---------------------- 批次入口（GUI / 命令行共用） ----------------------
+
+def schedule_jobs(scheduler, jobs, settings):
+    """把 [(文件序号, 文件路径), ...] 放进调度器；时长取自媒体信息索引（调用前已探测），优先级取自 settings["priorities"]。"""
+    table = {whisper_jobs.path_key(os.path.abspath(p)): v for p, v in settings["priorities"].items()}
+    for job in jobs:
+        priority = table.get(whisper_jobs.path_key(os.path.abspath(job[1])), 0)
+        scheduler.put(job, get_audio_duration(job[1]), priority)
+
+
+def process_files(files, options):
+    """
+    处理一批文件，阻塞直到全部结束：
+      1. prepare_settings 补全选项（设备、精度、CPU 线程、模型路径）
+      2. 查识别结果缓存：命中的文件直接写出字幕，只有未命中的文件进入后续步骤
+      3. 汇总剩余文件的音频时长，结合历史 RTF 建立 ETA；启动每 60 秒一次的状态日志线程
+      4. 按调度策略（settings["schedule"]）排列剩余文件
+      5. 批量推理模式：单模型跨文件凑批；否则启动 N 个工作线程从调度器取文件，
+         批次进行中可以用 add_jobs 追加文件，工作线程都空闲且没有正在加入的文件时批次才结束
+      6. 结束时把媒体索引与本次实测 RTF 写回磁盘
+    批次开始时写批次清单，每个文件写出后记一笔，正常结束时删除；进程中途被杀掉时清单留在磁盘上，
+    load_batch_manifest 可据此从第一个未完成的文件继续，未完成文件内部由分片日志从断点继续。
+    返回成功写出字幕的文件数。GUI 应在后台线程中调用它。
+    """
+    global processed_count, eta_tracker, chunk_sizer, batch_sizer, running_batch
+    files = list(files)
+    processed_count = 0
+    eta_tracker = None
+    chunk_sizer = batch_sizer = None
+    worker_status.clear()
+    with stats_lock:
+        cache_stats.update(hits=0, misses=0)
+        stage_totals.update(decode=0.0, infer=0.0, wait=0.0)
+    metrics.registry.reset()
+    sampler = None
+
+    # 统计变量，由各工作线程在 stats_lock 下共同更新
+    stats = {"active": 0, "succeeded": 0, "total": len(files)}
+    scheduler = None
+
+    # 启动周期性状态刷新线程
+    stop_event = threading.Event()
+    status_thread = threading.Thread(
+        target=update_status,
+        args=(stop_event, log, lambda: stats["total"], lambda: processed_count, lambda: stats["active"]),
+        daemon=True
+    )
+    status_thread.start()
+    start_overall = time.time()
+    interrupted = False
+
+    try:
+        settings = prepare_settings(options, len(files))
+        if settings is None:
+            return 0
+        sampler = metrics.MetricsSampler(settings["metrics_interval"], settings["metrics_prom"],
+                                         settings["metrics_jsonl"]).start()
+        metrics.registry.register_gauge("active_workers", lambda: stats["active"])
+        create_sizers(settings)
+        save_batch_manifest(files, options)
+        if settings["model_cache_mb"] is not None:
+            model_manager.set_budget(settings["model_cache_mb"])
+
+        # ========== 识别结果缓存：内容与参数都相同的文件直接写出，不进入识别队列 ==========
+        jobs = list(enumerate(files))
+        if settings["result_cache"]:
+            jobs = serve_cached_results(jobs, settings, stats)
+            log(format_cache_line())
+            if not jobs:
+                log("全部文件命中识别结果缓存，无需加载模型。")
+                return stats["succeeded"]
+        if len(jobs) < settings["workers"] and not settings["open_batch"]:
+            settings["workers"] = len(jobs)  # 命中缓存的文件不占工作线程，线程数随之重新分配
+            plan_cpu_threads(settings)
+        workers = settings["workers"]
+
+        # ========== ETA：开始前汇总全部音频时长，并取历史 RTF 作为先验 ==========
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+            total_audio = sum(pool.map(get_audio_duration, [file for _, file in jobs]))
+        rtf_key = rtf_history_key(settings)
+        prior = load_rtf_history().get(rtf_key)
+        eta_tracker = EtaTracker(total_audio, 1 if settings["batched"] else workers, len(jobs),
+                                 prior_rtf=prior["rtf"] if prior else None)
+        msg = f"待处理音频总时长：{format_hms(total_audio)}"
+        if prior:
+            msg += f"，历史 RTF {prior['rtf']:.2f}，初步估计用时约 {format_hms(eta_tracker.estimate()[2])}"
+        log(msg)
+
+        # ========== 调度：按策略排列（时长在上面已探测并记入媒体信息索引） ==========
+        scheduler = whisper_jobs.JobScheduler(settings["schedule"])
+        schedule_jobs(scheduler, jobs, settings)
+        if settings["schedule"] != "fifo":
+            log(f"调度策略：{whisper_jobs.SCHEDULE_LABELS[settings['schedule']]}")
+
+        # ========== 批量推理模式：单模型 + 跨文件凑批 ==========
+        if settings["batched"]:
+            log(f"批量推理模式：批大小 {settings['batch_size']}，CPU 线程数：{settings['cpu_threads']}，设备：{settings['device']}"
+                f"（此模式下忽略并行任务数 / 片段并行设置，也不能在处理中追加文件）")
+            scheduler.close()
+            batched_runner(scheduler.drain(), settings, stats)
+            return stats["succeeded"]
+
+        if settings["backend"] == "openai" and settings["device"] == "cpu":
+            # torch 的线程池是进程级共享的：总线程数 = 每任务线程数 × 并行任务数
+            try:
+                import torch
+                torch.set_num_threads(min(os.cpu_count() or 1, settings["cpu_threads"] * workers))
+            except ImportError:
+                pass  # 没装 torch 时模型加载会失败，由工作线程写日志
+        log(f"并行任务数：{workers}，片段并行数：{settings['chunk_workers']}，"
+            f"每个推理实例 CPU 线程数：{settings['cpu_threads']}，设备：{settings['device']}")
+
+        # ========== 调度器 + 工作线程 ==========
+        metrics.registry.register_gauge("job_queue_depth", scheduler.qsize)
+        threads = {}   # 工作线程编号 -> 线程
+        threads_lock = threading.Lock()
+
+        def start_workers():
+            """按调度器中等待的文件数补足工作线程（同时最多 workers 个）；返回新启动的线程数。
+            批次开始时调用，add_jobs 加入文件后也会调用，追加的文件不必排在已有线程后面。"""
+            with threads_lock:
+                for worker_id in [i for i, t in threads.items() if not t.is_alive()]:
+                    del threads[worker_id]
+                free_ids = [i for i in range(1, workers + 1) if i not in threads]
+                started = free_ids[:scheduler.qsize()]
+                for worker_id in started:
+                    set_worker_status(worker_id, "等待中")
+                    threads[worker_id] = threading.Thread(
+                        target=transcription_worker,
+                        args=(worker_id, scheduler, settings, stats),
+                        daemon=True
+                    )
+                    threads[worker_id].start()
+                return len(started)
+
+        # 去重要覆盖本批次的全部输入（包括命中缓存、被跳过、没进调度器的文件），不能只看调度器
+        running_batch = (scheduler, settings, stats, {whisper_jobs.path_key(f) for f in files}, start_workers)
+        while True:
+            # 一轮：工作线程取到调度器为空时退出；这期间追加的文件若没被取走，再开一轮（模型从缓存中复用）
+            processed_before = processed_count
+            started = start_workers()
+            while True:
+                with threads_lock:
+                    alive = [t for t in threads.values() if t.is_alive()]
+                if not alive:
+                    break
+                for t in alive:
+                    t.join()
+            if scheduler.close_if_idle():
+                break
+            if started and processed_count == processed_before:
+                left = scheduler.close()
+                log(f"警告：还有 {left} 个文件未处理（所有工作线程均已退出）。")
+                break
+        # 加入文件时启动的线程可能晚于上面的检查；调度器已关闭，不会再有新线程
+        with threads_lock:
+            alive = list(threads.values())
+        for t in alive:
+            t.join()
+        return stats["succeeded"]
+
+    except BaseException:
+        interrupted = True  # 例如命令行下按了 Ctrl+C：保留批次清单与分片日志，下次可以续传
+        raise
+    finally:
+        running_batch = None
+        if scheduler is not None:
+            scheduler.close()  # 异常退出时也不再接受追加（等正在加入的文件处理完）
+        if not interrupted:
+            clear_batch_manifest()
+        # 停止状态线程并等待线程退出；最后采样、导出一次指标
+        stop_event.set()
+        status_thread.join()
+        metrics.registry.register_gauge("job_queue_depth", None)
+        metrics.registry.register_gauge("active_workers", None)
+        if sampler is not None:
+            sampler.stop()
+        for sizer in (chunk_sizer, batch_sizer):
+            if sizer is not None:
+                log(sizer.summary())
+        chunk_sizer = batch_sizer = None
+        save_media_index()  # 处理过程中新探测到的媒体信息也写回磁盘
+        if eta_tracker is not None:
+            # 本次实测的 RTF 写回历史，下次同样的 模型/设备/精度 一开始就有可靠的估计
+            measured = eta_tracker.measured_rtf()
+            if measured is not None:
+                record_rtf(rtf_key, measured, eta_tracker.audio_done)
+                log(f"本次实测 RTF：{measured:.2f}（推理秒 / 音频秒）")
+            eta_tracker = None
+
+        total_time = time.time() - start_overall
+        log(f"🎉 所有文件处理完毕，总耗时：{format_hms(total_time)}。")
+
+
+def add_jobs(files, priorities=None):
+    """
+    向正在处理的批次追加文件（例如识别过程中又导入了文件），不阻塞：在后台线程中查识别结果缓存、
+    探测时长后按调度策略插入，空闲的工作线程会接着处理。priorities 与选项 "priorities" 相同。
+    返回 False 表示现在不能追加（未在处理、批量推理模式或批次正在收尾），调用方应在本批次结束后重新开始。
+    """
+    batch = running_batch
+    if batch is None or not batch[0].reserve():
+        return False
+    threading.Thread(target=admit_jobs, args=(batch, list(files), dict(priorities or {})), daemon=True).start()
+    return True
+
+
+def admit_jobs(batch, files, priorities):
+    """add_jobs 的后台部分：编号、记入批次清单、查缓存、探测时长、更新 ETA，最后放进调度器。"""
+    scheduler, settings, stats, inputs, start_workers = batch
+    try:
+        with stats_lock:
+            # 去掉本批次已有的文件（含命中缓存、被跳过的）与列表内的重复
+            unique = {}
+            for f in files:
+                key = whisper_jobs.path_key(f)
+                if key not in inputs:
+                    unique[key] = f
+            if not unique:
+                return
+            inputs.update(unique)
+            files = list(unique.values())
+            base = stats["total"]
+            stats["total"] += len(files)
+            settings["total_files"] = stats["total"]
+        settings["priorities"] = {**settings["priorities"], **priorities}
+        jobs = [(base + k, file) for k, file in enumerate(files)]
+        extend_batch_manifest(files)
+        if settings["result_cache"]:
+            jobs = serve_cached_results(jobs, settings, stats)
+        with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as pool:
+            audio = sum(pool.map(get_audio_duration, [file for _, file in jobs]))
+        eta_tracker.add_files(audio, len(jobs))
+        schedule_jobs(scheduler, jobs, settings)
+        start_workers()
+        log(f"➕ 已加入当前批次：{len(files)} 个文件（{len(files) - len(jobs)} 个命中缓存），"
+            f"新增音频 {format_hms(audio)}，共 {stats['total']} 个文件")
+    except Exception as e:
+        log(f"加入文件失败：{e}")
+    finally:
+        scheduler.release()
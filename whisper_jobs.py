@@ -0,0 +1,295 @@
+# WhisperGUI 任务队列
+# 目的：界面上的待处理文件列表。几万个文件时，导入去重、按序号查找、上移下移、改状态都不能逐个扫描整个列表。
+# 用法：
+#   jobs = JobQueue()
+#   added = jobs.add(paths)                 # 按加入顺序去重，返回真正新加入的路径
+#   jobs.slice(0, 500)                      # [(路径, 状态), ...]，界面按页取数据显示
+#   jobs.set_status(path, DONE)             # 返回该文件当前的序号（界面只刷新这一行）
+#   sched = JobScheduler("sjf")             # 批次内的调度：engine 的工作线程按策略从这里取文件
+# 说明：本模块不导入 tkinter，也不依赖 whisper_engine；状态值与 engine.report_job_status 使用的相同。
+
+import os
+import heapq
+import queue
+import threading
+
+# 任务状态（engine 通过 set_job_status_handler 汇报的也是这些值）
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+CACHED = "cached"
+
+STATUS_LABELS = {
+    PENDING: "待处理",
+    RUNNING: "处理中",
+    DONE: "完成",
+    FAILED: "失败",
+    SKIPPED: "已跳过",
+    CACHED: "缓存命中",
+}
+
+# 调度策略：决定一批文件交给工作线程的先后顺序
+SCHEDULE_POLICIES = ("fifo", "sjf", "lpt", "priority")
+SCHEDULE_LABELS = {
+    "fifo": "按列表顺序",
+    "sjf": "短文件优先",
+    "lpt": "长文件优先",
+    "priority": "按优先级",
+}
+
+
+def path_key(path):
+    """去重用的键：同一个文件写成 C:/a/b.mp3 与 C:\\a\\b.mp3（Windows 上大小写不同）也视为同一个。"""
+    return os.path.normcase(os.path.normpath(path))
+
+
+class JobQueue:
+    """
+    保持加入顺序的文件集合，附带每个文件的状态：
+      - _items：按顺序排列的路径（界面显示的顺序，也是交给 engine.process_files 的顺序）；
+      - _index：path_key(路径) -> 在 _items 中的位置，查重与按路径查序号都是 O(1)；
+      - _status：path_key(路径) -> 状态。
+    移动、删除只重建受影响区间的序号；一次导入多少文件都只加锁一次。
+    工作线程（状态汇报、后台导入）与界面线程都可能访问，所有操作都在锁内进行。
+    version 每次改动加 1，界面可据此判断是否需要重画。
+    """
+
+    def __init__(self, paths=()):
+        self._lock = threading.RLock()
+        self._items = []
+        self._index = {}
+        self._status = {}
+        self._priority = {}   # path_key(路径) -> 优先级（只记录非 0 的）
+        self.version = 0
+        self.add(paths)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, path):
+        return path_key(path) in self._index
+
+    def __iter__(self):
+        return iter(self.paths())
+
+    def _reindex(self, start=0, stop=None):
+        for k in range(start, len(self._items) if stop is None else stop):
+            self._index[path_key(self._items[k])] = k
+        self.version += 1
+
+    def add(self, paths):
+        """按顺序追加，已在队列中的跳过；返回真正新加入的路径列表。"""
+        added = []
+        with self._lock:
+            for path in paths:
+                key = path_key(path)
+                if key in self._index:
+                    continue
+                self._index[key] = len(self._items)
+                self._status[key] = PENDING
+                self._items.append(path)
+                added.append(path)
+            if added:
+                self.version += 1
+        return added
+
+    def index(self, path):
+        """路径在队列中的序号（0 基），不在队列中时为 None。"""
+        return self._index.get(path_key(path))
+
+    def paths(self):
+        """全部路径的副本（按当前顺序）。"""
+        with self._lock:
+            return list(self._items)
+
+    def slice(self, start, stop):
+        """第 start 到 stop-1 个文件：[(路径, 状态), ...]（界面分页显示用）。"""
+        with self._lock:
+            return [(path, self._status[path_key(path)]) for path in self._items[start:stop]]
+
+    def status(self, path):
+        return self._status.get(path_key(path))
+
+    def set_status(self, path, status):
+        """修改一个文件的状态，返回它的序号；文件已不在队列中（被删除）时返回 None。"""
+        key = path_key(path)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._status[key] = status
+            self.version += 1
+            return self._index[key]
+
+    def priority(self, path):
+        return self._priority.get(path_key(path), 0)
+
+    def set_priority(self, start, end, value):
+        """把第 start 到 end 个文件（含两端）的优先级设为 value（越大越先处理，0 为默认）。"""
+        with self._lock:
+            for path in self._items[start:end + 1]:
+                if value:
+                    self._priority[path_key(path)] = value
+                else:
+                    self._priority.pop(path_key(path), None)
+            self.version += 1
+
+    def priorities(self):
+        """{路径: 优先级}，只含设置过（非 0）的文件；作为 engine 选项 "priorities" 传入。"""
+        with self._lock:
+            return {path: self._priority[path_key(path)] for path in self._items if path_key(path) in self._priority}
+
+    def reset_status(self, status=PENDING):
+        """新批次开始前把所有文件重置为同一状态。"""
+        with self._lock:
+            for key in self._status:
+                self._status[key] = status
+            self.version += 1
+
+    def counts(self):
+        """各状态的文件数：{状态: 数量}。"""
+        result = {}
+        with self._lock:
+            for status in self._status.values():
+                result[status] = result.get(status, 0) + 1
+        return result
+
+    def remove_range(self, start, end):
+        """删除第 start 到 end 个文件（含两端），返回删除的个数。"""
+        with self._lock:
+            removed = self._items[start:end + 1]
+            del self._items[start:end + 1]
+            for path in removed:
+                key = path_key(path)
+                del self._index[key]
+                del self._status[key]
+                self._priority.pop(key, None)
+            self._reindex(start)
+        return len(removed)
+
+    def move_range(self, start, end, delta):
+        """
+        把第 start 到 end 个文件整体移动 delta 个位置（负数为上移），超出两端时移到头 / 尾为止；
+        返回移动后的新起点。
+        """
+        with self._lock:
+            count = end - start + 1
+            new_start = max(0, min(len(self._items) - count, start + delta))
+            if new_start == start:
+                return start
+            block = self._items[start:end + 1]
+            del self._items[start:end + 1]
+            self._items[new_start:new_start] = block
+            self._reindex(min(start, new_start), max(end, new_start + count - 1) + 1)  # 只有这个区间的序号变了
+            return new_start
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._index.clear()
+            self._status.clear()
+            self._priority.clear()
+            self.version += 1
+
+
+class JobScheduler:
+    """
+    一个批次内的任务调度器，接口与 queue.Queue 相同（put / get_nowait / qsize / empty），
+    engine 的工作线程直接从这里取 (文件序号, 文件路径)。按策略排序的最小堆：
+      - fifo：按加入顺序；
+      - sjf：短文件优先（时长来自导入时探测的媒体信息），尽早出结果、平均等待时间最短；
+      - lpt：长文件优先，多个工作线程并行时长文件不会最后才开始、独自拖长整批用时；
+      - priority：优先级高的先处理，相同优先级按加入顺序。
+    批次进行中可以继续加入文件：加入方先 reserve()，探测完时长后 put()，最后 release()；
+    工作线程全部空闲时 close_if_idle() 等正在加入的文件放进来，仍然没有任务才关闭调度器，
+    关闭后 reserve() 返回 False（调用方应改为开始新的批次）。同一个文件在一个批次内只会加入一次。
+    """
+
+    def __init__(self, policy="fifo"):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"未知的调度策略：{policy}（可选：{', '.join(SCHEDULE_POLICIES)}）")
+        self.policy = policy
+        self.closed = False
+        self._heap = []
+        self._seq = 0
+        self._seen = set()
+        self._incoming = 0
+        self._cond = threading.Condition()
+
+    def _sort_key(self, duration, priority):
+        if self.policy == "sjf":
+            return duration
+        if self.policy == "lpt":
+            return -duration
+        if self.policy == "priority":
+            return -priority
+        return 0
+
+    def __contains__(self, path):
+        return path_key(path) in self._seen
+
+    def put(self, item, duration=0.0, priority=0):
+        """加入一个 (文件序号, 文件路径)；同一文件已加入过时忽略并返回 False。"""
+        with self._cond:
+            key = path_key(item[1])
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            heapq.heappush(self._heap, (self._sort_key(duration, priority), self._seq, item))
+            self._seq += 1
+            return True
+
+    def get_nowait(self):
+        with self._cond:
+            if not self._heap:
+                raise queue.Empty
+            return heapq.heappop(self._heap)[2]
+
+    def drain(self):
+        """按调度顺序取出全部剩余任务（批量推理模式一次交给 transcribe_batched）。"""
+        items = []
+        with self._cond:
+            while self._heap:
+                items.append(heapq.heappop(self._heap)[2])
+        return items
+
+    def qsize(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
+
+    def reserve(self):
+        """准备加入文件：调度器已关闭时返回 False；返回 True 后必须调用一次 release()。"""
+        with self._cond:
+            if self.closed:
+                return False
+            self._incoming += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._incoming -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        """不再接受新文件（先等正在加入的文件放进来），返回剩余未取走的任务数。"""
+        with self._cond:
+            while self._incoming > 0:
+                self._cond.wait()
+            self.closed = True
+            return len(self._heap)
+
+    def close_if_idle(self):
+        """等正在加入的文件放进来；之后仍没有任务时关闭调度器并返回 True，否则返回 False。"""
+        with self._cond:
+            while self._incoming > 0:
+                self._cond.wait()
+            if self._heap:
+                return False
+            self.closed = True
+            return True
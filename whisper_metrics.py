@@ -0,0 +1,318 @@
+# WhisperGUI 运行指标
+# 目的：看清时间花在哪里。记录各阶段（ffprobe 探测、ffmpeg 解码、模型推理、片段合并、写字幕）的逐次耗时，
+#       以及队列深度、CPU%、内存、显存，供 GUI 指标面板实时显示，也可导出为 Prometheus 文本或 JSON Lines。
+# 用法：
+#   with metrics.registry.timer("decode"): ...        # 记一次阶段耗时
+#   metrics.registry.observe("infer", seconds)        # 或直接记录已测得的耗时
+#   metrics.registry.register_gauge("job_queue_depth", job_queue.qsize)   # 采样时调用的取值函数
+#   sampler = metrics.MetricsSampler(2.0, prom_path="m.prom", jsonl_path="m.jsonl"); sampler.start(); ...; sampler.stop()
+# 说明：psutil / pynvml 都是可选的。没有 psutil 时 CPU% 用 os.times 估算，内存只在 Linux 上读 /proc；
+#       显存优先用 pynvml（整张卡的占用），否则在已导入 torch 时读 torch.cuda 的分配量。
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+RECENT_SAMPLES = 512   # 每个阶段保留最近多少次耗时，用来算分位数
+
+# 阶段名 -> 面板上显示的名字（也决定面板中的顺序）
+STAGE_LABELS = {
+    "probe": "探测",
+    "decode": "解码",
+    "decode_wait": "等待解码",
+    "infer": "推理",
+    "infer_batch": "批量推理",
+    "merge": "片段合并",
+    "write": "写字幕",
+    "file": "整个文件",
+}
+
+
+class StageStats:
+    """一个阶段的耗时统计：次数、总和、最大值，以及最近 RECENT_SAMPLES 次的耗时（算分位数）。"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        return {"count": self.count, "total": round(self.total, 4), "max": round(self.max, 4),
+                "last": round(self.last, 4), "p50": round(self.quantile(0.5), 4), "p95": round(self.quantile(0.95), 4)}
+
+
+class MetricsRegistry:
+    """
+    线程安全的指标登记处：阶段耗时（observe / timer）、数值（set_gauge / add_gauge）、
+    以及采样时才调用的取值函数（register_gauge，例如队列长度）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._gauges = {}
+        self._gauge_funcs = {}
+
+    def reset(self):
+        """新批次开始：清空阶段统计与计数型数值（取值函数保留）。"""
+        with self._lock:
+            self._stages.clear()
+            self._gauges.clear()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats()
+            stats.add(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def register_gauge(self, name, func):
+        """采样时调用 func() 取值；func 为 None 时注销（数值归零）。"""
+        with self._lock:
+            if func is None:
+                self._gauge_funcs.pop(name, None)
+                self._gauges[name] = 0
+            else:
+                self._gauge_funcs[name] = func
+
+    def snapshot(self):
+        """当前全部指标：{"time", "stages": {阶段: 统计}, "gauges": {名称: 数值}}。"""
+        with self._lock:
+            funcs = list(self._gauge_funcs.items())
+        values = {}
+        for name, func in funcs:
+            try:
+                values[name] = func()
+            except Exception:
+                continue  # 取值函数出错（例如队列已经释放）不影响其他指标
+        with self._lock:
+            self._gauges.update(values)
+            return {"time": round(time.time(), 3),
+                    "stages": {name: stats.summary() for name, stats in self._stages.items()},
+                    "gauges": dict(self._gauges)}
+
+    def panel_lines(self):
+        """GUI 指标面板的文字：资源与队列一行，每个有数据的阶段一行；还没有数据时返回空列表。"""
+        snap = self.snapshot()
+        gauges = snap["gauges"]
+        lines = []
+        resource = []
+        if gauges.get("cpu_percent") is not None:
+            resource.append(f"CPU {gauges['cpu_percent']:.0f}%")
+        if gauges.get("rss_bytes"):
+            resource.append(f"内存 {format_bytes(gauges['rss_bytes'])}")
+        if gauges.get("gpu_memory_bytes"):
+            resource.append(f"显存 {format_bytes(gauges['gpu_memory_bytes'])}")
+        if "job_queue_depth" in gauges:
+            resource.append(f"待处理队列 {gauges['job_queue_depth']}")
+        if "prefetch_queue_depth" in gauges:
+            resource.append(f"已预取片段 {gauges['prefetch_queue_depth']}")
+        if "active_workers" in gauges:
+            resource.append(f"忙碌线程 {gauges['active_workers']}")
+        if gauges.get("adaptive_chunk_seconds"):
+            resource.append(f"片段长度 {gauges['adaptive_chunk_seconds']}秒")
+        if gauges.get("adaptive_batch_size"):
+            resource.append(f"批大小 {gauges['adaptive_batch_size']}")
+        if resource:
+            lines.append("，".join(resource))
+        stages = snap["stages"]
+        for name in list(STAGE_LABELS) + sorted(set(stages) - set(STAGE_LABELS)):
+            s = stages.get(name)
+            if not s:
+                continue
+            lines.append(f"{STAGE_LABELS.get(name, name)}：{s['count']} 次，合计 {s['total']:.1f}秒，"
+                         f"平均 {s['total'] / s['count']:.2f}秒，p95 {s['p95']:.2f}秒，最长 {s['max']:.2f}秒")
+        return lines
+
+
+def format_bytes(n):
+    if n >= 1 << 30:
+        return f"{n / (1 << 30):.2f} GB"
+    return f"{n / (1 << 20):.0f} MB"
+
+
+def to_prometheus(snap, prefix="whispergui"):
+    """把 snapshot() 的结果写成 Prometheus 文本格式（node_exporter 的 textfile collector 可以直接读取）。"""
+    lines = [f"# HELP {prefix}_stage_seconds 各阶段单次耗时（秒），分位数取自最近 {RECENT_SAMPLES} 次",
+             f"# TYPE {prefix}_stage_seconds summary"]
+    for stage, s in sorted(snap["stages"].items()):
+        for q, key in (("0.5", "p50"), ("0.95", "p95")):
+            lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} {s[key]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {s["total"]}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+    for name, value in sorted(snap["gauges"].items()):
+        if value is None:
+            continue
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- 进程资源采样 ----------------------
+
+def system_memory():
+    """整机内存 (总量, 可用量)，单位字节；读不到时为 (None, None)。没有 psutil 时只在 Linux 上读 /proc/meminfo。"""
+    try:
+        import psutil
+        vm = psutil.virtual_memory()
+        return vm.total, vm.available
+    except ImportError:
+        pass
+    try:
+        info = {}
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                info[name] = int(rest.split()[0]) * 1024
+        return info["MemTotal"], info["MemAvailable"]
+    except (OSError, ValueError, KeyError, IndexError):
+        return None, None
+
+
+class ResourceProbe:
+    """读取本进程的 CPU%（自上次读取以来，多核时可超过 100%）、常驻内存与显存；拿不到的项为 None。"""
+
+    def __init__(self):
+        try:
+            import psutil
+            self._process = psutil.Process()
+            self._process.cpu_percent(None)  # 第一次调用只是建立基准
+        except ImportError:
+            self._process = None
+        self._last_cpu = self._cpu_seconds()
+        self._last_wall = time.perf_counter()
+        self._nvml = None
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            self._nvml = pynvml
+            self._nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+        except Exception:
+            self._nvml = None  # 没装 pynvml、没有 NVIDIA 显卡或驱动不可用
+
+    @staticmethod
+    def _cpu_seconds():
+        t = os.times()
+        return t.user + t.system
+
+    def cpu_percent(self):
+        if self._process is not None:
+            return self._process.cpu_percent(None)
+        now_cpu, now_wall = self._cpu_seconds(), time.perf_counter()
+        elapsed = now_wall - self._last_wall
+        percent = (now_cpu - self._last_cpu) / elapsed * 100 if elapsed > 0 else 0.0
+        self._last_cpu, self._last_wall = now_cpu, now_wall
+        return percent
+
+    def rss_bytes(self):
+        if self._process is not None:
+            return self._process.memory_info().rss
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def gpu_memory_bytes(self):
+        if self._nvml is not None:
+            try:
+                return self._nvml.nvmlDeviceGetMemoryInfo(self._nvml_handle).used
+            except Exception:
+                return None
+        torch = sys.modules.get("torch")  # 只在 openai 后端已经导入 torch 时读取，不为此去导入它
+        if torch is not None:
+            try:
+                if torch.cuda.is_available():
+                    return torch.cuda.memory_allocated()
+            except Exception:
+                return None
+        return None
+
+
+class MetricsSampler:
+    """
+    后台线程：每 interval 秒采样一次进程资源写入 registry，并按需导出：
+      - prom_path：每次覆盖写入 Prometheus 文本（先写临时文件再改名，读取方不会看到半个文件）；
+      - jsonl_path：每次追加一行 snapshot 的 JSON。
+    stop() 时再采样、导出一次，文件里总有批次结束时的最终数据。
+    """
+
+    def __init__(self, interval=2.0, prom_path="", jsonl_path="", target=None):
+        self.interval = interval
+        self.prom_path = prom_path
+        self.jsonl_path = jsonl_path
+        self.registry = target or registry
+        self._probe = ResourceProbe()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.registry.set_gauge("cpu_percent", round(self._probe.cpu_percent(), 1))
+        self.registry.set_gauge("rss_bytes", self._probe.rss_bytes())
+        self.registry.set_gauge("gpu_memory_bytes", self._probe.gpu_memory_bytes())
+        if not (self.prom_path or self.jsonl_path):
+            return
+        snap = self.registry.snapshot()
+        try:
+            if self.prom_path:
+                tmp_path = self.prom_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(to_prometheus(snap))
+                os.replace(tmp_path, self.prom_path)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(snap, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # 导出失败（目录不存在、磁盘满）不影响识别本身
+
+
+registry = MetricsRegistry()
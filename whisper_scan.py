@@ -0,0 +1,223 @@
+# WhisperGUI 文件夹扫描
+# 目的：导入文件夹（可能是有几十万个条目的 NAS 共享目录）时不卡住界面：
+#       在后台用多个线程并发 os.scandir 各个子目录，找到的文件按批交给调用方，边扫描边加入队列，随时可以取消。
+# 用法：
+#   f = ScanFilter(include=["*.mp4"], exclude=["#recycle", "*/backup/*"], min_duration=60,
+#                  skip_existing={"output_mode": 1, "output_folder": "", "suffix": "", "export_format": "SRT"})
+#   scanner = FolderScanner([folder], on_batch=lambda paths: ..., on_done=lambda s: print(s.summary()), scan_filter=f)
+#   scanner.start(); ...; scanner.cancel()
+# 说明：on_batch / on_done 在扫描线程中调用，GUI 需要自己转交给 Tk 主线程（run_on_ui）。
+
+import os
+import time
+import queue
+import fnmatch
+import threading
+import whisper_engine as engine
+
+SCAN_WORKERS = 8          # 同时扫描的目录数（网络共享目录上 scandir 主要在等 I/O，线程多一些更快）
+SCAN_BATCH_FILES = 500    # 每凑够这么多个文件交给 on_batch 一次
+SCAN_FLUSH_SECONDS = 0.5  # 不满一批时，距上次交出超过这么久也交出一次（让界面尽快看到结果）
+
+
+class ScanFilter:
+    """
+    导入筛选条件（都可以不设）：
+      - include：文件名或相对路径匹配任一通配符才导入（不区分大小写，例如 "*.mp4"、"lecture_*"）；
+      - exclude：匹配任一通配符的文件不导入，匹配的子目录整个不扫描（例如 "#recycle"、"*/backup/*"）；
+      - min_size / max_size：文件大小范围（字节，0 = 不限）；
+      - min_duration / max_duration：音频时长范围（秒，0 = 不限）。需要 ffprobe，结果记入媒体信息索引，
+        之后开始识别时不必再探测；
+      - skip_existing：输出设置（output_mode / output_folder / suffix / export_format），
+        给出时跳过字幕文件已经存在的文件。
+    扩展名始终要在 engine.supported_extensions 之内。从快到慢依次检查，靠前的条件不满足就不做后面的。
+    """
+
+    def __init__(self, include=(), exclude=(), min_size=0, max_size=0, min_duration=0, max_duration=0,
+                 skip_existing=None):
+        self.include = [p.lower() for p in include if p]
+        self.exclude = [p.lower() for p in exclude if p]
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.skip_existing = skip_existing
+
+    @staticmethod
+    def _match(patterns, name, rel):
+        return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(rel, p) for p in patterns)
+
+    def skip_dir(self, name, rel):
+        """子目录是否整个跳过（匹配 exclude）。rel 为相对扫描根目录的路径，以 / 分隔。"""
+        return bool(self.exclude) and self._match(self.exclude, name.lower(), rel.lower())
+
+    def check(self, entry, rel):
+        """检查一个文件（os.DirEntry）：导入时返回 None，否则返回跳过原因 "ext" / "filter" / "existing"。"""
+        name = entry.name.lower()
+        if not name.endswith(engine.supported_extensions):
+            return "ext"
+        rel = rel.lower()
+        if self.include and not self._match(self.include, name, rel):
+            return "filter"
+        if self.exclude and self._match(self.exclude, name, rel):
+            return "filter"
+        if self.min_size or self.max_size:
+            size = entry.stat().st_size
+            if size < self.min_size or (self.max_size and size > self.max_size):
+                return "filter"
+        if self.skip_existing and os.path.exists(engine.build_output_path(entry.path, self.skip_existing)):
+            return "existing"
+        if self.min_duration or self.max_duration:
+            duration = engine.get_media_info(entry.path).get("duration") or 0
+            if duration < self.min_duration or (self.max_duration and duration > self.max_duration):
+                return "filter"
+        return None
+
+
+class FolderScanner:
+    """
+    后台扫描一个或多个文件夹：
+      - 待扫描的目录放在共享队列里，workers 个线程各自取一个目录 os.scandir，发现的子目录再放回队列，
+        所以很宽的目录树会自动分散到所有线程；不跟随指向目录的符号链接（与 os.walk 默认相同，避免循环）；
+      - 每个目录内按文件名排序；通过筛选的文件每凑够 batch_size 个、或每隔 SCAN_FLUSH_SECONDS 秒
+        调用一次 on_batch(路径列表)；
+      - cancel() 后各线程在下一个条目处停下，已经找到的文件仍会交出；
+      - 结束（扫完或取消）时调用一次 on_done(本对象)，之后 stats / cancelled / elapsed 不再变化。
+    扫描线程都是守护线程，关闭窗口时不会因为还在扫描而卡住退出。
+    """
+
+    def __init__(self, roots, on_batch, on_done=None, scan_filter=None, recursive=True,
+                 workers=SCAN_WORKERS, batch_size=SCAN_BATCH_FILES):
+        self.roots = list(roots)
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.filter = scan_filter or ScanFilter()
+        self.recursive = recursive
+        self.workers = workers
+        self.batch_size = batch_size
+        # dirs 已扫描的目录数，files 见到的文件数，matched 交出的文件数；ext / filter / existing 为各原因跳过的文件数
+        self.stats = {"dirs": 0, "files": 0, "matched": 0, "ext": 0, "filter": 0, "existing": 0, "errors": 0}
+        self.cancelled = False
+        self.elapsed = 0.0
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self._dirs = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0       # 已放进队列、尚未扫描完的目录数；减到 0 即扫描结束
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._start = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+        self._pending = 1       # 占位：全部根目录放进队列之前不会因为某个根目录先扫完而提前结束
+        for root in self.roots:
+            self._submit(root, "")
+        self._release()
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def _submit(self, path, rel):
+        with self._lock:
+            self._pending += 1
+        self._dirs.put((path, rel))
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            self._finish()
+
+    def _worker(self):
+        while True:
+            item = self._dirs.get()
+            if item is None:
+                return
+            try:
+                if not self._cancel.is_set():
+                    self._scan_dir(*item)
+            finally:
+                self._release()
+
+    def _scan_dir(self, path, rel):
+        counts = dict.fromkeys(self.stats, 0)
+        matched = []
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            entries = None
+            counts["errors"] += 1
+        for entry in entries or ():
+            if self._cancel.is_set():
+                break
+            child_rel = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and not self.filter.skip_dir(entry.name, child_rel):
+                        self._submit(entry.path, child_rel)
+                    continue
+                if not entry.is_file():
+                    continue
+                reason = self.filter.check(entry, child_rel)
+            except OSError:
+                counts["errors"] += 1  # 没有权限、文件在扫描途中被删除等
+                continue
+            counts["files"] += 1
+            if reason is not None:
+                counts[reason] += 1
+                continue
+            matched.append(entry.path)
+            if len(matched) >= self.batch_size:
+                self._emit(matched, counts)   # 单个目录里就有大量文件时不必等整个目录扫完
+                matched, counts = [], dict.fromkeys(self.stats, 0)
+        counts["dirs"] += 1
+        self._emit(matched, counts)
+
+    def _emit(self, matched, counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+            self._buffer.extend(matched)
+        self._flush(force=False)
+
+    def _flush(self, force):
+        with self._lock:
+            if not self._buffer:
+                return
+            now = time.monotonic()
+            if not force and len(self._buffer) < self.batch_size and now - self._last_flush < SCAN_FLUSH_SECONDS:
+                return
+            batch, self._buffer = self._buffer, []
+            self._last_flush = now
+            self.stats["matched"] += len(batch)
+        self.on_batch(batch)
+
+    def _finish(self):
+        self._flush(force=True)
+        for _ in range(self.workers):
+            self._dirs.put(None)  # 让各扫描线程退出
+        self.elapsed = time.perf_counter() - self._start
+        try:
+            if self.on_done:
+                self.on_done(self)
+        finally:
+            self.done.set()
+
+    def summary(self):
+        """一行扫描结果（日志用）。"""
+        s = self.stats
+        head = "扫描已取消" if self.cancelled else "扫描完成"
+        skipped = f"跳过：非音视频 {s['ext']}，不符合筛选 {s['filter']}，已有字幕 {s['existing']}"
+        errors = f"，无法读取 {s['errors']} 处" if s["errors"] else ""
+        return (f"{head}：{s['dirs']} 个目录，{s['files']} 个文件，找到 {s['matched']} 个（{skipped}{errors}），"
+                f"用时 {self.elapsed:.1f} 秒")
@@ -0,0 +1,234 @@
+# WhisperGUI 本地模型服务（常驻进程）
+# 目的：把 whisper_engine 放进一个长期运行的进程，模型加载一次后留在内存（见 engine.model_manager），
+#       GUI 和命令行通过本机套接字提交任务，不必每次重新加载几个 GB 的权重。
+# 用法：
+#   python whisper_server.py                    # 启动服务（默认 127.0.0.1:50677）
+#   python whisper_server.py --model-cache-mb 12000
+#   python whisper_server.py --status           # 查看服务状态与已缓存的模型
+#   python whisper_server.py --unload           # 释放服务中的空闲模型
+#   python whisper_server.py --stop             # 停止服务
+#   python whisper_cli.py a.mp4 --server        # 命令行把任务交给服务
+# 说明：只监听 127.0.0.1；连接用 multiprocessing.connection 的 authkey 认证，密钥在 ~/.whispergui/server.key，
+#       由服务首次启动时生成，客户端读同一个文件。同一时间只执行一个批次，其余批次排队等待。
+
+import os
+import sys
+import argparse
+import threading
+from datetime import datetime
+from multiprocessing.connection import Listener, Client
+import whisper_engine as engine
+
+DEFAULT_PORT = 50677
+SERVER_KEY_PATH = os.path.join(engine.APP_DATA_DIR, "server.key")
+PROGRESS_INTERVAL = 1.0    # 处理中向客户端推送进度面板内容的间隔（秒）
+
+job_lock = threading.Lock()  # engine 的批次状态是全局的：一次只跑一个批次
+stop_event = threading.Event()  # 收到 stop 命令后置位，serve 随之返回
+
+
+def server_log(msg):
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    print(timestamp + msg, flush=True)
+
+
+def load_server_key(create=False):
+    """读取连接密钥；create=True（服务端）时不存在就生成一个只有当前用户可读的新密钥。"""
+    try:
+        with open(SERVER_KEY_PATH, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise
+    os.makedirs(engine.APP_DATA_DIR, exist_ok=True)
+    key = os.urandom(32)
+    fd = os.open(SERVER_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+# ---------------------- 服务端 ----------------------
+
+class ConnectionSender:
+    """多个工作线程共用一个连接发送消息：加锁串行化；客户端断开后静默丢弃，任务照常跑完。"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                self.closed = True
+
+
+def run_job(sender, files, options):
+    """执行一个批次：日志同时打印在服务端并转发给客户端，另起线程定时推送进度面板。"""
+    def forward_log(msg):
+        server_log(msg)
+        sender.send(("log", msg))
+
+    done = threading.Event()
+
+    def push_progress():
+        while not done.wait(PROGRESS_INTERVAL):
+            sender.send(("progress", engine.status_lines()))
+
+    engine.set_log_handler(forward_log)
+    progress_thread = threading.Thread(target=push_progress, daemon=True)
+    progress_thread.start()
+    try:
+        return engine.process_files(files, options)
+    finally:
+        done.set()
+        progress_thread.join()
+        engine.set_log_handler(server_log)
+
+
+def handle_connection(conn):
+    """处理一个客户端连接上的一个请求：("transcribe", files, options) / ("status",) / ("unload",) / ("stop",)。"""
+    sender = ConnectionSender(conn)
+    try:
+        message = conn.recv()
+        command = message[0]
+        if command == "transcribe":
+            _, files, options = message
+            options = dict(options)
+            options.pop("model_cache_mb", None)  # 缓存预算由服务端的 --model-cache-mb 决定
+            if not job_lock.acquire(blocking=False):
+                sender.send(("log", "模型服务正忙，任务已排队，等待前一个批次完成…"))
+                job_lock.acquire()
+            try:
+                server_log(f"收到任务：{len(files)} 个文件")
+                succeeded = run_job(sender, files, options)
+            finally:
+                job_lock.release()
+            sender.send(("done", succeeded))
+        elif command == "status":
+            sender.send(("done", {"busy": job_lock.locked(), "models": engine.model_manager.describe()}))
+        elif command == "unload":
+            sender.send(("done", engine.model_manager.clear()))
+        elif command == "stop":
+            sender.send(("done", None))
+            server_log("收到停止请求，模型服务退出。")
+            stop_event.set()
+        else:
+            sender.send(("error", f"未知命令：{command}"))
+    except (EOFError, OSError):
+        pass
+    except Exception as e:
+        server_log(f"处理请求失败：{e}")
+        sender.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+def accept_loop(listener):
+    """接受连接，每个连接交给一个线程处理。"""
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            break
+        except Exception as e:
+            server_log(f"拒绝连接：{e}")  # 认证失败等
+            continue
+        threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+
+
+def serve(port=DEFAULT_PORT, budget_mb=engine.MODEL_CACHE_BUDGET_MB):
+    """在 127.0.0.1:port 上提供服务，直到收到 stop 命令或 Ctrl+C（正在处理的批次会随进程一起结束）。"""
+    engine.set_log_handler(server_log)
+    engine.media_index.update(engine.load_media_index())
+    engine.model_manager.set_budget(budget_mb)
+    listener = Listener(("127.0.0.1", port), authkey=load_server_key(create=True))
+    server_log(f"模型服务已启动：127.0.0.1:{port}，模型缓存预算 {budget_mb} MB")
+    # accept() 阻塞时无法被别的线程可靠地打断，所以放到守护线程里，主线程只等待停止信号
+    threading.Thread(target=accept_loop, args=(listener,), daemon=True).start()
+    try:
+        while not stop_event.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        server_log("模型服务退出。")
+    finally:
+        listener.close()
+        engine.save_media_index()
+
+
+# ---------------------- 客户端 ----------------------
+
+def request(message, log_func=print, progress_func=None, port=DEFAULT_PORT):
+    """
+    向模型服务发送一个请求并等待结果：期间收到的日志交给 log_func，进度面板内容交给 progress_func。
+    服务未启动时抛出 ConnectionRefusedError（或找不到密钥文件时的 FileNotFoundError），调用方据此改为本地处理。
+    """
+    conn = Client(("127.0.0.1", port), authkey=load_server_key())
+    try:
+        conn.send(message)
+        while True:
+            kind, payload = conn.recv()
+            if kind == "log":
+                log_func(payload)
+            elif kind == "progress":
+                if progress_func:
+                    progress_func(payload)
+            elif kind == "error":
+                raise RuntimeError(payload)
+            else:
+                return payload
+    finally:
+        conn.close()
+
+
+def submit(files, options, log_func=print, progress_func=None, port=DEFAULT_PORT):
+    """把一批文件交给模型服务处理，返回成功的文件数。路径先转成绝对路径（服务的工作目录可能不同）。"""
+    files = [os.path.abspath(f) for f in files]
+    options = dict(options)
+    for key in ("model_folder", "output_folder", "metrics_prom", "metrics_jsonl"):
+        if options.get(key):
+            options[key] = os.path.abspath(options[key])
+    return request(("transcribe", files, options), log_func, progress_func, port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WhisperGUI 本地模型服务：常驻内存，复用已加载的模型。")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口（只监听 127.0.0.1，默认 %(default)s）")
+    parser.add_argument("--model-cache-mb", type=int, default=engine.MODEL_CACHE_BUDGET_MB,
+                        help="已加载模型的总占用上限（MB），超出时淘汰最久未用的模型（默认 %(default)s）")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="查看正在运行的服务的状态")
+    group.add_argument("--unload", action="store_true", help="释放服务中的空闲模型")
+    group.add_argument("--stop", action="store_true", help="停止正在运行的服务")
+    args = parser.parse_args(argv)
+
+    if not (args.status or args.unload or args.stop):
+        serve(args.port, args.model_cache_mb)
+        return 0
+    try:
+        if args.status:
+            status = request(("status",), port=args.port)
+            models = status["models"]
+            print(f"运行中（{'正在处理' if status['busy'] else '空闲'}），模型缓存预算 {models['budget_mb']} MB，"
+                  f"复用 {models['hits']} 次，加载 {models['loads']} 次")
+            for state in ("busy", "idle"):
+                for name, device, compute_type, size_mb in models[state]:
+                    print(f"  [{'使用中' if state == 'busy' else '空闲'}] {name}（{device} / {compute_type}，约 {size_mb} MB）")
+        elif args.unload:
+            print(f"已释放 {request(('unload',), port=args.port)} 个空闲模型。")
+        else:
+            request(("stop",), port=args.port)
+            print("模型服务已停止。")
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"模型服务未运行（127.0.0.1:{args.port}）。")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
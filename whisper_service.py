@@ -0,0 +1,512 @@
+# WhisperGUI 本地 HTTP 转写服务
+# 目的：其他内部工具不必运行 Tk 界面，通过本机 HTTP 提交音视频（上传文件内容或给出本机路径），
+#       取回 SRT / TXT / JSON 结果，或用 Server-Sent Events 边识别边接收片段。
+# 用法：
+#   python whisper_service.py --model tiny --workers 2 --queue-size 8
+#   curl -s --data-binary @talk.mp3 "http://127.0.0.1:50678/transcribe?filename=talk.mp3&format=srt"
+#   curl -s -H "Content-Type: application/json" -d "{\"path\": \"D:/videos/a.mp4\", \"language\": \"zh\"}" \
+#        "http://127.0.0.1:50678/transcribe?format=json"
+#   curl -sN --data-binary @talk.mp3 "http://127.0.0.1:50678/transcribe?filename=talk.mp3&stream=1"   # SSE
+#   curl -s "http://127.0.0.1:50678/health"
+# 说明：
+#   - 只监听 127.0.0.1，只用标准库（http.server），离线、tiny 模型即可运行；
+#   - workers 个工作线程各自从 engine.model_manager 取模型（启动时预先加载），同时最多识别 workers 个文件；
+#     等待队列最多 queue_size 个任务，满了直接返回 503 + Retry-After（不读上传内容），由调用方稍后重试；
+#   - 与 whisper_server.py 的区别：后者供本程序的 GUI / 命令行按批次提交并在源文件旁写字幕，
+#     这里是单文件的请求 / 响应接口，结果直接在 HTTP 响应里返回，不写字幕文件。
+#
+# 接口：
+#   POST /transcribe            请求体为文件内容（任意 Content-Type），或 JSON {"path": 本机路径, ...}
+#        查询参数（JSON 请求也可以放在请求体里）：format=srt|txt|json，language，model，filename（上传时的文件名）；
+#        默认等识别完成后返回结果；stream=1 返回 SSE 事件流；async=1 立即返回 202 与任务编号
+#   GET  /jobs/<id>             任务状态（JSON）
+#   GET  /jobs/<id>/result      结果（format=...，未完成时 409）
+#   GET  /jobs/<id>/events      任务的 SSE 事件流（从头开始）
+#   GET  /health                队列 / 工作线程 / 已加载模型
+#   SSE 事件：queued、started、segment（{"start", "end", "text"}）、progress（{"done_seconds"}）、
+#             done（{"id", "format", "result"}）、error（{"id", "error"}）；空闲时每 SSE_KEEPALIVE_SECONDS 秒发一行注释保活。
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import whisper_engine as engine
+
+DEFAULT_HTTP_PORT = 50678
+UPLOAD_DIR = os.path.join(engine.APP_DATA_DIR, "uploads")
+MAX_UPLOAD_MB = 4096           # 单个上传文件的大小上限（MB）
+UPLOAD_BLOCK = 1 << 20         # 接收上传内容时每次读取的字节数
+JOB_HISTORY = 200              # 已结束的任务最多保留多少个（供 /jobs/<id> 查询）
+SSE_KEEPALIVE_SECONDS = 15
+RETRY_AFTER_SECONDS = 10       # 队列满时建议客户端多久后重试
+OUTPUT_FORMATS = {"srt": "application/x-subrip; charset=utf-8",
+                  "txt": "text/plain; charset=utf-8",
+                  "json": "application/json; charset=utf-8"}
+
+
+def service_log(msg):
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    print(timestamp + msg, flush=True)
+
+
+def remove_upload(path):
+    """删除上传的临时文件，并从媒体信息索引中去掉它（取指纹、探测时长时记进去的），索引不随请求数增长。"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    engine.forget_media_info(path)
+
+
+class ServiceJob:
+    """
+    一个转写请求：识别过程中的片段与进度都记成事件（events），SSE 客户端从任意位置开始读，
+    任务结束后仍可以从头重放。状态：queued -> running -> done / failed。
+    """
+
+    def __init__(self, job_id, file, name, options, upload=False):
+        self.id = job_id
+        self.file = file
+        self.name = name           # 显示用的文件名（上传时为客户端给出的 filename）
+        self.options = options     # 覆盖服务默认值的 engine 选项（语言、模型）
+        self.upload = upload       # 上传的临时文件，任务结束后删除
+        self.state = "queued"
+        self.cached = False
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done_seconds = 0.0
+        self.segments = []
+        self.events = []
+        self._cond = threading.Condition()
+
+    def _emit(self, event, data):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def start(self):
+        self.state = "running"
+        self.started = time.time()
+        self._emit("started", {"id": self.id})
+
+    def add_segments(self, chunk_end, segments):
+        """engine.transcribe_file 的 on_chunk：每个片段完成时调用（按时间顺序）。"""
+        for seg in segments:
+            self.segments.append(seg)
+            self._emit("segment", {"start": round(seg.start, 3), "end": round(seg.end, 3), "text": seg.text.strip()})
+
+    def progress(self, done_sec):
+        self.done_seconds = done_sec
+        self._emit("progress", {"done_seconds": round(done_sec, 1)})
+
+    def finish(self, error=None):
+        with self._cond:
+            self.finished = time.time()
+            self.error = error
+            self.state = "failed" if error else "done"
+            if error:
+                self.events.append(("error", {"id": self.id, "error": error}))
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """等待任务结束，返回是否已结束。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished is not None, timeout)
+
+    def iter_events(self, export_format):
+        """逐个产出 (事件名, 数据)；空闲超过 SSE_KEEPALIVE_SECONDS 秒时产出 (None, None) 用于保活，任务结束后停止。"""
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self.events) or self.finished is not None,
+                                    SSE_KEEPALIVE_SECONDS)
+                batch = self.events[index:]
+                finished = self.finished is not None
+            index += len(batch)
+            if not batch and not finished:
+                yield None, None
+            yield from batch
+            if finished and index >= len(self.events):
+                if self.state == "done":
+                    yield "done", {"id": self.id, "format": export_format, "result": self.result(export_format)}
+                return
+
+    def result(self, export_format):
+        if export_format == "json":
+            return [{"start": round(s.start, 3), "end": round(s.end, 3), "text": s.text.strip()} for s in self.segments]
+        return engine.format_segments(self.segments, export_format.upper())
+
+    def describe(self):
+        info = {"id": self.id, "file": self.name, "state": self.state, "cached": self.cached,
+                "segments": len(self.segments), "done_seconds": round(self.done_seconds, 1)}
+        if self.started:
+            info["queued_seconds"] = round(self.started - self.created, 2)
+        if self.finished and self.started:
+            info["run_seconds"] = round(self.finished - self.started, 2)
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class TranscriptionService:
+    """
+    有界队列 + 固定数量的工作线程：
+      - submit 在队列满时立即返回 False（HTTP 层据此返回 503），不会让请求无限堆积；
+      - 每个工作线程处理一个任务时从 engine.model_manager 取模型、用完归还，同样配置的模型一直留在缓存中；
+      - 识别前先查识别结果缓存（按内容指纹，同一段录音重复上传也能直接返回）。
+    """
+
+    def __init__(self, options, workers=1, queue_size=8):
+        self.options = dict(options)
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        if not self.options.get("cpu_threads"):
+            # 每个任务只识别一个文件，CPU 线程按工作线程数均分，避免几个推理实例抢同一批核心
+            self.options["cpu_threads"] = max(1, (os.cpu_count() or 1) // self.workers)
+        self.jobs = OrderedDict()
+        self.running = 0
+        self.counts = {"accepted": 0, "rejected": 0, "done": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def start(self, preload=True):
+        for worker_id in range(1, self.workers + 1):
+            threading.Thread(target=self._worker, args=(worker_id, preload), daemon=True).start()
+        return self
+
+    def stop(self):
+        for _ in range(self.workers):
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break  # 工作线程都是守护线程，随进程退出
+
+    def full(self):
+        return self.queue.full()
+
+    def new_job(self, file, name, options, upload=False):
+        return ServiceJob(uuid.uuid4().hex[:12], file, name, options, upload)
+
+    def reject(self):
+        with self._lock:
+            self.counts["rejected"] += 1
+
+    def submit(self, job):
+        """放进等待队列；队列已满时返回 False。"""
+        # 先记 queued 事件：入队后工作线程可能马上开始，started 不能排在它前面
+        job._emit("queued", {"id": job.id, "position": self.queue.qsize() + 1})
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self.reject()
+            return False
+        with self._lock:
+            self.counts["accepted"] += 1
+            self.jobs[job.id] = job
+            # 只淘汰最早结束的任务；排队 / 进行中的任务数本身受队列长度和工作线程数限制
+            finished = [i for i, j in self.jobs.items() if j.finished is not None]
+            for old_id in finished[:max(0, len(self.jobs) - JOB_HISTORY)]:
+                del self.jobs[old_id]
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def health(self):
+        with self._lock:
+            counts = dict(self.counts)
+            running = self.running
+        return {"status": "ok", "workers": self.workers, "running": running, "queued": self.queue.qsize(),
+                "queue_size": self.queue.maxsize, "jobs": counts, "models": engine.model_manager.describe()}
+
+    def _worker(self, worker_id, preload):
+        if preload:
+            # 启动时先把模型加载进缓存，第一个请求不必等加载
+            settings = engine.prepare_settings(self.options, 1)
+            if settings is not None:
+                try:
+                    engine.model_manager.release(
+                        engine.model_manager.acquire(settings, num_workers=settings["chunk_workers"]))
+                    service_log(f"[线程{worker_id}] 模型已就绪。")
+                except Exception as e:
+                    service_log(f"[线程{worker_id}] 预加载模型失败（收到请求时再加载）：{e}")
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self.running += 1
+            try:
+                self.run_job(job)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.counts["done" if job.state == "done" else "failed"] += 1
+
+    def run_job(self, job):
+        job.start()
+        service_log(f"开始识别：{job.name}（任务 {job.id}）")
+        try:
+            settings = engine.prepare_settings({**self.options, **job.options}, 1)
+            if settings is None:
+                raise ValueError("选项有误，详见服务日志")
+            key = engine.result_cache_key(job.file, settings) if settings["result_cache"] else None
+            cached = engine.load_cached_result(key) if key else None
+            if cached is not None:
+                job.cached = True
+                job.add_segments(cached[-1].end if cached else 0.0, cached)
+            else:
+                model = engine.model_manager.acquire(settings, num_workers=settings["chunk_workers"])
+                try:
+                    engine.transcribe_file(model, job.file, settings, progress_callback=job.progress,
+                                           on_chunk=job.add_segments)
+                finally:
+                    engine.model_manager.release(model)
+                if key:
+                    engine.store_cached_result(key, job.segments, job.name)
+            error = None
+        except Exception as e:
+            error = str(e)
+        # 上传的临时文件在宣告结束之前删除：客户端拿到结果时服务端已不再占用磁盘
+        if job.upload:
+            remove_upload(job.file)
+        job.finish(error)
+        if error:
+            service_log(f"识别失败：{job.name}：{error}")
+        else:
+            service_log(f"✅ 完成：{job.name}（{len(job.segments)} 个片段，用时 {job.finished - job.started:.1f} 秒"
+                        f"{'，命中缓存' if job.cached else ''}）")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理（ThreadingHTTPServer 每个连接一个线程）；self.server.service 为 TranscriptionService。"""
+
+    server_version = "WhisperGUI"
+
+    def log_message(self, format, *args):
+        service_log(f"{self.address_string()} {format % args}")
+
+    # ---------------------- 响应辅助 ----------------------
+
+    def send_json(self, code, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", OUTPUT_FORMATS["json"])
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_result(self, job, export_format):
+        result = job.result(export_format)
+        body = (json.dumps(result, ensure_ascii=False) if export_format == "json" else result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", OUTPUT_FORMATS[export_format])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Job-Id", job.id)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self, job, export_format):
+        """SSE：一直写到任务结束；客户端断开时直接返回，任务照常完成。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Job-Id", job.id)
+        self.end_headers()
+        try:
+            for event, data in job.iter_events(export_format):
+                if event is None:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    payload = json.dumps(data, ensure_ascii=False)
+                    self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def error(self, code, message, headers=None):
+        self.send_json(code, {"error": message}, headers)
+
+    # ---------------------- 路由 ----------------------
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        service = self.server.service
+        if parts == ["health"]:
+            return self.send_json(200, service.health())
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = service.get(parts[1])
+            if job is None:
+                return self.error(404, f"没有这个任务：{parts[1]}")
+            action = parts[2] if len(parts) == 3 else ""
+            export_format = params.get("format", "srt").lower()
+            if export_format not in OUTPUT_FORMATS:
+                return self.error(400, f"format 只能是 {' / '.join(OUTPUT_FORMATS)}")
+            if action == "":
+                return self.send_json(200, job.describe())
+            if action == "events":
+                return self.send_events(job, export_format)
+            if action == "result":
+                if job.state == "failed":
+                    return self.error(500, job.error)
+                if job.state != "done":
+                    return self.error(409, f"任务尚未完成（{job.state}）")
+                return self.send_result(job, export_format)
+        self.error(404, "未知的地址")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/transcribe":
+            return self.error(404, "未知的地址")
+        service = self.server.service
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if service.full():
+            # 背压：不读请求体直接拒绝，客户端稍后重试
+            service.reject()
+            self.close_connection = True
+            return self.error(503, "转写队列已满，请稍后重试", {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.close_connection = True
+            return self.error(411, "需要 Content-Length")
+
+        if self.headers.get("Content-Type", "").split(";")[0].strip() == "application/json":
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self.error(400, "请求体不是合法的 JSON")
+            if not isinstance(request, dict):
+                return self.error(400, "JSON 请求体必须是对象，例如 {\"path\": ...}")
+            params.update({k: str(v) for k, v in request.items() if k != "path"})
+            path = request.get("path")
+            if not path or not os.path.isfile(path):
+                return self.error(400, f"找不到文件：{path}")
+            file, name, upload = os.path.abspath(path), os.path.basename(path), False
+        else:
+            if length > MAX_UPLOAD_MB << 20:
+                self.close_connection = True
+                return self.error(413, f"上传文件超过 {MAX_UPLOAD_MB} MB")
+            name = os.path.basename(params.get("filename", "")) or "upload"
+            file, upload = None, True
+
+        export_format = params.get("format", "srt").lower()
+        if export_format not in OUTPUT_FORMATS:
+            return self.error(400, f"format 只能是 {' / '.join(OUTPUT_FORMATS)}")
+        options = {}
+        if params.get("language"):
+            options["lang_option"] = params["language"]
+        if params.get("model"):
+            options["model_name"] = params["model"]
+        job = service.new_job(file, name, options, upload)
+
+        if upload:
+            # 上传内容按块写到临时文件（大文件也不整个读进内存），ffmpeg 直接从这个文件解码
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            job.file = os.path.join(UPLOAD_DIR, f"{job.id}_{name}")
+            try:
+                with open(job.file, "wb") as f:
+                    remaining = length
+                    while remaining > 0:
+                        block = self.rfile.read(min(UPLOAD_BLOCK, remaining))
+                        if not block:
+                            raise ConnectionError("上传中断")
+                        f.write(block)
+                        remaining -= len(block)
+            except (OSError, ConnectionError) as e:
+                remove_upload(job.file)
+                return self.error(400, f"接收上传文件失败：{e}")
+
+        if not service.submit(job):
+            if upload:
+                remove_upload(job.file)
+            return self.error(503, "转写队列已满，请稍后重试", {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        if params.get("stream") == "1":
+            return self.send_events(job, export_format)
+        if params.get("async") == "1":
+            return self.send_json(202, {**job.describe(), "status_url": f"/jobs/{job.id}",
+                                        "result_url": f"/jobs/{job.id}/result?format={export_format}"})
+        job.wait()
+        if job.state == "failed":
+            return self.error(500, job.error, {"X-Job-Id": job.id})
+        self.send_result(job, export_format)
+
+
+def make_server(service, port=DEFAULT_HTTP_PORT):
+    """创建监听 127.0.0.1:port 的 HTTP 服务器（port=0 时由系统分配，见 server_port），调用方负责 serve_forever。"""
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), ServiceHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    return httpd
+
+
+def serve(service, port=DEFAULT_HTTP_PORT):
+    """在 127.0.0.1:port 上提供 HTTP 服务，直到 Ctrl+C。"""
+    httpd = make_server(service, port)
+    service_log(f"HTTP 转写服务已启动：http://127.0.0.1:{httpd.server_port}/ （工作线程 {service.workers}，"
+                f"队列长度 {service.queue.maxsize}）")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        service_log("HTTP 转写服务退出。")
+    finally:
+        httpd.server_close()
+        service.stop()
+        engine.save_media_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WhisperGUI 本地 HTTP 转写服务（只监听 127.0.0.1）。")
+    parser.add_argument("--port", type=int, default=DEFAULT_HTTP_PORT, help="监听端口（默认 %(default)s）")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="同时识别的文件数（每个各用一份模型，默认 1）")
+    parser.add_argument("--queue-size", type=int, default=8, help="等待队列长度，满了返回 503（默认 %(default)s）")
+    parser.add_argument("--no-preload", action="store_true", help="启动时不预先加载模型（第一个请求时再加载）")
+    parser.add_argument("--backend", choices=engine.BACKENDS, default="faster", help="识别后端（默认 %(default)s）")
+    parser.add_argument("-m", "--model", default=engine.DEFAULT_SETTINGS["model_name"], help="默认模型（请求可用 model 覆盖）")
+    parser.add_argument("--model-dir", default="", help="本地模型根目录")
+    parser.add_argument("-l", "--language", default="Auto", help="默认语言（请求可用 language 覆盖）")
+    parser.add_argument("--device", choices=("auto", "cpu", "cuda"), default="auto", help="推理设备（默认自动检测）")
+    parser.add_argument("--compute-type", default="auto", help="计算精度（默认自动）")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="每个推理实例的 CPU 线程数，0 = 按工作线程数均分")
+    parser.add_argument("--chunking", choices=("vad", "fixed"), default="vad", help="分段方式（默认 vad）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用识别结果缓存")
+    parser.add_argument("--model-cache-mb", type=int, default=engine.MODEL_CACHE_BUDGET_MB,
+                        help="已加载模型的总占用上限（MB，默认 %(default)s）")
+    args = parser.parse_args(argv)
+
+    engine.set_log_handler(service_log)
+    engine.media_index.update(engine.load_media_index())
+    engine.model_manager.set_budget(args.model_cache_mb)
+    options = {
+        "backend": args.backend,
+        "model_name": args.model,
+        "model_folder": args.model_dir,
+        "lang_option": args.language,
+        "device": args.device,
+        "compute_type": args.compute_type,
+        "cpu_threads": max(0, args.cpu_threads),
+        "chunking": args.chunking,
+        "result_cache": not args.no_cache,
+    }
+    service = TranscriptionService(options, workers=args.workers, queue_size=args.queue_size)
+    service.start(preload=not args.no_preload)
+    serve(service, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
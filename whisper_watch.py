@@ -0,0 +1,427 @@
+# WhisperGUI 监视文件夹（常驻自动转写）
+# 目的：录音设备整天往共享目录里写文件，不必反复「选择文件夹」+「开始识别」：程序一直监视这些目录，
+#       文件写完（大小不再变化）后自动交给同一份常驻模型转写，字幕写在源文件旁边或输出文件夹中。
+# 用法：
+#   python whisper_watch.py D:\recordings -r --model large-v3 --language zh
+#   python whisper_watch.py /mnt/share/in --output-dir /mnt/share/srt --stable-seconds 30 --poll-interval 20
+#   python whisper_watch.py /data/in --once          # 处理完目录中现有的文件就退出（补处理积压）
+# 说明：
+#   - 装了 watchdog 时用它接收文件系统事件（Linux inotify / Windows ReadDirectoryChangesW / macOS FSEvents），
+#     只重新扫描有变动的目录，另外每隔 RESCAN_SECONDS 完整扫描一次兜底（网络共享上事件可能收不到）；
+#     没装 watchdog 或指定 --poll 时每隔 --poll-interval 秒用 whisper_scan 并发扫描一遍。
+#   - 已处理的文件写一个完成标记（默认 <源文件>.done，可用 --marker-dir 放到别处），重启后据此跳过；
+#     失败的文件不写标记，文件内容变化（大小 / 修改时间）之后才会重试。
+#   - 同一时间只运行一个批次：批次进行中新就绪的文件用 engine.add_jobs 加入当前批次，模型由 engine.model_manager
+#     保持加载，批次之间也不会重新加载。
+#   - 定期报告吞吐量（音频秒 / 处理秒）与从“发现文件”到“字幕写出”的延迟；启动时已存在的文件从启动时刻算起。
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+import whisper_engine as engine
+import whisper_jobs
+import whisper_scan
+
+TICK_SECONDS = 1.0          # 主循环间隔：检查待定文件是否稳定、提交就绪文件
+RESCAN_SECONDS = 300        # watchdog 模式下完整扫描一遍的间隔（兜底漏掉的事件）
+LATENCY_SAMPLES = 10000     # 延迟统计最多保留最近多少个文件
+
+
+def watch_log(msg):
+    timestamp = datetime.now().strftime("[%H:%M:%S] ")
+    print(timestamp + msg, flush=True)
+
+
+def percentile(values, fraction):
+    """已排序列表的分位数（最近秩），空列表返回 0。"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class FolderWatcher:
+    """
+    监视 roots 下的音视频文件并自动转写：
+      - 发现：轮询模式定期整体扫描；watchdog 模式只扫描收到事件的目录（不递归），并定期整体扫描兜底；
+      - 稳定：新文件进入 _pending，每个 tick 重新 stat，大小与修改时间连续 stable_seconds 秒不变才算写完；
+      - 处理：就绪的文件加入正在运行的批次（engine.add_jobs），没有批次时在后台线程开始一个新批次；
+        批次正在收尾、不能再加入时留到下一个 tick；
+      - 完成：engine 通过 set_job_status_handler 汇报 done / cached / skipped 时写完成标记并记录延迟，
+        failed 时记下文件签名，文件变化后才重新处理；批次结束时仍没有汇报的文件（例如模型加载失败）也按失败处理；
+      - 重写：本批次已经提交过的文件又一次就绪（例如录音程序重写了它）时，engine 会按批次去重把它丢掉，
+        所以先放进 _deferred，批次结束后放回 _pending，在下一个批次重新处理。
+    文件在以下几处之一：_pending（等待稳定）→ _inflight（已提交）→ _done（有完成标记）/ _failed（失败）。
+    """
+
+    def __init__(self, roots, options, recursive=True, scan_filter=None, stable_seconds=10.0,
+                 poll_interval=10.0, marker_dir="", use_watchdog=True):
+        self.roots = [os.path.abspath(r) for r in roots]
+        # 批次会不断追加文件：并行任务数按设置启动，不因第一批只有一个文件就只开一个工作线程
+        self.options = {**options, "open_batch": True}
+        self._output_settings = {**engine.DEFAULT_SETTINGS, **options}  # 写完成标记时计算字幕路径用
+        self.recursive = recursive
+        self.filter = scan_filter or whisper_scan.ScanFilter()
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.marker_dir = marker_dir
+        self.use_watchdog = use_watchdog
+        self._lock = threading.Lock()
+        self._pending = {}     # path_key -> [路径, 大小, 修改时间, 发现时刻, 最近一次变化的时刻]
+        self._inflight = {}    # path_key -> (路径, 发现时刻)
+        self._deferred = {}    # path_key -> (路径, 发现时刻)：本批次已提交过、又一次就绪的文件
+        self._batch_keys = set()  # 当前批次提交过的全部 path_key（与 engine 批次内去重的范围一致）
+        self._done = set()     # 有完成标记的 path_key
+        self._failed = {}      # path_key -> (大小, 修改时间)：失败时的签名
+        self._dirty_dirs = set()
+        self._submit_lock = threading.Lock()  # 提交与批次收尾互斥：保证 _inflight 中的文件都属于当前批次
+        self._batch_running = False
+        self._batch_start = 0.0
+        self._observer = None
+        self._marker_error = False
+        # 统计
+        self.started = time.time()
+        self.files_done = 0
+        self.files_failed = 0
+        self.audio_done = 0.0
+        self.busy_time = 0.0     # 各批次的处理用时之和
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    # ---------------------- 完成标记 ----------------------
+
+    def marker_path(self, path):
+        """完成标记的路径：默认在源文件旁边；指定 marker_dir 时按完整路径的哈希命名，避免不同目录的同名文件冲突。"""
+        if not self.marker_dir:
+            return path + ".done"
+        digest = hashlib.sha1(whisper_jobs.path_key(path).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.marker_dir, f"{digest}_{os.path.basename(path)}.done")
+
+    def write_marker(self, path, status, latency):
+        try:
+            if self.marker_dir:
+                os.makedirs(self.marker_dir, exist_ok=True)
+            with open(self.marker_path(path), "w", encoding="utf-8") as f:
+                json.dump({"source": path, "status": status, "output": engine.build_output_path(path, self._output_settings),
+                           "finished": datetime.now().isoformat(timespec="seconds"),
+                           "latency_seconds": round(latency, 1)}, f, ensure_ascii=False)
+        except OSError as e:
+            if not self._marker_error:
+                self._marker_error = True  # 只报一次（例如源目录只读）；本次运行中仍在内存里记为已完成
+                watch_log(f"无法写完成标记（重启后这些文件会被重新处理，可用 --marker-dir 指定可写目录）：{e}")
+
+    # ---------------------- 发现新文件 ----------------------
+
+    def scan(self, roots, recursive):
+        """用 whisper_scan 扫描（阻塞到扫描结束），返回通过筛选的文件路径。"""
+        found = []
+        whisper_scan.FolderScanner(roots, on_batch=found.extend, scan_filter=self.filter,
+                                   recursive=recursive).start().wait()
+        return found
+
+    def dir_excluded(self, directory):
+        """目录（或它的某一级上级目录）是否被 exclude 排除、或不在递归范围内。"""
+        for root in self.roots:
+            rel = os.path.relpath(directory, root)
+            if rel.startswith(os.pardir):
+                continue
+            if rel == os.curdir:
+                return False
+            if not self.recursive:
+                return True
+            parts = rel.replace(os.sep, "/").split("/")
+            return any(self.filter.skip_dir(name, "/".join(parts[:k + 1])) for k, name in enumerate(parts))
+        return True
+
+    def discover(self, paths, now):
+        """新出现的文件进入 _pending；已知的、有完成标记的、失败且没有变化的跳过。"""
+        added = 0
+        with self._lock:
+            for path in paths:
+                key = whisper_jobs.path_key(path)
+                if key in self._pending or key in self._inflight or key in self._done:
+                    continue
+                if os.path.exists(self.marker_path(path)):
+                    self._done.add(key)
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if self._failed.get(key) == (st.st_size, st.st_mtime_ns):
+                    continue
+                self._failed.pop(key, None)
+                self._pending[key] = [path, st.st_size, st.st_mtime_ns, now, now]
+                added += 1
+        if added:
+            watch_log(f"发现 {added} 个新文件，等待写入完成（大小 {self.stable_seconds:.0f} 秒不变）…")
+
+    def start_watchdog(self):
+        """启动 watchdog 监视；没装 watchdog 时返回 False（改用轮询）。"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                # 新建 / 修改 / 移入都只记下所在目录，由主循环统一重新扫描（写入中的大文件会产生大量 modified 事件）
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        directory = path if event.is_directory else os.path.dirname(path)
+                        with watcher._lock:
+                            watcher._dirty_dirs.add(directory)
+
+        self._observer = Observer()
+        for root in self.roots:
+            self._observer.schedule(Handler(), root, recursive=self.recursive)
+        self._observer.daemon = True
+        self._observer.start()
+        return True
+
+    # ---------------------- 稳定检查与提交 ----------------------
+
+    def ready_files(self, now):
+        """重新 stat 待定文件，已稳定的移出 _pending，返回 [(路径, 发现时刻)]。"""
+        ready = []
+        with self._lock:
+            for key, item in list(self._pending.items()):
+                path, size, mtime, seen, changed = item
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    del self._pending[key]  # 文件被删除或移走
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                    item[1:3] = st.st_size, st.st_mtime_ns
+                    item[4] = now
+                elif st.st_size > 0 and now - changed >= self.stable_seconds:
+                    del self._pending[key]
+                    ready.append((path, seen))
+        return ready
+
+    def submit(self, ready):
+        """就绪文件加入正在运行的批次；没有批次时开始一个新批次。返回 False 表示现在不能提交（批次正在收尾）。"""
+        with self._submit_lock:
+            with self._lock:
+                if self._batch_running:
+                    for path, seen in ready:
+                        key = whisper_jobs.path_key(path)
+                        if key in self._batch_keys:
+                            self._deferred[key] = (path, seen)
+                    ready = [(path, seen) for path, seen in ready
+                             if whisper_jobs.path_key(path) not in self._batch_keys]
+                # 先登记再提交：命中缓存的文件可能在 add_jobs 返回之前就汇报完成
+                for path, seen in ready:
+                    self._inflight[whisper_jobs.path_key(path)] = (path, seen)
+            if not ready:
+                return True
+            files = [path for path, _ in ready]
+            keys = {whisper_jobs.path_key(path) for path in files}
+            if not self._batch_running:
+                self._batch_running = True
+                self._batch_start = time.time()
+                self._batch_keys = keys
+                threading.Thread(target=self.run_batch, args=(files,), daemon=True).start()
+                return True
+            if engine.add_jobs(files):
+                self._batch_keys |= keys
+                return True
+            with self._lock:
+                for path in files:
+                    self._inflight.pop(whisper_jobs.path_key(path), None)
+            return False
+
+    def run_batch(self, files):
+        try:
+            engine.process_files(files, self.options)
+        except Exception as e:
+            watch_log(f"批次处理失败：{e}")
+        finally:
+            with self._submit_lock:
+                with self._lock:
+                    leftover = [path for path, _ in self._inflight.values()]
+                for path in leftover:
+                    self.on_job_status(path, whisper_jobs.FAILED)
+                now = time.time()
+                with self._lock:
+                    for key, (path, seen) in self._deferred.items():
+                        try:
+                            st = os.stat(path)
+                        except OSError:
+                            continue
+                        # 保留发现时刻，再稳定一次后随下一个批次提交
+                        self._pending[key] = [path, st.st_size, st.st_mtime_ns, seen, now]
+                    self._deferred.clear()
+                    self._batch_keys = set()
+                self.busy_time += time.time() - self._batch_start
+                self._batch_running = False
+
+    def on_job_status(self, path, status):
+        """engine 汇报的文件状态（在工作线程中调用）。"""
+        if status not in (whisper_jobs.DONE, whisper_jobs.CACHED, whisper_jobs.SKIPPED, whisper_jobs.FAILED):
+            return
+        key = whisper_jobs.path_key(path)
+        with self._lock:
+            entry = self._inflight.pop(key, None)
+        if entry is None:
+            return
+        latency = time.time() - entry[1]
+        if status == whisper_jobs.FAILED:
+            try:
+                st = os.stat(path)
+                signature = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                signature = None
+            with self._lock:
+                self._failed[key] = signature
+                self.files_failed += 1
+            return
+        self.write_marker(path, status, latency)
+        with self._lock:
+            self._done.add(key)
+            self.files_done += 1
+            self.audio_done += engine.get_audio_duration(path)
+            self.latencies.append(latency)
+        watch_log(f"📥 {os.path.basename(path)}：从发现到字幕写出用时 {engine.format_hms(latency)}")
+
+    # ---------------------- 报告 ----------------------
+
+    def summary(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            pending, inflight = len(self._pending), len(self._inflight)
+            done, failed, audio = self.files_done, self.files_failed, self.audio_done
+        busy = self.busy_time + (time.time() - self._batch_start if self._batch_running else 0.0)
+        wall = time.time() - self.started
+        speed = f"{audio / busy:.2f} 音频秒/处理秒" if busy > 0 else "—"
+        per_hour = done / wall * 3600 if wall > 0 else 0
+        line = (f"监视统计：完成 {done} 个（失败 {failed}），音频 {engine.format_hms(audio)}，吞吐 {speed}，"
+                f"{per_hour:.1f} 文件/小时；等待写入完成 {pending} 个，处理中 {inflight} 个")
+        if latencies:
+            line += (f"；延迟 平均 {engine.format_hms(sum(latencies) / len(latencies))}，"
+                     f"中位 {engine.format_hms(percentile(latencies, 0.5))}，"
+                     f"P95 {engine.format_hms(percentile(latencies, 0.95))}，最大 {engine.format_hms(latencies[-1])}")
+        return line
+
+    # ---------------------- 主循环 ----------------------
+
+    def run(self, once=False, report_interval=60.0, stop_event=None):
+        """
+        监视直到 stop_event 置位或 Ctrl+C；once=True 时只处理启动时已有的文件，全部结束后返回。
+        返回本次完成的文件数。
+        """
+        stop_event = stop_event or threading.Event()
+        engine.set_job_status_handler(self.on_job_status)
+        watching = not once and self.use_watchdog and self.start_watchdog()
+        mode = "watchdog 事件" if watching else f"每 {self.poll_interval:g} 秒轮询"
+        watch_log(f"开始监视：{'、'.join(self.roots)}（{'含子目录，' if self.recursive else ''}{mode}）")
+        self.discover(self.scan(self.roots, self.recursive), time.time())
+        last_scan = last_report = time.time()
+        waiting = []   # 已就绪、但当前批次正在收尾暂时不能提交的文件
+        try:
+            while not stop_event.is_set():
+                now = time.time()
+                if not once:
+                    if watching:
+                        with self._lock:
+                            dirs, self._dirty_dirs = self._dirty_dirs, set()
+                        dirs = [d for d in dirs if os.path.isdir(d) and not self.dir_excluded(d)]
+                        if dirs:
+                            self.discover(self.scan(dirs, False), now)
+                    if now - last_scan >= (RESCAN_SECONDS if watching else self.poll_interval):
+                        self.discover(self.scan(self.roots, self.recursive), now)
+                        last_scan = now
+                waiting += self.ready_files(now)
+                if waiting and self.submit(waiting):
+                    watch_log(f"▶ 提交 {len(waiting)} 个文件")
+                    waiting = []
+                if now - last_report >= report_interval:
+                    watch_log(self.summary())
+                    last_report = now
+                if once and not waiting:
+                    with self._lock:
+                        idle = not self._pending and not self._inflight
+                    if idle and not self._batch_running:
+                        break
+                stop_event.wait(TICK_SECONDS)
+        except KeyboardInterrupt:
+            watch_log("停止监视（正在处理的文件不会写完成标记，下次启动时重新处理）。")
+        finally:
+            if self._observer is not None:
+                self._observer.stop()
+            engine.set_job_status_handler(None)
+            engine.save_media_index()
+            watch_log(self.summary())
+        return self.files_done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WhisperGUI 监视文件夹：新文件写完后自动转写，模型常驻内存。")
+    parser.add_argument("folders", nargs="+", help="要监视的目录")
+    parser.add_argument("-r", "--recursive", action="store_true", help="包含子目录")
+    parser.add_argument("--once", action="store_true", help="只处理目录中现有的文件，处理完就退出")
+    parser.add_argument("--poll", action="store_true", help="不用 watchdog，始终轮询扫描（某些网络共享上收不到事件）")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="轮询扫描间隔（秒，默认 %(default)s）")
+    parser.add_argument("--stable-seconds", type=float, default=10.0,
+                        help="文件大小与修改时间持续这么久不变才认为写入完成（秒，默认 %(default)s）")
+    parser.add_argument("--marker-dir", default="", help="完成标记存放目录（默认在源文件旁边写 <文件名>.done）")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB", help="只处理匹配的文件，可重复给出")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="不处理匹配的文件 / 不扫描匹配的子目录，可重复给出")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="吞吐量 / 延迟报告间隔（秒，默认 %(default)s）")
+    parser.add_argument("--backend", choices=engine.BACKENDS, default="faster", help="识别后端（默认 %(default)s）")
+    parser.add_argument("-m", "--model", default=engine.DEFAULT_SETTINGS["model_name"], help="模型名称")
+    parser.add_argument("--model-dir", default="", help="本地模型根目录")
+    parser.add_argument("-l", "--language", default="Auto", help="语言代码，Auto 为自动识别（默认）")
+    parser.add_argument("-o", "--output-dir", default="", help="字幕统一输出目录（默认与源文件同目录）")
+    parser.add_argument("-s", "--suffix", default="", help="输出文件名后缀：name[.suffix].srt")
+    parser.add_argument("-f", "--format", choices=("srt", "txt"), default="srt", help="输出格式（默认 srt）")
+    parser.add_argument("--device", choices=("auto", "cpu", "cuda"), default="auto", help="推理设备（默认自动检测）")
+    parser.add_argument("--compute-type", default="auto", help="计算精度（默认自动）")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="并行任务数（默认 1：一份常驻模型；大于 1 时每个任务各一份）")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="每个推理实例的 CPU 线程数，0 = 自动均分")
+    parser.add_argument("--chunking", choices=("vad", "fixed"), default="vad", help="分段方式（默认 vad）")
+    args = parser.parse_args(argv)
+
+    for folder in args.folders:
+        if not os.path.isdir(folder):
+            parser.error(f"不是目录：{folder}")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    engine.set_log_handler(watch_log)
+    engine.media_index.update(engine.load_media_index())
+    options = {
+        "backend": args.backend,
+        "model_name": args.model,
+        "model_folder": args.model_dir,
+        "lang_option": args.language,
+        "device": args.device,
+        "compute_type": args.compute_type,
+        "workers": max(1, args.workers),
+        "cpu_threads": max(0, args.cpu_threads),
+        "chunking": args.chunking,
+        "output_mode": 2 if args.output_dir else 1,
+        "output_folder": os.path.abspath(args.output_dir) if args.output_dir else "",
+        "suffix": args.suffix,
+        "export_format": args.format.upper(),
+    }
+    watcher = FolderWatcher(
+        args.folders, options, recursive=args.recursive,
+        scan_filter=whisper_scan.ScanFilter(include=args.include, exclude=args.exclude),
+        stable_seconds=max(0.0, args.stable_seconds), poll_interval=max(1.0, args.poll_interval),
+        marker_dir=args.marker_dir, use_watchdog=not args.poll
+    )
+    watcher.run(once=args.once, report_interval=max(1.0, args.report_interval))
+    return 0 if watcher.files_failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())